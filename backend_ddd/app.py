@@ -21,19 +21,35 @@ from interfaces.api.model_routes import model_bp
 from interfaces.api.datasource_routes import datasource_bp
 from interfaces.api.etl_routes import etl_bp
 from interfaces.api.domain_routes import domain_bp
+from interfaces.api.search_routes import search_bp
+from infrastructure.persistence.db_connection import get_pool_stats
+from application.etl_scheduler import get_etl_scheduler
+from infrastructure.search.search_index import get_search_index
 
 # 注册蓝图
 app.register_blueprint(model_bp, url_prefix='/api/model')
 app.register_blueprint(datasource_bp, url_prefix='/api/datasource')
 app.register_blueprint(etl_bp, url_prefix='/api/etl')
 app.register_blueprint(domain_bp, url_prefix='/api/domain')
+app.register_blueprint(search_bp, url_prefix='/api/search')
+
+# 首个请求到达时启动ETL调度器（重复调用不会重复启动）
+@app.before_request
+def start_etl_scheduler():
+    get_etl_scheduler().start()
+
+# 首个请求到达时在后台构建搜索索引，不让第一个搜索请求承担构建时间（已构建时直接返回）
+@app.before_request
+def warm_search_index():
+    get_search_index().warm()
 
 # 健康检查端点
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy"})
+    return jsonify({"status": "healthy", "dbPool": get_pool_stats(), "etlScheduler": get_etl_scheduler().stats()})
 
 
 if __name__ == '__main__':
+    get_search_index().warm()
     app.run(debug=True, host='0.0.0.0', port=5002)
 
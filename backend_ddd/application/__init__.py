@@ -6,11 +6,13 @@ from .model_service import ModelService
 from .datasource_service import DatasourceService
 from .etl_service import ETLService
 from .domain_service import DomainService
+from .search_service import SearchService
 
 __all__ = [
     'ModelService',
     'DatasourceService',
     'ETLService',
-    'DomainService'
+    'DomainService',
+    'SearchService'
 ]
 
@@ -2,11 +2,13 @@
 Datasource应用服务
 协调Datasource聚合的业务用例
 """
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator
 from infrastructure.repository.datasource_repository import DatasourceRepository
 from meta.datasource import Datasource, ModelTableAssociation
 from meta.shared import Mapping
 from infrastructure.persistence.db_connection import get_current_date
+from application.pagination import normalize_limit, fetch_size, split_page
+from application.versioning import writes, DATASOURCE
 
 
 class DatasourceService:
@@ -18,9 +20,29 @@ class DatasourceService:
     def get_all(self, domain_id: Optional[int] = None) -> List[Dict]:
         """获取所有Datasource"""
         filters = {"domainId": domain_id} if domain_id else None
-        datasources = self.repository.find_all(filters)
+        datasources = self.repository.find_all(filters, with_children=False)
         return [ds.to_dict() for ds in datasources]
     
+    def get_page(self, domain_id: Optional[int] = None, limit: int = 100,
+                 cursor: Optional[int] = None) -> Dict:
+        """按id键集分页获取Datasource，cursor为上一页返回的nextCursor"""
+        filters = {"domainId": domain_id} if domain_id else None
+        limit = normalize_limit(limit)
+        datasources = self.repository.find_all(
+            filters, limit=fetch_size(limit), after_id=cursor, with_children=False
+        )
+        datasources, next_cursor = split_page(datasources, limit)
+        return {
+            "items": [ds.to_dict() for ds in datasources],
+            "nextCursor": next_cursor
+        }
+    
+    def iter_datasources(self, domain_id: Optional[int] = None) -> Iterator[Dict]:
+        """流式获取Datasource"""
+        filters = {"domainId": domain_id} if domain_id else None
+        for ds in self.repository.iter_all(filters):
+            yield ds.to_dict()
+    
     def get_by_id(self, id: int) -> Optional[Dict]:
         """根据ID获取Datasource（包含Mappings和Associations）"""
         datasource = self.repository.find_by_id(id)
@@ -33,6 +55,7 @@ class DatasourceService:
             "associations": [a.to_dict() for a in datasource.modelTableAssociations]
         }
     
+    @writes(DATASOURCE)
     def create_datasource(self, data: dict) -> Dict:
         """创建Datasource"""
         datasource = Datasource.from_dict({
@@ -54,6 +77,7 @@ class DatasourceService:
         datasource = self.repository.save(datasource)
         return datasource.to_dict()
     
+    @writes(DATASOURCE)
     def update_datasource(self, id: int, data: dict) -> Optional[Dict]:
         """更新Datasource"""
         datasource = self.repository.find_by_id(id)
@@ -72,6 +96,7 @@ class DatasourceService:
         datasource = self.repository.save(datasource)
         return datasource.to_dict()
     
+    @writes(DATASOURCE)
     def toggle_status(self, id: int) -> Optional[Dict]:
         """切换Datasource状态"""
         datasource = self.repository.find_by_id(id)
@@ -82,6 +107,7 @@ class DatasourceService:
         datasource = self.repository.save(datasource)
         return datasource.to_dict()
     
+    @writes(DATASOURCE)
     def add_mapping(self, datasource_id: int, data: dict) -> Optional[Dict]:
         """添加Mapping到Datasource"""
         datasource = self.repository.find_by_id(datasource_id)
@@ -104,6 +130,7 @@ class DatasourceService:
         added_mapping = datasource.get_mapping_by_property(mapping.propertyId)
         return added_mapping.to_dict() if added_mapping else None
     
+    @writes(DATASOURCE)
     def add_association(self, datasource_id: int, data: dict) -> Optional[Dict]:
         """添加ModelTableAssociation到Datasource"""
         datasource = self.repository.find_by_id(datasource_id)
@@ -126,6 +153,7 @@ class DatasourceService:
         added_assoc = datasource.get_association_by_model(association.modelId)
         return added_assoc.to_dict() if added_assoc else None
     
+    @writes(DATASOURCE)
     def delete_datasource(self, id: int) -> bool:
         """删除Datasource"""
         return self.repository.delete(id)
@@ -6,6 +6,7 @@ from typing import Optional, List, Dict
 from infrastructure.repository.domain_repository import DomainRepository
 from meta.shared import Domain
 from infrastructure.persistence.db_connection import get_current_date
+from application.versioning import writes, DOMAIN
 
 
 class DomainService:
@@ -24,6 +25,7 @@ class DomainService:
         domain = self.repository.find_by_id(id)
         return domain.to_dict() if domain else None
     
+    @writes(DOMAIN)
     def create_domain(self, data: dict) -> Dict:
         """创建Domain"""
         domain = Domain.from_dict({
@@ -37,6 +39,7 @@ class DomainService:
         domain = self.repository.save(domain)
         return domain.to_dict()
     
+    @writes(DOMAIN)
     def update_domain(self, id: int, data: dict) -> Optional[Dict]:
         """更新Domain"""
         domain = self.repository.find_by_id(id)
@@ -51,6 +54,7 @@ class DomainService:
         domain = self.repository.save(domain)
         return domain.to_dict()
     
+    @writes(DOMAIN)
     def delete_domain(self, id: int) -> bool:
         """删除Domain"""
         return self.repository.delete(id)
@@ -0,0 +1,105 @@
+"""
+ETL进度发布订阅
+执行中的任务把进度事件发布到进程内的Broker，SSE连接订阅对应任务的事件，不查询数据库
+"""
+from typing import Dict, List, Optional, Tuple
+import queue
+import threading
+
+# 每个订阅者缓存的事件数，消费过慢时丢弃最旧的事件（不阻塞ETL执行）
+QUEUE_SIZE = 64
+
+Event = Tuple[str, dict]
+
+
+class Subscription:
+    """一个订阅者的事件队列"""
+
+    def __init__(self, task_id: int, size: int = QUEUE_SIZE):
+        self.task_id = task_id
+        self.queue: queue.Queue = queue.Queue(maxsize=size)
+        self.dropped = 0
+
+    def put(self, event: Event) -> None:
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """取下一个事件，超时返回None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def empty(self) -> bool:
+        return self.queue.empty()
+
+
+class ProgressBroker:
+    """
+    进度事件Broker
+
+    - 按任务ID分发事件，保留每个任务的最近一个事件，新订阅者先收到它
+    - 事件类型：started、progress、finished
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, List[Subscription]] = {}
+        self._latest: Dict[int, Event] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, task_id: int, event: str, data: dict) -> None:
+        item = (event, data)
+        with self._lock:
+            self._latest[task_id] = item
+            subscribers = list(self._subscribers.get(task_id, ()))
+            self.published += 1
+        for subscription in subscribers:
+            subscription.put(item)
+
+    def subscribe(self, task_id: int) -> Subscription:
+        subscription = Subscription(task_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(task_id, []).append(subscription)
+            latest = self._latest.get(task_id)
+        if latest is not None:
+            subscription.put(latest)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.task_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.task_id, None)
+
+    def latest(self, task_id: int) -> Optional[Event]:
+        with self._lock:
+            return self._latest.get(task_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tasks": len(self._latest),
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                "published": self.published
+            }
+
+
+_broker = ProgressBroker()
+
+
+def get_progress_broker() -> ProgressBroker:
+    """获取进程级ETL进度Broker"""
+    return _broker
@@ -0,0 +1,246 @@
+"""
+ETL调度器
+按ETLTask.schedule（cron表达式）在进程内定时触发任务执行
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import heapq
+import threading
+from application.etl_service import ETLService, add_task_listener
+from meta.etl import ETLTask
+
+# 参与调度的任务状态（running状态的任务执行结束后回到active，需保留其调度）
+SCHEDULED_STATUSES = ("active", "running")
+# 全量重新加载任务的间隔（秒），用于兜底其他进程对etl_tasks的修改
+RESYNC_INTERVAL = 600
+
+
+def _as_date(value) -> Optional[date]:
+    """DATE列可能读出为date对象或ISO字符串"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class ETLScheduler:
+    """
+    ETL调度器
+
+    - 用最小堆保存各任务的下一次触发时间，调度线程只在堆顶到期时醒来，
+      不逐轮扫描etl_tasks表；任务变化通过ETLService的回调增量更新堆
+    - 错过的多次触发合并为一次：到期后按当前时间计算下一次触发时间
+    - 到期任务交给ETLService的有界线程池执行，同一任务正在执行时跳过本次触发
+
+    nextRun/lastRun是DATE列，只记录日期；精确的触发时间保存在内存中
+    """
+
+    def __init__(self, service: Optional[ETLService] = None, clock: Callable[[], datetime] = datetime.now):
+        self.service = service or ETLService()
+        self.clock = clock
+        self._heap: List[Tuple[datetime, int, int]] = []
+        self._versions: Dict[int, int] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._last_sync: Optional[datetime] = None
+        self.dispatched = 0
+        self.skipped = 0
+        add_task_listener(self.refresh)
+
+    def start(self) -> 'ETLScheduler':
+        """加载任务并启动调度线程（已启动时不重复启动）"""
+        with self._condition:
+            if self._thread is not None:
+                return self
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='etl-scheduler', daemon=True)
+        self.sync()
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止调度线程，已提交的执行不受影响"""
+        with self._condition:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            self._condition.notify_all()
+        if thread is not None:
+            thread.join()
+
+    def sync(self) -> None:
+        """从etl_tasks重新加载全部任务的调度"""
+        now = self.clock()
+        entries = {}
+        for task in self.service.repository.iter_all():
+            fire = self._initial_fire(task, now)
+            if fire is not None:
+                entries[task.id] = fire
+
+        with self._condition:
+            self._heap = []
+            for task_id, fire in entries.items():
+                version = self._versions.get(task_id, 0) + 1
+                self._versions[task_id] = version
+                self._heap.append((fire, task_id, version))
+            for task_id in list(self._versions):
+                if task_id not in entries:
+                    del self._versions[task_id]
+            heapq.heapify(self._heap)
+            self._last_sync = now
+            self._condition.notify_all()
+
+    def refresh(self, task: ETLTask) -> None:
+        """任务变化回调：重新计算该任务的下一次触发时间，不再调度时移出"""
+        fire = None
+        if task.status in SCHEDULED_STATUSES and task.schedule:
+            try:
+                fire = task.next_fire(self.clock())
+            except ValueError:
+                fire = None
+
+        with self._condition:
+            version = self._versions.get(task.id, 0) + 1
+            if fire is None:
+                self._versions.pop(task.id, None)
+            else:
+                self._versions[task.id] = version
+                heapq.heappush(self._heap, (fire, task.id, version))
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            upcoming = min(
+                ((fire, task_id) for fire, task_id, version in self._heap if self._versions.get(task_id) == version),
+                default=None
+            )
+            return {
+                "running": self._thread is not None,
+                "scheduled": len(self._versions),
+                "dispatched": self.dispatched,
+                "skipped": self.skipped,
+                "nextFire": upcoming[0].isoformat() if upcoming else None,
+                "nextTaskId": upcoming[1] if upcoming else None
+            }
+
+    def _initial_fire(self, task: ETLTask, now: datetime) -> Optional[datetime]:
+        """
+        启动时的触发时间
+
+        nextRun早于今天，或nextRun是今天且今天的首次触发已过而lastRun不是今天，
+        视为停机期间错过了触发，立即补跑一次
+        """
+        if task.status not in SCHEDULED_STATUSES or not task.schedule:
+            return None
+        try:
+            cron = task.cron
+            fire = cron.next_after(now)
+        except ValueError:
+            return None
+
+        next_run, last_run = _as_date(task.nextRun), _as_date(task.lastRun)
+        today = now.date()
+        if next_run is not None:
+            if next_run < today:
+                return now
+            if next_run == today and last_run != today:
+                first = cron.first_on(now)
+                if first is not None and first <= now:
+                    return now
+        return fire
+
+    def _due(self) -> Tuple[List[Tuple[int, datetime]], Optional[float]]:
+        """取出到期的任务及其下一次触发时间，并返回距下一次到期的秒数"""
+        now = self.clock()
+        due = []
+        while self._heap:
+            fire, task_id, version = self._heap[0]
+            if self._versions.get(task_id) != version:
+                heapq.heappop(self._heap)
+                continue
+            if fire > now:
+                break
+            heapq.heappop(self._heap)
+            due.append((task_id, fire))
+
+        timeout = RESYNC_INTERVAL
+        if self._last_sync is not None:
+            timeout = max(0.0, RESYNC_INTERVAL - (now - self._last_sync).total_seconds())
+        if self._heap:
+            timeout = min(timeout, max(0.0, (self._heap[0][0] - now).total_seconds()))
+        return due, timeout
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                due, timeout = self._due()
+                if not due:
+                    self._condition.wait(timeout)
+
+            if not due and self._last_sync is not None and \
+                    self.clock() - self._last_sync >= timedelta(seconds=RESYNC_INTERVAL):
+                self._safe_sync()
+            for task_id, fire in due:
+                try:
+                    self._dispatch(task_id)
+                except Exception:
+                    self.skipped += 1
+
+    def _dispatch(self, task_id: int) -> None:
+        """触发任务并排入下一次触发时间（错过的多次触发合并为一次）"""
+        task = self.service.repository.find_by_id(task_id, with_children=False)
+        if task is None:
+            with self._condition:
+                self._versions.pop(task_id, None)
+            return
+
+        try:
+            next_fire = task.next_fire(self.clock())
+        except ValueError:
+            next_fire = None
+
+        with self._condition:
+            version = self._versions.get(task_id, 0) + 1
+            if next_fire is None:
+                self._versions.pop(task_id, None)
+            else:
+                self._versions[task_id] = version
+                heapq.heappush(self._heap, (next_fire, task_id, version))
+
+        next_run = next_fire.date().isoformat() if next_fire else None
+        try:
+            result = self.service.run_scheduled(task_id, next_run)
+        except Exception:
+            result = None
+        if result is None:
+            self.skipped += 1
+        else:
+            self.dispatched += 1
+
+    def _safe_sync(self) -> None:
+        try:
+            self.sync()
+        except Exception:
+            with self._condition:
+                self._last_sync = self.clock()
+
+
+_scheduler: Optional[ETLScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_etl_scheduler() -> ETLScheduler:
+    """获取进程级ETL调度器（首次调用时创建，不自动启动）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ETLScheduler()
+        return _scheduler
@@ -2,10 +2,56 @@
 ETL应用服务
 协调ETLTask聚合的业务用例
 """
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator, Callable, Set
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
 from infrastructure.repository.etl_repository import ETLRepository
+from infrastructure.repository.datasource_repository import DatasourceRepository
+from infrastructure.repository.cached_model_repository import CachedModelRepository
+from infrastructure.etl import ETLEngine, ETLPlan, CheckpointStore
 from meta.etl import ETLTask, ETLLog
 from infrastructure.persistence.db_connection import get_current_date
+from application.pagination import normalize_limit, fetch_size, split_page
+from application.versioning import writes, bump_version, ETL
+from application.etl_progress import get_progress_broker
+
+# 同时执行的ETL任务数（每个任务执行期间占用一个数据库连接）
+ETL_WORKERS = 2
+# 进度流在没有事件时发送心跳的间隔（秒）
+PROGRESS_HEARTBEAT = 15
+
+_executor = ThreadPoolExecutor(max_workers=ETL_WORKERS, thread_name_prefix='etl')
+
+# 本进程中正在执行的任务ID（防止同一任务重叠执行）
+_running: Set[int] = set()
+_running_lock = threading.Lock()
+
+# 任务状态或调度变化时的回调（如调度器）
+_task_listeners: List[Callable[[ETLTask], None]] = []
+
+
+def add_task_listener(listener: Callable[[ETLTask], None]) -> None:
+    """注册任务变化回调，任务创建、激活、暂停和执行结束后调用"""
+    _task_listeners.append(listener)
+
+
+def _notify(task: ETLTask) -> None:
+    for listener in _task_listeners:
+        listener(task)
+
+
+def _claim(task_id: int) -> bool:
+    with _running_lock:
+        if task_id in _running:
+            return False
+        _running.add(task_id)
+        return True
+
+
+def _release(task_id: int) -> None:
+    with _running_lock:
+        _running.discard(task_id)
 
 
 class ETLService:
@@ -13,23 +59,78 @@ class ETLService:
     
     def __init__(self):
         self.repository = ETLRepository()
+        self.datasource_repository = DatasourceRepository()
+        self.model_repository = CachedModelRepository()
+        self.engine = ETLEngine()
     
     def get_all(self) -> List[Dict]:
         """获取所有ETLTask"""
-        tasks = self.repository.find_all()
+        tasks = self.repository.find_all(with_children=False)
         return [task.to_dict() for task in tasks]
     
-    def get_by_id(self, id: int) -> Optional[Dict]:
-        """根据ID获取ETLTask（包含Logs）"""
-        task = self.repository.find_by_id(id)
+    def get_page(self, limit: int = 100, cursor: Optional[int] = None) -> Dict:
+        """按id键集分页获取ETLTask，cursor为上一页返回的nextCursor"""
+        limit = normalize_limit(limit)
+        tasks = self.repository.find_all(limit=fetch_size(limit), after_id=cursor, with_children=False)
+        tasks, next_cursor = split_page(tasks, limit)
+        return {
+            "items": [task.to_dict() for task in tasks],
+            "nextCursor": next_cursor
+        }
+    
+    def iter_tasks(self) -> Iterator[Dict]:
+        """流式获取ETLTask"""
+        for task in self.repository.iter_all():
+            yield task.to_dict()
+    
+    def task_exists(self, id: int) -> bool:
+        """ETLTask是否存在"""
+        return self.repository.find_by_id(id, with_children=False) is not None
+    
+    def get_logs(self, task_id: int, limit: Optional[int] = None, cursor: Optional[int] = None) -> Dict:
+        """获取任务的Logs（传入limit时按id键集分页）"""
+        limit = normalize_limit(limit)
+        logs = self.repository.find_logs(task_id, limit=fetch_size(limit), after_id=cursor)
+        logs, next_cursor = split_page(logs, limit)
+        return {
+            "items": [log.to_dict() for log in logs],
+            "nextCursor": next_cursor
+        }
+    
+    def iter_logs(self, task_id: int) -> Iterator[Dict]:
+        """流式获取任务的Logs"""
+        for log in self.repository.iter_logs(task_id):
+            yield log.to_dict()
+    
+    def get_by_id(self, id: int, limit: Optional[int] = None, cursor: Optional[int] = None) -> Optional[Dict]:
+        """
+        根据ID获取ETLTask（包含Logs）
+        
+        传入limit时Logs按id键集分页，cursor为上一页返回的nextCursor
+        """
+        if limit is None:
+            task = self.repository.find_by_id(id)
+            if not task:
+                return None
+            return {
+                "task": task.to_dict(),
+                "logs": [log.to_dict() for log in task.logs]
+            }
+        
+        task = self.repository.find_by_id(id, with_children=False)
         if not task:
             return None
         
+        limit = normalize_limit(limit)
+        logs = self.repository.find_logs(id, limit=fetch_size(limit), after_id=cursor)
+        logs, next_cursor = split_page(logs, limit)
         return {
             "task": task.to_dict(),
-            "logs": [log.to_dict() for log in task.logs]
+            "logs": [log.to_dict() for log in logs],
+            "nextCursor": next_cursor
         }
     
+    @writes(ETL)
     def create_task(self, data: dict) -> Dict:
         """创建ETLTask"""
         task = ETLTask.from_dict({
@@ -46,8 +147,10 @@ class ETLService:
         })
         
         task = self.repository.save(task)
+        _notify(task)
         return task.to_dict()
     
+    @writes(ETL)
     def activate_task(self, id: int) -> Optional[Dict]:
         """激活ETLTask"""
         task = self.repository.find_by_id(id)
@@ -56,8 +159,10 @@ class ETLService:
         
         task.activate()
         task = self.repository.save(task)
+        _notify(task)
         return task.to_dict()
     
+    @writes(ETL)
     def pause_task(self, id: int) -> Optional[Dict]:
         """暂停ETLTask"""
         task = self.repository.find_by_id(id)
@@ -66,18 +171,97 @@ class ETLService:
         
         task.pause()
         task = self.repository.save(task)
+        _notify(task)
         return task.to_dict()
     
-    def start_task(self, id: int) -> Optional[Dict]:
-        """启动ETLTask执行"""
-        task = self.repository.find_by_id(id)
-        if not task:
+    @writes(ETL)
+    def start_task(self, id: int, wait: bool = False) -> Optional[Dict]:
+        """
+        启动ETLTask执行
+        
+        任务置为running并追加一条running日志，随后在后台线程中执行数据抽取；
+        执行结束后日志记录处理数，任务置为active（失败时为error）。
+        wait=True时在当前线程执行完再返回
+        """
+        return self._start(id, wait)
+    
+    @writes(ETL)
+    def run_scheduled(self, id: int, next_run: Optional[str]) -> Optional[Dict]:
+        """
+        由调度器触发执行，并在同一次保存中写入下一次调度日期
+        
+        任务不存在、不是active状态或正在执行时跳过，返回None
+        """
+        try:
+            return self._start(id, wait=False, next_run=next_run)
+        except ValueError:
             return None
+    
+    def _start(self, id: int, wait: bool, next_run: Optional[str] = None) -> Optional[Dict]:
+        if not _claim(id):
+            raise ValueError(f"ETLTask {id} is already running")
+        try:
+            task = self.repository.find_by_id(id, with_children=False)
+            if not task:
+                _release(id)
+                return None
+            
+            task.start()
+            if next_run is not None:
+                task.nextRun = next_run
+            task = self.repository.save(task)
+            log = self.repository.append_log(ETLLog(id=0, taskId=id, status="running", startTime=get_current_date()))
+        except Exception:
+            _release(id)
+            raise
         
-        task.start()
-        task = self.repository.save(task)
+        return self._run(task, log, wait)
+    
+    @writes(ETL)
+    def resume_task(self, id: int, wait: bool = False) -> Optional[Dict]:
+        """
+        从断点继续中断的ETLTask执行
+        
+        继续上次失败的执行（沿用其ETLLog），已提交的批次不再重复抽取；
+        任务状态为running但本进程中并未执行（如进程退出）时，先把该次执行标记为中断再继续
+        """
+        if not _claim(id):
+            raise ValueError(f"ETLTask {id} is already running")
+        try:
+            task = self.repository.find_by_id(id, with_children=False)
+            if not task:
+                _release(id)
+                return None
+            
+            if task.status == "running":
+                latest = self.repository.find_latest_log(id)
+                if latest and latest.status == "running":
+                    latest.fail("Interrupted", get_current_date())
+                    self.repository.update_log(latest)
+                task.error(latest.id if latest else None)
+            
+            log = self.repository.find_log(task.resume())
+            if log is None or log.taskId != id:
+                raise ValueError(f"ETLLog {task.resume_log_id} of ETLTask {id} not found")
+            log.resume()
+            task = self.repository.save(task)
+            self.repository.update_log(log)
+        except Exception:
+            _release(id)
+            raise
+        
+        return self._run(task, log, wait)
+    
+    def _run(self, task: ETLTask, log: ETLLog, wait: bool) -> Dict:
+        """在当前线程（wait=True）或后台线程中执行已置为running的任务"""
+        if wait:
+            self._execute(task, log)
+            task = self.repository.find_by_id(task.id, with_children=False)
+        else:
+            _executor.submit(self._execute, task, log)
         return task.to_dict()
     
+    @writes(ETL)
     def complete_task(self, id: int) -> Optional[Dict]:
         """完成ETLTask执行"""
         task = self.repository.find_by_id(id)
@@ -86,15 +270,126 @@ class ETLService:
         
         task.complete()
         task = self.repository.save(task)
+        _notify(task)
         return task.to_dict()
     
-    def add_log(self, task_id: int, data: dict) -> Optional[Dict]:
-        """添加ETLLog到ETLTask"""
-        task = self.repository.find_by_id(task_id)
+    @writes(ETL)
+    def reset_watermark(self, id: int) -> Optional[Dict]:
+        """清除增量水位，下次执行重新读取全部源数据"""
+        task = self.repository.find_by_id(id, with_children=False)
         if not task:
             return None
         
-        log = ETLLog.from_dict({
+        task.reset_watermark()
+        task = self.repository.save(task)
+        _notify(task)
+        return task.to_dict()
+    
+    @writes(ETL)
+    def add_log(self, task_id: int, data: dict) -> Optional[Dict]:
+        """添加ETLLog到ETLTask（只追加日志行，不加载历史日志）"""
+        log = self.repository.append_log(self._build_log(task_id, data))
+        return log.to_dict() if log else None
+    
+    @writes(ETL)
+    def add_logs(self, task_id: int, items: List[dict]) -> Optional[List[Dict]]:
+        """批量添加ETLLog到ETLTask"""
+        logs = self.repository.append_logs(task_id, [self._build_log(task_id, data) for data in items])
+        if logs is None:
+            return None
+        return [log.to_dict() for log in logs]
+    
+    def progress_events(self, task_id: int, heartbeat: float = PROGRESS_HEARTBEAT) -> Iterator[Optional[tuple]]:
+        """
+        订阅任务的执行进度，生成 (事件类型, 数据)，心跳间隔内没有事件时生成None
+        
+        任务未在执行且没有进度事件时只生成一个status事件（任务当前状态）；
+        收到finished事件后结束
+        """
+        broker = get_progress_broker()
+        subscription = broker.subscribe(task_id)
+        try:
+            if subscription.empty() and task_id not in _running:
+                task = self.repository.find_by_id(task_id, with_children=False)
+                yield "status", task.to_dict() if task else {}
+                return
+            while True:
+                event = subscription.get(heartbeat)
+                yield event
+                if event is not None and event[0] == "finished":
+                    return
+        finally:
+            broker.unsubscribe(subscription)
+    
+    def _execute(self, task: ETLTask, log: ETLLog) -> None:
+        """执行数据抽取并记录结果（后台线程入口，不向外抛出异常）"""
+        broker = get_progress_broker()
+        broker.publish(task.id, "started", {"taskId": task.id, "logId": log.id})
+        try:
+            result = self.engine.run(
+                self._build_plan(task),
+                progress=lambda data: broker.publish(task.id, "progress", data),
+                checkpoints=CheckpointStore(task.id, log.id)
+            )
+            log.recordsProcessed = result.processed
+            log.recordsSuccess = result.success
+            log.recordsFailed = result.failed
+            log.details = json.dumps(result.to_details(), default=str)
+            log.complete(get_current_date())
+            self.repository.update_log(log)
+            self._finish_task(task.id, succeeded=True, watermark=self._watermark_value(result.watermark))
+        except Exception as e:
+            if log.status == "running":
+                log.fail(str(e), get_current_date())
+                self.repository.update_log(log)
+            self._finish_task(task.id, succeeded=False, resume_log_id=log.id)
+        finally:
+            _release(task.id)
+            bump_version(ETL)
+            broker.publish(task.id, "finished", {
+                "taskId": task.id,
+                "logId": log.id,
+                "status": log.status,
+                "recordsProcessed": log.recordsProcessed,
+                "recordsSuccess": log.recordsSuccess,
+                "recordsFailed": log.recordsFailed,
+                "errorMessage": log.errorMessage
+            })
+    
+    def _build_plan(self, task: ETLTask) -> ETLPlan:
+        datasource = self.datasource_repository.find_by_id(task.sourceDatasourceId)
+        if not datasource:
+            raise ValueError(f"Datasource {task.sourceDatasourceId} not found")
+        model = self.model_repository.find_by_id(task.targetModelId)
+        if not model:
+            raise ValueError(f"Model {task.targetModelId} not found")
+        return ETLPlan.build(task, datasource, model)
+    
+    def _finish_task(self, id: int, succeeded: bool, watermark=None, resume_log_id: Optional[int] = None) -> None:
+        """
+        执行结束后切换任务状态（任务已被手动完成时保持不变）
+        
+        成功时新的水位与状态在同一次保存中写入，失败时水位不变，下次从原水位重新读取；
+        失败时记录该次执行，之后可以从其断点继续
+        """
+        task = self.repository.find_by_id(id, with_children=False)
+        if not task or task.status != "running":
+            return
+        if succeeded:
+            task.complete(watermark=watermark)
+        else:
+            task.error(resume_log_id)
+        self.repository.save(task)
+        _notify(task)
+    
+    def _watermark_value(self, value):
+        """水位值保存在config(JSON)中：数值和字符串原样保存，日期时间等转为字符串"""
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        return str(value)
+    
+    def _build_log(self, task_id: int, data: dict) -> ETLLog:
+        return ETLLog.from_dict({
             "id": 0,
             "taskId": task_id,
             "status": data.get("status", "running"),
@@ -106,9 +401,3 @@ class ETLService:
             "errorMessage": data.get("errorMessage"),
             "details": data.get("details")
         })
-        
-        task.add_log(log)
-        task = self.repository.save(task)
-        
-        latest_log = task.get_latest_log()
-        return latest_log.to_dict() if latest_log else None
@@ -0,0 +1,277 @@
+"""
+Model批量导入
+把请求中的Model（嵌套Properties）和Relations整理成Model聚合，在内存中完成全部校验
+"""
+from typing import Optional, List, Dict, Set, Any, Iterable
+import json
+from meta.model import Model, Property
+from meta.shared import Relation
+
+# 一次最多导入的Model数
+MAX_IMPORT_MODELS = 5000
+# 校验失败时错误信息中最多列出的条数
+MAX_REPORTED_ERRORS = 20
+
+# 扁平行（CSV/Parquet，每行一个Property）中Model的列 -> Model字段
+MODEL_ROW_COLUMNS = {
+    "modelCode": "code",
+    "modelName": "name",
+    "modelDescription": "description",
+    "domainId": "domainId",
+    "creator": "creator"
+}
+# 布尔字段接受的文本（CSV中的值均为文本）
+_TRUE = ("true", "1", "yes", "y", "t")
+_FALSE = ("false", "0", "no", "n", "f", "")
+
+
+def group_property_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """
+    把扁平行按modelCode归并成嵌套的Model数据（保持首次出现的顺序）
+
+    Model字段取该modelCode的第一行；code为空的行只声明Model，不产生Property
+    """
+    models: Dict[Any, Dict] = {}
+    for row in rows:
+        key = row.get("modelCode")
+        model = models.get(key)
+        if model is None:
+            model = models[key] = {field: row.get(column) for column, field in MODEL_ROW_COLUMNS.items()}
+            model["properties"] = []
+        prop = {k: v for k, v in row.items() if k not in MODEL_ROW_COLUMNS}
+        if prop.get("code") not in (None, ""):
+            model["properties"].append(prop)
+    return list(models.values())
+
+
+class ModelImport:
+    """
+    一次批量导入
+
+    - models中每项为Model数据，可带properties列表；relations中每项的两端用sourceCode/targetCode
+      （同批新建的Model或已有Model的code）或sourceModelId/targetModelId（已有Model）指定
+    - 构造时完成结构校验并生成Model聚合（Property的code在Model内唯一沿用Model.add_property的规则），
+      resolve时按库中的数据校验引用；全部错误收集后由check一次报告
+    """
+
+    def __init__(self, models: List[Dict], relations: Optional[List[Dict]] = None):
+        self.errors: List[str] = []
+        self.models: List[Model] = []
+        self.relations: List[tuple] = []
+        self._codes: Dict[str, Model] = {}
+        self._positions: Dict[str, int] = {}
+        self._relation_data = relations or []
+        if not isinstance(models, list) or not models:
+            self._error("models", "must be a non-empty list")
+            return
+        if len(models) > MAX_IMPORT_MODELS:
+            self._error("models", f"at most {MAX_IMPORT_MODELS} models per import")
+            return
+        for index, data in enumerate(models):
+            self._add_model(f"models[{index}]", data)
+
+    def referenced_codes(self) -> Set[str]:
+        """需要在库中查找的code：新Model的code（查重）和Relation引用的code"""
+        codes = set(self._codes)
+        for data in self._relation_data:
+            if isinstance(data, dict):
+                codes.update(str(data[k]) for k in ("sourceCode", "targetCode") if data.get(k) not in (None, ""))
+        return codes
+
+    def referenced_model_ids(self) -> Set[int]:
+        ids = set()
+        for data in self._relation_data:
+            if isinstance(data, dict):
+                for key in ("sourceModelId", "targetModelId"):
+                    value = self._int(data.get(key))
+                    if value is not None:
+                        ids.add(value)
+        return ids
+
+    def referenced_domain_ids(self) -> Set[int]:
+        return {m.domainId for m in self.models if m.domainId is not None}
+
+    def resolve(self, existing_codes: Dict[str, int], existing_ids: Set[int], existing_domains: Set[int]) -> None:
+        """用库中的数据校验：新Model的code不能已存在、domainId必须存在，并解析Relation的两端"""
+        for index, model in enumerate(self.models):
+            if model.code in existing_codes:
+                self._error(f"models[{index}].code", f"Model with code '{model.code}' already exists")
+            if model.domainId is not None and model.domainId not in existing_domains:
+                self._error(f"models[{index}].domainId", f"Domain {model.domainId} not found")
+
+        if not isinstance(self._relation_data, list):
+            self._error("relations", "must be a list")
+            return
+        for index, data in enumerate(self._relation_data):
+            path = f"relations[{index}]"
+            if not isinstance(data, dict):
+                self._error(path, "must be an object")
+                continue
+            if not data.get("name"):
+                self._error(f"{path}.name", "is required")
+            source = self._endpoint(path, data, "source", existing_codes, existing_ids)
+            target = self._endpoint(path, data, "target", existing_codes, existing_ids)
+            if source is None or target is None or not data.get("name"):
+                continue
+            if source is target or source == target:
+                self._error(path, "Source and target Model cannot be the same")
+                continue
+            # 新建Model的ID在写入时才分配，这里先用负数占位
+            relation = Relation.from_dict({
+                "id": 0,
+                "name": data["name"],
+                "sourceModelId": self._placeholder(source),
+                "targetModelId": self._placeholder(target),
+                "type": data.get("type") or "one-to-many",
+                "description": data.get("description"),
+                "enabled": self._bool(f"{path}.enabled", data.get("enabled"), True)
+            })
+            is_valid, error = relation.is_valid()
+            if not is_valid:
+                self._error(f"{path}.type", error)
+            self.relations.append((relation, source, target))
+
+    def check(self) -> None:
+        """有错误时抛出ValueError，列出前MAX_REPORTED_ERRORS条"""
+        if not self.errors:
+            return
+        message = "; ".join(self.errors[:MAX_REPORTED_ERRORS])
+        if len(self.errors) > MAX_REPORTED_ERRORS:
+            message += f"; ... and {len(self.errors) - MAX_REPORTED_ERRORS} more"
+        raise ValueError(f"Import failed with {len(self.errors)} error(s): {message}")
+
+    def summary(self) -> Dict:
+        """导入结果：新Model的id和code，以及写入的Property和Relation数"""
+        return {
+            "models": [{"id": m.id, "code": m.code} for m in self.models],
+            "properties": sum(len(m.properties) for m in self.models),
+            "relations": len(self.relations)
+        }
+
+    # ---- 内部 ----
+
+    def _add_model(self, path: str, data: Any) -> None:
+        if not isinstance(data, dict):
+            self._error(path, "must be an object")
+            return
+        for field in ("name", "code"):
+            if data.get(field) in (None, ""):
+                self._error(f"{path}.{field}", "is required")
+        if data.get("name") in (None, "") or data.get("code") in (None, ""):
+            return
+
+        domain_id = self._int(data.get("domainId"))
+        if data.get("domainId") not in (None, "") and domain_id is None:
+            self._error(f"{path}.domainId", "must be an integer")
+        model = Model.from_dict({
+            "id": 0,
+            "name": str(data["name"]),
+            "code": str(data["code"]),
+            "description": data.get("description"),
+            "creator": data.get("creator") or "当前用户",
+            "domainId": domain_id
+        })
+        is_valid, error = model.validate_code()
+        if not is_valid:
+            self._error(f"{path}.code", error)
+        if model.code in self._codes:
+            self._error(f"{path}.code", f"duplicate Model code '{model.code}' in import")
+
+        properties = data.get("properties") or []
+        if not isinstance(properties, list):
+            self._error(f"{path}.properties", "must be a list")
+            properties = []
+        for index, prop_data in enumerate(properties):
+            self._add_property(f"{path}.properties[{index}]", model, prop_data)
+
+        self._codes.setdefault(model.code, model)
+        self._positions.setdefault(model.code, len(self.models))
+        self.models.append(model)
+
+    def _add_property(self, path: str, model: Model, data: Any) -> None:
+        if not isinstance(data, dict):
+            self._error(path, "must be an object")
+            return
+        missing = [f for f in ("name", "code", "type") if data.get(f) in (None, "")]
+        for field in missing:
+            self._error(f"{path}.{field}", "is required")
+        if missing:
+            return
+
+        constraints = data.get("constraints") or []
+        if isinstance(constraints, str):
+            try:
+                constraints = json.loads(constraints)
+            except json.JSONDecodeError:
+                self._error(f"{path}.constraints", "must be a JSON list")
+                constraints = []
+        prop = Property.from_dict({
+            "id": 0,
+            "name": str(data["name"]),
+            "code": str(data["code"]),
+            "type": str(data["type"]),
+            "modelId": model.id,
+            "required": self._bool(f"{path}.required", data.get("required"), False),
+            "description": data.get("description"),
+            "isPrimaryKey": self._bool(f"{path}.isPrimaryKey", data.get("isPrimaryKey"), False),
+            "isForeignKey": self._bool(f"{path}.isForeignKey", data.get("isForeignKey"), False),
+            "defaultValue": data.get("defaultValue"),
+            "constraints": constraints,
+            "sensitivityLevel": data.get("sensitivityLevel"),
+            "maskRule": data.get("maskRule"),
+            "physicalColumn": data.get("physicalColumn"),
+            "foreignKeyTable": data.get("foreignKeyTable"),
+            "foreignKeyColumn": data.get("foreignKeyColumn")
+        })
+        if model.get_property_by_code(prop.code):
+            self._error(f"{path}.code", f"duplicate Property code '{prop.code}' in Model '{model.code}'")
+            return
+        model.add_property(prop)
+
+    def _endpoint(self, path: str, data: Dict, side: str, existing_codes: Dict[str, int],
+                  existing_ids: Set[int]):
+        """Relation一端：同批新建的Model，或已有Model的ID；找不到时记录错误并返回None"""
+        code = data.get(f"{side}Code")
+        if code not in (None, ""):
+            code = str(code)
+            if code in self._codes:
+                return self._codes[code]
+            if code in existing_codes:
+                return existing_codes[code]
+            self._error(f"{path}.{side}Code", f"Model '{code}' not found")
+            return None
+        model_id = self._int(data.get(f"{side}ModelId"))
+        if model_id is None:
+            self._error(path, f"{side}Code or {side}ModelId is required")
+            return None
+        if model_id not in existing_ids:
+            self._error(f"{path}.{side}ModelId", f"Model {model_id} not found")
+            return None
+        return model_id
+
+    def _placeholder(self, endpoint) -> int:
+        return endpoint if isinstance(endpoint, int) else -1 - self._positions[endpoint.code]
+
+    def _bool(self, path: str, value: Any, default: bool) -> bool:
+        if value is None:
+            return default
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return default if text == "" else False
+        self._error(path, "must be a boolean")
+        return default
+
+    def _int(self, value: Any) -> Optional[int]:
+        if value is None or value == "" or isinstance(value, bool):
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _error(self, path: str, message: str) -> None:
+        self.errors.append(f"{path}: {message}")
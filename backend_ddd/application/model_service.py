@@ -2,23 +2,42 @@
 Model应用服务
 协调Model聚合的业务用例
 """
-from typing import Optional, List, Dict
-from infrastructure.repository.model_repository import ModelRepository
+from typing import Optional, List, Dict, Iterator
+from infrastructure.repository.cached_model_repository import CachedModelRepository, get_model_cache_stats
+from infrastructure.repository.model_data_repository import ModelDataRepository
+from infrastructure.repository.model_graph_repository import ModelGraphRepository, DEFAULT_MAX_NODES
+from infrastructure.repository.domain_repository import DomainRepository
+from infrastructure.persistence.file_reader import read_file_rows
+from infrastructure.cache.relation_graph import get_relation_graph
 from meta.model import Model, Property
 from meta.shared import Relation
 from infrastructure.persistence.db_connection import get_current_date
+from application.pagination import normalize_limit, fetch_size, split_page
+from application.versioning import writes, MODEL
+from application.model_import import ModelImport, group_property_rows
 
 
 class ModelService:
     """Model应用服务"""
     
     def __init__(self):
-        self.repository = ModelRepository()
+        self.repository = CachedModelRepository()
+        self.data_repository = ModelDataRepository()
+        self.graph_repository = ModelGraphRepository()
+        self.domain_repository = DomainRepository()
+        self.graph = get_relation_graph()
     
-    def get_all(self, domain_id: Optional[int] = None) -> Dict:
-        """获取所有Model，包含边信息"""
+    def get_all(self, domain_id: Optional[int] = None, limit: Optional[int] = None,
+                cursor: Optional[int] = None) -> Dict:
+        """
+        获取Model，包含边信息
+        
+        传入limit时按id键集分页，cursor为上一页返回的nextCursor
+        """
         filters = {"domainId": domain_id} if domain_id else None
-        models = self.repository.find_all(filters)
+        limit = normalize_limit(limit)
+        models = self.repository.find_all(filters, limit=fetch_size(limit), after_id=cursor)
+        models, next_cursor = split_page(models, limit)
         
         edges = []
         for model in models:
@@ -31,9 +50,46 @@ class ModelService:
         
         return {
             "models": [m.to_dict() for m in models],
-            "edges": edges
+            "edges": edges,
+            "nextCursor": next_cursor
         }
     
+    def get_graph(self, domain_id: Optional[int] = None, with_counts: bool = False,
+                  max_nodes: Optional[int] = None, cluster: bool = False) -> Dict:
+        """
+        画布用的节点和边（不加载Model聚合）
+        
+        节点数超过max_nodes或cluster为True时按Domain聚合为簇
+        """
+        if max_nodes is None:
+            max_nodes = DEFAULT_MAX_NODES
+        if max_nodes <= 0:
+            raise ValueError("maxNodes must be a positive integer")
+        return self.graph_repository.graph(domain_id, with_counts, max_nodes, cluster)
+    
+    def iter_models(self, domain_id: Optional[int] = None) -> Iterator[Dict]:
+        """流式获取Model（不含边信息）"""
+        filters = {"domainId": domain_id} if domain_id else None
+        for model in self.repository.iter_all(filters):
+            yield model.to_dict()
+    
+    def iter_properties(self, model_id: Optional[int] = None) -> Iterator[Dict]:
+        """流式获取Property（可按Model过滤）"""
+        for prop in self.repository.iter_properties(model_id):
+            yield prop.to_dict()
+    
+    def iter_data(self, model_id: int, table: Optional[str] = None,
+                  limit: Optional[int] = None) -> Optional[Iterator[Dict]]:
+        """
+        流式获取Model的数据记录（敏感字段按maskRule脱敏）
+        
+        Model不存在、数据表不存在或table不是该Model的数据表时返回None
+        """
+        model = self.repository.find_by_id(model_id)
+        if not model:
+            return None
+        return self.data_repository.iter_records(model, table, limit)
+    
     def get_by_id(self, id: int) -> Optional[Dict]:
         """根据ID获取Model（包含Properties和Relations）"""
         model = self.repository.find_by_id(id)
@@ -46,6 +102,7 @@ class ModelService:
             "relations": [r.to_dict() for r in model.relations]
         }
     
+    @writes(MODEL)
     def create_model(self, data: dict) -> Dict:
         """创建Model"""
         model = Model.from_dict({
@@ -61,6 +118,7 @@ class ModelService:
         model = self.repository.save(model)
         return model.to_dict()
     
+    @writes(MODEL)
     def update_model(self, id: int, data: dict) -> Optional[Dict]:
         """更新Model"""
         model = self.repository.find_by_id(id)
@@ -75,10 +133,12 @@ class ModelService:
         model = self.repository.save(model)
         return model.to_dict()
     
+    @writes(MODEL)
     def delete_model(self, id: int) -> bool:
         """删除Model"""
         return self.repository.delete(id)
     
+    @writes(MODEL)
     def add_property(self, model_id: int, data: dict) -> Optional[Dict]:
         """添加Property到Model"""
         model = self.repository.find_by_id(model_id)
@@ -110,6 +170,7 @@ class ModelService:
         added_prop = model.get_property_by_code(property.code)
         return added_prop.to_dict() if added_prop else None
     
+    @writes(MODEL)
     def remove_property(self, model_id: int, property_id: int) -> bool:
         """从Model移除Property"""
         model = self.repository.find_by_id(model_id)
@@ -120,6 +181,7 @@ class ModelService:
         self.repository.save(model)
         return True
     
+    @writes(MODEL)
     def add_relation(self, data: dict) -> Optional[Dict]:
         """添加Relation"""
         relation = Relation.from_dict({
@@ -142,12 +204,53 @@ class ModelService:
         added_rel = next((r for r in source_model.relations if r.id == relation.id), None)
         return added_rel.to_dict() if added_rel else None
     
+    @writes(MODEL)
+    def import_models(self, models: List[dict], relations: Optional[List[dict]] = None) -> Dict:
+        """
+        批量导入Model（嵌套Properties）和Relations
+        
+        全部在内存中校验（有错误时不写入任何数据），再由仓储按块分配ID、在一个事务中集合写入
+        """
+        batch = ModelImport(models, relations)
+        batch.resolve(
+            self.repository.find_ids_by_code(batch.referenced_codes()),
+            self.repository.find_existing_ids(batch.referenced_model_ids()),
+            self.domain_repository.find_existing_ids(batch.referenced_domain_ids())
+        )
+        batch.check()
+        self.repository.import_models(batch.models, batch.relations)
+        return batch.summary()
+    
+    def import_files(self, models_path: str, format: str, relations_path: Optional[str] = None) -> Dict:
+        """从CSV/Parquet文件批量导入：models文件每行一个Property，relations文件每行一个Relation"""
+        models = group_property_rows(read_file_rows(models_path, format))
+        relations = read_file_rows(relations_path, format) if relations_path else []
+        return self.import_models(models, relations)
+    
+    def get_relation(self, relation_id: int) -> Optional[Dict]:
+        """根据ID获取Relation"""
+        relation = self.repository.find_relation(relation_id)
+        return relation.to_dict() if relation else None
+    
+    @writes(MODEL)
     def remove_relation(self, relation_id: int) -> bool:
-        """删除Relation"""
-        models = self.repository.find_all()
-        for model in models:
-            if any(r.id == relation_id for r in model.relations):
-                model.remove_relation(relation_id)
-                self.repository.save(model)
-                return True
-        return False
+        """删除Relation（按ID直接删除，不加载Model聚合）"""
+        return self.repository.delete_relation(relation_id) is not None
+    
+    def get_neighbors(self, model_id: int, hops: int = 1, direction: str = "both") -> Optional[Dict]:
+        """Model的k跳邻域（节点距离和经过的边），Model不存在时返回None"""
+        return self.graph.neighborhood(model_id, hops, direction)
+    
+    def get_path(self, source_id: int, target_id: int, direction: str = "both") -> Optional[Dict]:
+        """两个Model之间的最短Relation路径，任一Model不存在时返回None"""
+        return self.graph.shortest_path(source_id, target_id, direction)
+    
+    def get_components(self, domain_id: Optional[int] = None) -> List[Dict]:
+        """各Domain内由Relation连通的Model分组"""
+        return self.graph.components(domain_id)
+    
+    def cache_stats(self) -> Dict:
+        """Model缓存的命中统计和Relation图索引的状态"""
+        stats = get_model_cache_stats()
+        stats["relationGraph"] = self.graph.stats()
+        return stats
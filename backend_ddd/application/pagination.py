@@ -0,0 +1,34 @@
+"""
+分页工具
+列表接口使用基于id的键集分页：cursor为上一页最后一条记录的id
+"""
+from typing import Optional, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# 单页最大条数
+MAX_PAGE_SIZE = 1000
+
+
+def normalize_limit(limit: Optional[int]) -> Optional[int]:
+    """限制每页条数在[1, MAX_PAGE_SIZE]之间；None表示不分页"""
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def fetch_size(limit: Optional[int]) -> Optional[int]:
+    """多取一条用于判断是否还有下一页"""
+    return limit + 1 if limit is not None else None
+
+
+def split_page(items: List[T], limit: Optional[int]) -> Tuple[List[T], Optional[int]]:
+    """
+    截取一页结果并计算nextCursor
+    
+    items应按fetch_size(limit)查询得到；没有下一页时nextCursor为None
+    """
+    if limit is None or len(items) <= limit:
+        return items, None
+    page = items[:limit]
+    return page, page[-1].id
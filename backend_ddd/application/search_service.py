@@ -0,0 +1,37 @@
+"""
+搜索应用服务
+在Model、Property和Datasource中按相关度搜索
+"""
+from typing import Optional, List, Dict
+from infrastructure.search.search_index import get_search_index
+from application.pagination import normalize_limit
+
+# 未传limit时的每页条数
+DEFAULT_SEARCH_LIMIT = 20
+
+
+class SearchService:
+    """搜索应用服务"""
+    
+    def __init__(self):
+        self.index = get_search_index()
+    
+    def search(self, query: str, types: Optional[List[str]] = None, domain_id: Optional[int] = None,
+               limit: Optional[int] = None, cursor: Optional[int] = None) -> Dict:
+        """
+        按相关度分页返回命中
+        
+        结果按得分排序而非id，cursor为上一页返回的nextCursor（即已返回的条数）
+        """
+        limit = normalize_limit(limit) or DEFAULT_SEARCH_LIMIT
+        offset = max(cursor or 0, 0)
+        hits, total = self.index.search(query or "", types, domain_id, limit, offset)
+        return {
+            "items": hits,
+            "total": total,
+            "nextCursor": offset + limit if offset + limit < total else None
+        }
+    
+    def stats(self) -> Dict:
+        """搜索索引的状态"""
+        return self.index.stats()
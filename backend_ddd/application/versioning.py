@@ -0,0 +1,75 @@
+"""
+资源版本号
+应用服务在写路径上递增版本号，接口层据此生成ETag，无需查询数据库即可判断数据是否变化
+"""
+from functools import wraps
+from typing import Dict
+import threading
+import uuid
+
+# 有版本号的资源
+MODEL = 'model'
+DATASOURCE = 'datasource'
+DOMAIN = 'domain'
+ETL = 'etl'
+
+
+class ResourceVersions:
+    """
+    进程内资源版本号
+
+    - 每个资源一个单调递增的计数器，任一写操作后递增
+    - boot_id在进程启动时随机生成，进程重启后旧的ETag全部失效
+    - 计数器只在本进程内可见：多进程部署或绕过应用服务直接写库时不会递增
+    """
+
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:12]
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def current(self, resource: str) -> int:
+        """资源当前版本号"""
+        with self._lock:
+            return self._versions.get(resource, 0)
+
+    def bump(self, resource: str) -> int:
+        """递增资源版本号"""
+        with self._lock:
+            version = self._versions.get(resource, 0) + 1
+            self._versions[resource] = version
+            return version
+
+    def tag(self, resource: str) -> str:
+        """资源当前版本的标识（boot_id-版本号）"""
+        return f"{self.boot_id}-{self.current(resource)}"
+
+
+_versions = ResourceVersions()
+
+
+def get_resource_versions() -> ResourceVersions:
+    """获取进程级资源版本号"""
+    return _versions
+
+
+def bump_version(resource: str) -> int:
+    """递增资源版本号"""
+    return _versions.bump(resource)
+
+
+def writes(resource: str):
+    """
+    标记应用服务的写方法：方法返回或抛出异常后都递增版本号
+
+    异常时事务已回滚，多递增一次只会让客户端多取一次数据
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _versions.bump(resource)
+        return wrapper
+    return decorator
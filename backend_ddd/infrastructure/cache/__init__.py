@@ -0,0 +1,8 @@
+"""
+缓存层
+提供进程内缓存
+"""
+from .lru_cache import LRUCache
+from .relation_graph import RelationGraph, get_relation_graph
+
+__all__ = ['LRUCache', 'RelationGraph', 'get_relation_graph']
@@ -0,0 +1,292 @@
+"""
+Relation图索引
+进程内的Model关系邻接表，支持邻域、最短路径和连通分量查询，不加载Model聚合
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import threading
+from infrastructure.persistence.db_connection import get_db_connection
+
+# 遍历方向：out沿Relation方向（source -> target），in逆向，both不区分方向
+DIRECTIONS = ("out", "in", "both")
+# 邻域查询的最大跳数
+MAX_HOPS = 6
+# 邻域查询默认最多返回的节点数
+DEFAULT_NODE_LIMIT = 5000
+
+EdgeRow = Tuple[int, int, int]  # (relation id, sourceModelId, targetModelId)
+
+
+class RelationGraph:
+    """
+    Model关系图索引
+
+    - 节点为Model（记录domainId），边为Relation；按Model ID维护出边和入边邻接表
+    - 首次查询时用两次查询（models、relations）整体构建，之后由ModelRepository在save/delete后增量维护
+    - 构建期间发生的写入会使本次构建作废并重新读取，避免漏掉并发写入
+    - 查询在锁内完成，返回普通的dict/list
+    """
+
+    def __init__(self):
+        self._domains: Dict[int, Optional[int]] = {}
+        self._out: Dict[int, Dict[int, int]] = {}  # model -> {relation id: target}
+        self._in: Dict[int, Dict[int, int]] = {}  # model -> {relation id: source}
+        self._edges: Dict[int, Tuple[int, int]] = {}  # relation id -> (source, target)
+        self._loaded = False
+        self._version = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.builds = 0
+        self.updates = 0
+
+    # ---- 维护 ----
+
+    def refresh_model(self, model_id: int, domain_id: Optional[int], rows: Iterable[EdgeRow]) -> None:
+        """用库中与model_id相连的全部Relation替换它在图中的边（Model保存后调用）"""
+        with self._lock:
+            self._version += 1
+            if not self._loaded:
+                return
+            self._domains[model_id] = domain_id
+            self._detach(model_id)
+            for relation_id, source, target in rows:
+                self._add_edge(relation_id, source, target)
+            self.updates += 1
+
+    def add_models(self, models: Iterable[Tuple[int, Optional[int]]], rows: Iterable[EdgeRow]) -> None:
+        """加入新建的Model（(id, domainId)）和新建的边（批量导入后调用，不改动已有的边）"""
+        with self._lock:
+            self._version += 1
+            if not self._loaded:
+                return
+            for model_id, domain_id in models:
+                self._domains[model_id] = domain_id
+            for relation_id, source, target in rows:
+                self._add_edge(relation_id, source, target)
+            self.updates += 1
+
+    def remove_model(self, model_id: int) -> None:
+        """删除Model及与它相连的边"""
+        with self._lock:
+            self._version += 1
+            if not self._loaded:
+                return
+            self._detach(model_id)
+            self._domains.pop(model_id, None)
+            self._out.pop(model_id, None)
+            self._in.pop(model_id, None)
+            self.updates += 1
+
+    def remove_relation(self, relation_id: int) -> None:
+        """删除单条边"""
+        with self._lock:
+            self._version += 1
+            if not self._loaded:
+                return
+            edge = self._edges.pop(relation_id, None)
+            if edge is not None:
+                source, target = edge
+                self._out.get(source, {}).pop(relation_id, None)
+                self._in.get(target, {}).pop(relation_id, None)
+            self.updates += 1
+
+    # ---- 查询 ----
+
+    def contains(self, model_id: int) -> bool:
+        self._ensure()
+        with self._lock:
+            return model_id in self._domains
+
+    def neighborhood(self, model_id: int, hops: int = 1, direction: str = "both",
+                     limit: int = DEFAULT_NODE_LIMIT) -> Optional[Dict]:
+        """
+        model_id的k跳邻域
+
+        返回各节点到中心的距离，以及从距离小于hops的节点沿direction展开时经过的边；
+        节点数超过limit时截断（truncated为True）。Model不存在时返回None
+        """
+        self._check_direction(direction)
+        if not isinstance(hops, int) or not 1 <= hops <= MAX_HOPS:
+            raise ValueError(f"hops must be an integer between 1 and {MAX_HOPS}")
+        self._ensure()
+        with self._lock:
+            if model_id not in self._domains:
+                return None
+            distances = {model_id: 0}
+            edges: Dict[int, Tuple[int, int]] = {}
+            truncated = False
+            frontier = deque([model_id])
+            while frontier:
+                node = frontier.popleft()
+                if distances[node] >= hops:
+                    continue
+                for relation_id, neighbor in self._neighbors(node, direction):
+                    if neighbor not in distances:
+                        if len(distances) >= limit:
+                            truncated = True
+                            continue
+                        distances[neighbor] = distances[node] + 1
+                        frontier.append(neighbor)
+                    edges[relation_id] = self._edges[relation_id]
+            return {
+                "modelId": model_id,
+                "hops": hops,
+                "direction": direction,
+                "nodes": [
+                    {"id": node, "distance": distance, "domainId": self._domains.get(node)}
+                    for node, distance in distances.items()
+                ],
+                "edges": [
+                    {"id": relation_id, "source": source, "target": target}
+                    for relation_id, (source, target) in edges.items()
+                    if source in distances and target in distances
+                ],
+                "truncated": truncated
+            }
+
+    def shortest_path(self, source_id: int, target_id: int, direction: str = "both") -> Optional[Dict]:
+        """
+        两个Model之间经过Relation最少的路径（广度优先）
+
+        任一Model不存在时返回None；不可达时length为None
+        """
+        self._check_direction(direction)
+        self._ensure()
+        with self._lock:
+            if source_id not in self._domains or target_id not in self._domains:
+                return None
+            parents: Dict[int, Optional[Tuple[int, int]]] = {source_id: None}  # node -> (前驱节点, relation id)
+            frontier = deque([source_id])
+            while frontier and target_id not in parents:
+                node = frontier.popleft()
+                for relation_id, neighbor in self._neighbors(node, direction):
+                    if neighbor not in parents:
+                        parents[neighbor] = (node, relation_id)
+                        frontier.append(neighbor)
+
+            nodes: List[int] = []
+            relations: List[int] = []
+            if target_id in parents:
+                node = target_id
+                while node is not None:
+                    nodes.append(node)
+                    step = parents[node]
+                    if step is None:
+                        break
+                    node, relation_id = step
+                    relations.append(relation_id)
+                nodes.reverse()
+                relations.reverse()
+            return {
+                "source": source_id,
+                "target": target_id,
+                "direction": direction,
+                "length": len(relations) if nodes else None,
+                "nodes": nodes,
+                "relations": relations
+            }
+
+    def components(self, domain_id: Optional[int] = None) -> List[Dict]:
+        """
+        各Domain内的连通分量（不区分Relation方向，跨Domain的Relation不连通分量）
+
+        传入domain_id时只计算该Domain；结果按分量大小降序
+        """
+        self._ensure()
+        with self._lock:
+            nodes = [
+                node for node, domain in self._domains.items()
+                if domain_id is None or domain == domain_id
+            ]
+            seen: Set[int] = set()
+            components = []
+            for start in sorted(nodes):
+                if start in seen:
+                    continue
+                domain = self._domains[start]
+                members = [start]
+                seen.add(start)
+                frontier = deque([start])
+                while frontier:
+                    node = frontier.popleft()
+                    for _, neighbor in self._neighbors(node, "both"):
+                        if neighbor not in seen and self._domains.get(neighbor) == domain:
+                            seen.add(neighbor)
+                            members.append(neighbor)
+                            frontier.append(neighbor)
+                components.append({"domainId": domain, "size": len(members), "modelIds": sorted(members)})
+            components.sort(key=lambda c: (-c["size"], c["modelIds"][0]))
+            return components
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "models": len(self._domains),
+                "relations": len(self._edges),
+                "builds": self.builds,
+                "updates": self.updates
+            }
+
+    # ---- 内部 ----
+
+    def _ensure(self) -> None:
+        if self._loaded:
+            return
+        with self._build_lock:
+            while not self._loaded:
+                with self._lock:
+                    version = self._version
+                models, relations = self._read()
+                with self._lock:
+                    if self._version != version:
+                        continue
+                    self._domains = {model_id: domain_id for model_id, domain_id in models}
+                    self._out, self._in, self._edges = {}, {}, {}
+                    for relation_id, source, target in relations:
+                        self._add_edge(relation_id, source, target)
+                    self._loaded = True
+                    self.builds += 1
+
+    def _read(self) -> Tuple[List[tuple], List[EdgeRow]]:
+        conn = get_db_connection()
+        try:
+            models = conn.execute("SELECT id, domainId FROM models").fetchall()
+            relations = conn.execute("SELECT id, sourceModelId, targetModelId FROM relations").fetchall()
+            return models, relations
+        finally:
+            conn.close()
+
+    def _add_edge(self, relation_id: int, source: int, target: int) -> None:
+        self._edges[relation_id] = (source, target)
+        self._out.setdefault(source, {})[relation_id] = target
+        self._in.setdefault(target, {})[relation_id] = source
+        self._domains.setdefault(source, None)
+        self._domains.setdefault(target, None)
+
+    def _detach(self, model_id: int) -> None:
+        """删除与model_id相连的全部边"""
+        for relation_id, target in self._out.pop(model_id, {}).items():
+            self._edges.pop(relation_id, None)
+            self._in.get(target, {}).pop(relation_id, None)
+        for relation_id, source in self._in.pop(model_id, {}).items():
+            self._edges.pop(relation_id, None)
+            self._out.get(source, {}).pop(relation_id, None)
+
+    def _neighbors(self, node: int, direction: str) -> Iterable[Tuple[int, int]]:
+        if direction in ("out", "both"):
+            yield from self._out.get(node, {}).items()
+        if direction in ("in", "both"):
+            yield from self._in.get(node, {}).items()
+
+    def _check_direction(self, direction: str) -> None:
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {list(DIRECTIONS)}")
+
+
+_graph = RelationGraph()
+
+
+def get_relation_graph() -> RelationGraph:
+    """获取进程级Relation图索引"""
+    return _graph
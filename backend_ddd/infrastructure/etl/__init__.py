@@ -0,0 +1,20 @@
+"""
+ETL执行层
+把数据源中的数据按Mapping转换后加载到目标Model的数据表
+"""
+from .engine import ETLEngine, ETLPlan, ETLResult, ColumnMapping
+from .progress import ProgressTracker
+from .checkpoint import Checkpoint, CheckpointStore
+from .pipeline import Pipeline, StageMetrics
+
+__all__ = [
+    'ETLEngine',
+    'ETLPlan',
+    'ETLResult',
+    'ColumnMapping',
+    'ProgressTracker',
+    'Checkpoint',
+    'CheckpointStore',
+    'Pipeline',
+    'StageMetrics'
+]
@@ -0,0 +1,116 @@
+"""
+ETL断点
+每批数据与该批的断点在同一事务中提交，执行中断后从最后提交的批次继续
+"""
+from typing import Dict, List, Optional
+from datetime import datetime
+import json
+from infrastructure.persistence.db_connection import get_connection_manager
+from infrastructure.persistence.id_allocator import next_id as allocate_id, ensure_sequence
+
+CHECKPOINT_TABLE = "etl_checkpoints"
+
+
+def ensure_checkpoint_table(conn) -> None:
+    """创建断点表及其ID序列（已存在则跳过）"""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+        id INTEGER PRIMARY KEY,
+        taskId INTEGER NOT NULL,
+        logId INTEGER NOT NULL,
+        partitionIndex INTEGER NOT NULL,
+        batchIndex INTEGER NOT NULL,
+        rangeStart BIGINT NOT NULL,
+        rangeEnd BIGINT NOT NULL,
+        position BIGINT NOT NULL,
+        recordsProcessed BIGINT DEFAULT 0,
+        recordsSuccess BIGINT DEFAULT 0,
+        recordsFailed BIGINT DEFAULT 0,
+        details TEXT,
+        createdAt TIMESTAMP
+    )
+    """)
+    ensure_sequence(conn, CHECKPOINT_TABLE)
+
+
+# 打开数据库时建表，不在写断点的事务里执行DDL
+get_connection_manager().on_open(ensure_checkpoint_table)
+
+
+class Checkpoint:
+    """
+    一个分区的断点
+
+    - 分区负责源表rowid范围 [rangeStart, rangeEnd]，position之前的行已提交
+    - 记录数为该分区到此为止的累计值，details保存累计的各检查失败数和失败行样本
+    - 顺序执行时只有分区0
+    """
+
+    def __init__(self, partition: int, batch: int, range_start: int, range_end: int, position: int,
+                 processed: int = 0, success: int = 0, failed: int = 0,
+                 failures: Optional[Dict[str, int]] = None, samples: Optional[List[Dict]] = None):
+        self.partition = partition
+        self.batch = batch
+        self.range_start = range_start
+        self.range_end = range_end
+        self.position = position
+        self.processed = processed
+        self.success = success
+        self.failed = failed
+        self.failures = failures or {}
+        self.samples = samples or []
+
+    @property
+    def remaining(self) -> tuple:
+        """尚未提交的rowid范围"""
+        return (self.position, self.range_end)
+
+
+class CheckpointStore:
+    """一次执行（ETLLog）的断点"""
+
+    def __init__(self, task_id: int, log_id: int):
+        self.task_id = task_id
+        self.log_id = log_id
+
+    @property
+    def key(self) -> str:
+        """本次执行的标识，用于命名需要跨中断保留的分区表"""
+        return f"{self.task_id}_{self.log_id}"
+
+    def load(self, conn) -> Dict[int, Checkpoint]:
+        """各分区最新的断点"""
+        rows = conn.execute(
+            f"""SELECT partitionIndex, batchIndex, rangeStart, rangeEnd, position,
+            recordsProcessed, recordsSuccess, recordsFailed, details
+            FROM {CHECKPOINT_TABLE} WHERE logId = ?
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY partitionIndex ORDER BY batchIndex DESC) = 1
+            ORDER BY partitionIndex""",
+            (self.log_id,)
+        ).fetchall()
+        checkpoints = {}
+        for row in rows:
+            details = json.loads(row[8]) if row[8] else {}
+            checkpoints[row[0]] = Checkpoint(
+                row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7],
+                details.get("failures"), details.get("samples")
+            )
+        return checkpoints
+
+    def save(self, conn, checkpoint: Checkpoint) -> None:
+        """写入断点（在调用方的事务中执行，与该批数据一起提交）"""
+        conn.execute(
+            f"""INSERT INTO {CHECKPOINT_TABLE}
+            (id, taskId, logId, partitionIndex, batchIndex, rangeStart, rangeEnd, position,
+             recordsProcessed, recordsSuccess, recordsFailed, details, createdAt)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (allocate_id(conn, CHECKPOINT_TABLE), self.task_id, self.log_id, checkpoint.partition,
+             checkpoint.batch, checkpoint.range_start, checkpoint.range_end, checkpoint.position,
+             checkpoint.processed, checkpoint.success, checkpoint.failed,
+             json.dumps({"failures": checkpoint.failures, "samples": checkpoint.samples}, default=str),
+             datetime.now())
+        )
+
+    def clear(self, conn) -> None:
+        """删除任务的全部断点（执行成功或重新开始时）"""
+        conn.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE taskId = ?", (self.task_id,))
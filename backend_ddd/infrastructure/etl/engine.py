@@ -0,0 +1,747 @@
+"""
+ETL执行引擎
+按Mapping把源表字段转换为目标Model的物理列，分批经过抽取、校验、脱敏、加载阶段写入DuckDB目标表
+"""
+from typing import Optional, List, Dict, Iterator, Iterable, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor
+import time
+import uuid
+import duckdb
+from infrastructure.persistence.db_connection import get_dedicated_connection
+from infrastructure.persistence.id_allocator import ID_TABLES
+from infrastructure.etl.sql import quote_ident, quote_literal, duckdb_type, data_table_name
+from infrastructure.etl.source import source_table
+from infrastructure.etl.validator import ModelValidator
+from infrastructure.etl.progress import ProgressTracker
+from infrastructure.etl.checkpoint import Checkpoint, CheckpointStore
+from infrastructure.etl.masking import masked_sql
+from infrastructure.etl.pipeline import Pipeline, StageMetrics, DEFAULT_DEPTH
+from meta.datasource import Datasource
+from meta.etl import ETLTask
+from meta.model import Model, Property
+
+# 每批处理的源表行数（按rowid划分窗口）
+DEFAULT_BATCH_SIZE = 100000
+# 批次表所在的内存数据库（ATTACH对整个DuckDB实例可见，流水线各阶段的游标都能访问）
+MEMORY_DATABASE = "etl_mem"
+# 批次表的表名前缀
+BATCH_PREFIX = "_etl_batch_"
+# 批次表中保存源字段原始值的列名前缀（用于类型检查和失败样本）
+RAW_PREFIX = "_etl_src_"
+# 批次表中记录源表rowid的列
+ROWID_COLUMN = "_etl_rowid"
+# 批次表中记录水位列值的列
+WATERMARK_COLUMN = "_etl_watermark"
+# ETLLog.details中保留的失败行样本数
+SAMPLE_SIZE = 20
+# 单个任务的最大并行分区数（每个分区占用一个专用数据库连接，不占请求的连接池）
+MAX_PARALLELISM = 4
+# 并行抽取时分区结果表的表名前缀
+PARTITION_PREFIX = "_etl_part_"
+# 加载模式：append追加写入，merge按主键Property插入或更新
+LOAD_MODES = ("append", "merge")
+# merge模式下去重并标记插入/更新/不变后的待合并表（临时表）
+MERGE_TABLE = "etl_merge"
+# 待合并表中记录合并动作的列
+ACTION_COLUMN = "_etl_action"
+
+
+class ColumnMapping:
+    """源字段到目标Property物理列的映射"""
+
+    def __init__(self, source_field: str, prop: Property):
+        self.source_field = source_field
+        self.property = prop
+
+    @property
+    def target_column(self) -> str:
+        return self.property.physicalColumn or self.property.code
+
+    @property
+    def sql_type(self) -> str:
+        return duckdb_type(self.property.type)
+
+    @property
+    def source_sql(self) -> str:
+        """源字段表达式（源表别名为src）"""
+        return f"src.{quote_ident(self.source_field)}"
+
+    @property
+    def converted_sql(self) -> str:
+        """转换为目标类型后的表达式，无法转换时为NULL"""
+        return f"TRY_CAST({self.source_sql} AS {self.sql_type})"
+
+    @property
+    def raw_column(self) -> str:
+        """批次表中保存源字段原始值的列"""
+        return f"{RAW_PREFIX}{self.target_column}"
+
+
+class ETLPlan:
+    """
+    一次ETL执行的计划
+
+    由ETLTask、源Datasource（含Mappings）和目标Model（含Properties）解析得到；
+    task.config可覆盖sourceTable、targetTable、batchSize、parallelism、loadMode、
+    pipelineDepth和maskOnLoad，配置watermarkColumn时只读取该列大于上次水位（config.watermark）的源数据
+    """
+
+    def __init__(
+        self,
+        task: ETLTask,
+        datasource: Datasource,
+        model: Model,
+        source_table: str,
+        target_table: str,
+        columns: List[ColumnMapping],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        parallelism: int = 1,
+        load_mode: str = "append",
+        pipeline_depth: int = DEFAULT_DEPTH,
+        mask_on_load: bool = False
+    ):
+        self.task = task
+        self.datasource = datasource
+        self.model = model
+        self.source_table = source_table
+        self.target_table = target_table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.parallelism = parallelism
+        self.load_mode = load_mode
+        self.pipeline_depth = pipeline_depth
+        self.mask_on_load = mask_on_load
+        self.watermark_column = task.watermark_column
+        self.watermark = task.watermark
+        self.validator = ModelValidator.compile(
+            [(quote_ident(c.raw_column), quote_ident(c.target_column), c.sql_type, c.target_column, c.property)
+             for c in columns],
+            required=self.key_columns if self.merge else ()
+        )
+    
+    @property
+    def merge(self) -> bool:
+        return self.load_mode == "merge"
+
+    @property
+    def key_columns(self) -> List[str]:
+        """目标Model主键Property对应的物理列（merge模式按其匹配目标表已有行）"""
+        return [p.physicalColumn or p.code for p in self.model.properties if p.isPrimaryKey]
+
+    @property
+    def defaults(self) -> List[Property]:
+        """没有映射但有默认值的Property，加载时填入默认值"""
+        mapped = {c.property.id for c in self.columns}
+        return [p for p in self.model.properties if p.id not in mapped and p.defaultValue is not None]
+
+    def mask_selects(self) -> List[Tuple[str, str]]:
+        """maskOnLoad时需要脱敏的映射列及其脱敏表达式"""
+        if not self.mask_on_load:
+            return []
+        selects = []
+        for c in self.columns:
+            column = quote_ident(c.target_column)
+            expr = masked_sql(c.property, column)
+            if expr != column:
+                selects.append((column, expr))
+        return selects
+
+    def load_columns(self) -> Tuple[List[str], List[str]]:
+        """写入目标表的列和批次表中对应的取值表达式（映射列在前，默认值列在后）"""
+        columns = [c.target_column for c in self.columns]
+        values = [quote_ident(c.target_column) for c in self.columns]
+        for prop in self.defaults:
+            columns.append(prop.physicalColumn or prop.code)
+            values.append(f"CAST({quote_literal(prop.defaultValue)} AS {duckdb_type(prop.type)})")
+        return columns, values
+
+    def source_filter(self) -> Tuple[str, tuple]:
+        """下推到源表的过滤条件（增量抽取时为 水位列 > 上次水位）"""
+        if self.watermark_column and self.watermark is not None:
+            return f"src.{quote_ident(self.watermark_column)} > ?", (self.watermark,)
+        return "TRUE", ()
+
+    @classmethod
+    def build(cls, task: ETLTask, datasource: Datasource, model: Model) -> 'ETLPlan':
+        """
+        解析执行计划
+
+        业务规则：
+        - 只使用目标Model的Mapping
+        - 没有映射的必填Property必须有默认值
+        - merge模式下目标Model必须有主键Property，且主键Property都有映射
+        - maskOnLoad时映射列的脱敏规则必须有SQL实现
+        """
+        config = task.config if isinstance(task.config, dict) else {}
+        properties = {p.id: p for p in model.properties}
+
+        columns = []
+        for mapping in datasource.mappings:
+            if mapping.modelId != model.id:
+                continue
+            prop = properties.get(mapping.propertyId)
+            if prop is None:
+                raise ValueError(f"Mapping {mapping.id} references unknown Property {mapping.propertyId}")
+            columns.append(ColumnMapping(mapping.fieldId, prop))
+        if not columns:
+            raise ValueError(f"Datasource {datasource.id} has no mappings for Model {model.id}")
+
+        mapped = {c.property.id for c in columns}
+        for prop in model.properties:
+            if prop.required and prop.id not in mapped and prop.defaultValue is None:
+                raise ValueError(f"Required Property '{prop.code}' is not mapped and has no default value")
+
+        association = datasource.get_association_by_model(model.id)
+        source = config.get("sourceTable") or (association.tableName if association else None) or datasource.tableName
+        target = config.get("targetTable") or data_table_name(model.code)
+        if target.lower() in ID_TABLES:
+            raise ValueError(f"Target table '{target}' is a metadata table")
+
+        batch_size = config.get("batchSize", DEFAULT_BATCH_SIZE)
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batchSize must be a positive integer")
+
+        parallelism = config.get("parallelism", 1)
+        if not isinstance(parallelism, int) or not 1 <= parallelism <= MAX_PARALLELISM:
+            raise ValueError(f"parallelism must be an integer between 1 and {MAX_PARALLELISM}")
+
+        load_mode = config.get("loadMode", "append")
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"loadMode must be one of {list(LOAD_MODES)}")
+        if load_mode == "merge":
+            keys = [p for p in model.properties if p.isPrimaryKey]
+            if not keys:
+                raise ValueError(f"Model {model.id} has no primary key properties for merge")
+            unmapped = [p.code for p in keys if p.id not in mapped]
+            if unmapped:
+                raise ValueError(f"Primary key properties {unmapped} must be mapped for merge")
+
+        pipeline_depth = config.get("pipelineDepth", DEFAULT_DEPTH)
+        if not isinstance(pipeline_depth, int) or pipeline_depth <= 0:
+            raise ValueError("pipelineDepth must be a positive integer")
+
+        mask_on_load = bool(config.get("maskOnLoad", False))
+        if mask_on_load:
+            for c in columns:
+                if masked_sql(c.property, c.target_column) is None:
+                    raise ValueError(f"Mask rule of Property '{c.property.code}' cannot be applied on load")
+
+        return cls(task, datasource, model, source, target, columns, batch_size, parallelism, load_mode,
+                   pipeline_depth, mask_on_load)
+
+
+class ETLResult:
+    """ETL执行结果"""
+
+    def __init__(self, target_table: str):
+        self.target_table = target_table
+        self.processed = 0
+        self.success = 0
+        self.failed = 0
+        self.batches = 0
+        self.failures: Dict[str, int] = {}  # 检查名 -> 失败行数
+        self.samples: List[Dict] = []
+        self.watermark = None  # 本次读到的最大水位值
+        self.partitions: List[Dict] = []  # 并行抽取时各分区的统计
+        self.merged: Optional[Dict[str, int]] = None  # merge模式下插入/更新/不变/批内重复的行数
+        self.stages: Dict[str, StageMetrics] = {}  # 流水线各阶段的统计
+        self.started = time.monotonic()
+        self.duration = 0.0
+
+    def add_batch(self, processed: int, failed: int, failures: Optional[Dict[str, int]] = None) -> None:
+        self.processed += processed
+        self.failed += failed
+        self.success += processed - failed
+        self.batches += 1
+        for name, count in (failures or {}).items():
+            if count:
+                self.failures[name] = self.failures.get(name, 0) + count
+
+    def add_merge(self, inserted: int, updated: int, unchanged: int, duplicates: int) -> None:
+        merged = self.merged or {"inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0}
+        merged["inserted"] += inserted
+        merged["updated"] += updated
+        merged["unchanged"] += unchanged
+        merged["duplicates"] += duplicates
+        self.merged = merged
+
+    def merge(self, other: 'ETLResult') -> None:
+        """合并一个分区的结果"""
+        self.processed += other.processed
+        self.success += other.success
+        self.failed += other.failed
+        self.batches += other.batches
+        for name, count in other.failures.items():
+            self.failures[name] = self.failures.get(name, 0) + count
+        self.samples.extend(other.samples[:self.samples_needed])
+        self.advance_watermark(other.watermark)
+        self.add_stages(other.stages)
+
+    def add_stages(self, stages: Dict[str, StageMetrics]) -> None:
+        for name, metrics in stages.items():
+            if name not in self.stages:
+                self.stages[name] = StageMetrics(name)
+            self.stages[name].merge(metrics)
+
+    def advance_watermark(self, value) -> None:
+        if value is not None and (self.watermark is None or value > self.watermark):
+            self.watermark = value
+
+    @property
+    def samples_needed(self) -> int:
+        return max(SAMPLE_SIZE - len(self.samples), 0)
+
+    def finish(self) -> 'ETLResult':
+        self.duration = time.monotonic() - self.started
+        return self
+
+    def to_details(self) -> Dict:
+        """写入ETLLog.details的执行摘要"""
+        return {
+            "targetTable": self.target_table,
+            "batches": self.batches,
+            "durationMs": round(self.duration * 1000, 3),
+            "failures": self.failures,
+            "samples": self.samples,
+            "watermark": self.watermark,
+            "partitions": self.partitions,
+            "merge": self.merged,
+            "stages": {name: metrics.to_dict() for name, metrics in self.stages.items()}
+        }
+
+
+class ETLEngine:
+    """
+    ETL执行引擎
+
+    - 数据全程在DuckDB内流转：源表按rowid窗口分批，每批依次经过抽取（TRY_CAST转换）、校验、
+      脱敏、加载四个阶段，批次表放在实例级内存数据库中，不经过Python内存
+    - 顺序执行时各阶段在独立线程上组成流水线，阶段之间是容量为pipelineDepth的有界队列：
+      加载跟不上时抽取阻塞，同时存在的批次数有上限；各阶段的耗时、等待和阻塞时间写入结果
+    - 每批一个事务，失败时已提交的批次保留；传入断点存储时每批的断点（分区、批次序号、
+      已提交到的rowid位置和累计记录数）与该批在同一事务中提交，继续执行时从断点接着抽取
+    - parallelism > 1时把rowid范围切成多个连续分区，每个分区在独立线程和游标上抽取、转换，
+      结果先写入分区表，全部成功后在一个事务中合并到目标表（任一分区失败则目标表不变）；
+      DuckDB执行查询时释放GIL，线程即可并行
+    - 每行按Model校验器计算失败位图（必填、类型、长度和取值范围），
+      有任一检查失败的行计入recordsFailed，不写入目标表；各检查的失败数和失败行样本写入结果
+    - merge模式下目标表按主键列建唯一索引；各批通过校验的行先写入分区表（parallelism为1时即一个分区），
+      全部完成后按主键去重（同一主键保留源表中最后一行），与目标表关联标记为插入、更新或不变，
+      再在一个事务中用INSERT ... ON CONFLICT DO UPDATE写入新增和变化的行
+    """
+
+    def run(self, plan: ETLPlan, progress: Optional[Callable[[Dict], None]] = None,
+            checkpoints: Optional[CheckpointStore] = None) -> ETLResult:
+        """
+        执行计划，返回执行结果
+
+        progress为进度回调，每批完成后（按间隔节流）以进度快照调用；
+        传入checkpoints时每批与断点一起提交，已有断点时从断点继续
+        """
+        result = ETLResult(plan.target_table)
+        tracker = ProgressTracker(progress)
+        conn = get_dedicated_connection()
+        try:
+            self._ensure_target(conn, plan)
+            saved = checkpoints.load(conn) if checkpoints else {}
+            if checkpoints and not saved:
+                self._discard(conn, checkpoints)
+            with source_table(conn, plan.datasource, plan.source_table) as source:
+                span = self._rowid_range(conn, plan, source)
+                if span is None:
+                    tracker.begin(None)
+                    loader = BatchLoader(self, plan, source, plan.target_table, result, tracker)
+                    self._pipeline(conn, loader, [Batch(0, None)], threaded=False)
+                elif saved or span[0] is not None:
+                    if not saved:
+                        saved = self._begin(conn, plan, span, checkpoints)
+                    tracker.begin(sum(c.range_end - c.range_start + 1 for c in saved.values()), len(saved))
+                    if plan.parallelism > 1 or plan.merge:
+                        self._run_partitions(conn, plan, source, saved, result, tracker, checkpoints)
+                    else:
+                        for checkpoint in saved.values():
+                            result.merge(self._extract_range(
+                                conn, plan, source, checkpoint, plan.target_table, tracker, checkpoints
+                            ))
+                        if checkpoints:
+                            checkpoints.clear(conn)
+                else:
+                    tracker.begin(0)
+            tracker.enter("done")
+            return result.finish()
+        finally:
+            conn.execute(f"DROP TABLE IF EXISTS {MERGE_TABLE}")
+            conn.close()
+
+    def _begin(self, conn, plan: ETLPlan, span: Tuple[int, int],
+               checkpoints: Optional[CheckpointStore]) -> Dict[int, Checkpoint]:
+        """把rowid范围切成分区（顺序执行时为一个分区），有断点存储时写入各分区的初始断点"""
+        low, high = span
+        count = plan.parallelism if plan.parallelism > 1 or plan.merge else 1
+        size = -(-(high - low + 1) // count)
+        initial = {
+            index: Checkpoint(index, 0, start, min(start + size - 1, high), start)
+            for index, start in enumerate(range(low, high + 1, size))
+        }
+        if checkpoints:
+            with conn.transaction():
+                for checkpoint in initial.values():
+                    checkpoints.save(conn, checkpoint)
+        return initial
+
+    def _discard(self, conn, checkpoints: CheckpointStore) -> None:
+        """重新开始执行：清除任务此前中断留下的断点和分区表"""
+        prefix = f"{PARTITION_PREFIX}{checkpoints.task_id}_"
+        tables = conn.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE database_name = current_database() AND starts_with(table_name, ?)",
+            (prefix,)
+        ).fetchall()
+        for (table,) in tables:
+            conn.execute(f"DROP TABLE IF EXISTS {quote_ident(table)}")
+        checkpoints.clear(conn)
+
+    def _run_partitions(self, conn, plan: ETLPlan, source: str, saved: Dict[int, Checkpoint], result: ETLResult,
+                        tracker: ProgressTracker, checkpoints: Optional[CheckpointStore]) -> None:
+        """
+        并行抽取各分区，再在一个事务中合并到目标表
+
+        有断点存储时分区表按执行命名，中断后保留，继续执行时各分区从断点接着写入
+        """
+        run_id = checkpoints.key if checkpoints else uuid.uuid4().hex[:8]
+        tables = [f"{PARTITION_PREFIX}{run_id}_{index}" for index in saved]
+        target = quote_ident(plan.target_table)
+        completed = False
+
+        try:
+            with conn.transaction():
+                for table in tables:
+                    conn.execute(f"CREATE TABLE IF NOT EXISTS {quote_ident(table)} AS SELECT * FROM {target} LIMIT 0")
+
+            with ThreadPoolExecutor(max_workers=len(tables), thread_name_prefix='etl-part') as executor:
+                futures = [
+                    executor.submit(self._extract_partition, plan, source, table, checkpoint, tracker, checkpoints)
+                    for table, checkpoint in zip(tables, saved.values())
+                ]
+                parts = [future.result() for future in futures]
+
+            tracker.enter("merge")
+            with conn.transaction():
+                if plan.merge:
+                    columns = ", ".join(quote_ident(c) for c in plan.load_columns()[0])
+                    self._merge(conn, plan, " UNION ALL ".join(
+                        f"SELECT {columns}, {index} AS _etl_part, rowid AS _etl_order FROM {quote_ident(table)}"
+                        for index, table in enumerate(tables)
+                    ), result)
+                else:
+                    for table in tables:
+                        conn.execute(f"INSERT INTO {target} SELECT * FROM {quote_ident(table)}")
+                if checkpoints:
+                    checkpoints.clear(conn)
+            completed = True
+        finally:
+            if completed or not checkpoints:
+                for table in tables:
+                    conn.execute(f"DROP TABLE IF EXISTS {quote_ident(table)}")
+
+        for part, checkpoint in zip(parts, saved.values()):
+            result.merge(part)
+            result.partitions.append({
+                "partition": checkpoint.partition,
+                "rowids": [checkpoint.range_start, checkpoint.range_end],
+                "processed": part.processed,
+                "failed": part.failed,
+                "batches": part.batches,
+                "durationMs": round(part.duration * 1000, 3)
+            })
+
+    def _extract_partition(self, plan: ETLPlan, source: str, table: str, checkpoint: Checkpoint,
+                           tracker: ProgressTracker, checkpoints: Optional[CheckpointStore]) -> ETLResult:
+        """在当前线程的游标上抽取一个分区，写入分区表"""
+        conn = get_dedicated_connection()
+        try:
+            return self._extract_range(conn, plan, source, checkpoint, table, tracker, checkpoints, threaded=False)
+        finally:
+            conn.execute(f"DROP TABLE IF EXISTS {MERGE_TABLE}")
+            conn.close()
+
+    def _extract_range(self, conn, plan: ETLPlan, source: str, checkpoint: Checkpoint, destination: str,
+                       tracker: ProgressTracker, checkpoints: Optional[CheckpointStore],
+                       threaded: bool = True) -> ETLResult:
+        """
+        从断点位置起分批抽取一个分区的rowid范围，写入destination，每批与新的断点一起提交
+
+        threaded=False时各阶段在当前线程中依次执行（并行分区已各占一个线程）
+        """
+        result = self._restore(conn, plan, source, checkpoint, destination)
+        tracker.advance(result.processed, result.success, checkpoint.partition)
+        loader = BatchLoader(self, plan, source, destination, result, tracker, checkpoint, checkpoints)
+        batches = (Batch(index, window) for index, window in enumerate(self._windows(checkpoint.remaining, plan.batch_size)))
+        self._pipeline(conn, loader, batches, threaded)
+        return result.finish()
+
+    def _pipeline(self, conn, loader: 'BatchLoader', batches: Iterable['Batch'], threaded: bool) -> None:
+        """让批次依次经过loader的各阶段，结束后清理残留的批次表并记录各阶段统计"""
+        pipeline = Pipeline(loader.stages(), loader.plan.pipeline_depth, threaded)
+        conn.execute(f"ATTACH IF NOT EXISTS ':memory:' AS {MEMORY_DATABASE}")
+        try:
+            pipeline.run(batches, conn, get_dedicated_connection)
+        finally:
+            loader.cleanup(conn)
+            loader.result.add_stages(pipeline.stage_metrics())
+
+    def _restore(self, conn, plan: ETLPlan, source: str, checkpoint: Checkpoint, destination: str) -> ETLResult:
+        """
+        按断点恢复分区已提交部分的统计
+
+        水位按已提交的rowid范围回源表重新计算，保证类型与源列一致
+        """
+        result = ETLResult(destination)
+        result.processed = checkpoint.processed
+        result.success = checkpoint.success
+        result.failed = checkpoint.failed
+        result.batches = checkpoint.batch
+        result.failures = dict(checkpoint.failures)
+        result.samples = list(checkpoint.samples)
+        if plan.watermark_column and checkpoint.position > checkpoint.range_start:
+            condition, params = plan.source_filter()
+            result.advance_watermark(conn.execute(
+                f"SELECT MAX(src.{quote_ident(plan.watermark_column)}) FROM {source} AS src "
+                f"WHERE {condition} AND src.rowid >= ? AND src.rowid < ?",
+                params + (checkpoint.range_start, checkpoint.position)
+            ).fetchone()[0])
+        return result
+
+    def _ensure_target(self, conn, plan: ETLPlan) -> None:
+        """创建目标表，已存在时补齐缺少的列"""
+        target = quote_ident(plan.target_table)
+        definitions = [f"{quote_ident(p.physicalColumn or p.code)} {duckdb_type(p.type)}" for p in plan.model.properties]
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {target} ({', '.join(definitions)})")
+        for definition in definitions:
+            conn.execute(f"ALTER TABLE {target} ADD COLUMN IF NOT EXISTS {definition}")
+        if plan.merge:
+            keys = ", ".join(quote_ident(k) for k in plan.key_columns)
+            try:
+                conn.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {quote_ident(plan.target_table + '_pk')} ON {target} ({keys})"
+                )
+            except duckdb.ConstraintException:
+                raise ValueError(f"Target table '{plan.target_table}' has duplicate primary keys, cannot merge")
+
+    def _rowid_range(self, conn, plan: ETLPlan, source: str) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """
+        满足源过滤条件的行所在的rowid范围 (最小, 最大)，没有数据时为 (None, None)
+
+        源是视图等没有rowid的关系时返回None，此时整体作为一批
+        """
+        condition, params = plan.source_filter()
+        try:
+            return conn.execute(
+                f"SELECT MIN(src.rowid), MAX(src.rowid) FROM {source} AS src WHERE {condition}", params
+            ).fetchone()
+        except duckdb.BinderException as e:
+            if "rowid" not in str(e):
+                raise
+            return None
+
+    def _windows(self, span: Tuple[int, int], batch_size: int) -> Iterator[Tuple[int, int]]:
+        """把rowid范围 [最小, 最大] 切成批次窗口 [start, end)"""
+        low, high = span
+        for start in range(low, high + 1, batch_size):
+            yield (start, min(start + batch_size, high + 1))
+
+    def _merge(self, conn, plan: ETLPlan, relation: str, result: ETLResult) -> None:
+        """
+        把relation中的行按主键合并到目标表
+
+        relation包含全部加载列以及排序列_etl_part、_etl_order，同一主键按排序保留最后一行；
+        去重后的行与目标表关联，只有新增和变化的行写入目标表
+        """
+        columns = [quote_ident(c) for c in plan.load_columns()[0]]
+        keys = [quote_ident(k) for k in plan.key_columns]
+        others = [c for c in columns if c not in keys]
+        target = quote_ident(plan.target_table)
+        partition = ", ".join(keys)
+        same = " AND ".join(f"s.{c} IS NOT DISTINCT FROM t.{c}" for c in others) or "TRUE"
+        conn.execute(
+            f"CREATE OR REPLACE TEMP TABLE {MERGE_TABLE} AS "
+            f"SELECT {', '.join(f's.{c}' for c in columns)}, s._etl_copies, "
+            f"CASE WHEN t.rowid IS NULL THEN 'insert' WHEN {same} THEN 'unchanged' ELSE 'update' END AS {ACTION_COLUMN} "
+            f"FROM (SELECT *, COUNT(*) OVER (PARTITION BY {partition}) AS _etl_copies FROM ({relation}) "
+            f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY _etl_part DESC, _etl_order DESC) = 1) AS s "
+            f"LEFT JOIN {target} AS t ON {' AND '.join(f's.{k} = t.{k}' for k in keys)}"
+        )
+
+        if others:
+            conflict = f"DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in others)}"
+        else:
+            conflict = "DO NOTHING"
+        conn.execute(
+            f"INSERT INTO {target} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {MERGE_TABLE} "
+            f"WHERE {ACTION_COLUMN} <> 'unchanged' ON CONFLICT ({partition}) {conflict}"
+        )
+
+        counts = conn.execute(
+            f"SELECT COUNT(*) FILTER (WHERE {ACTION_COLUMN} = 'insert'), "
+            f"COUNT(*) FILTER (WHERE {ACTION_COLUMN} = 'update'), "
+            f"COUNT(*) FILTER (WHERE {ACTION_COLUMN} = 'unchanged'), "
+            f"COALESCE(SUM(_etl_copies - 1), 0) FROM {MERGE_TABLE}"
+        ).fetchone()
+        result.add_merge(*counts)
+
+
+class Batch:
+    """流经流水线的一批源数据：window为源表rowid窗口 [start, end)，源表没有rowid时为None"""
+
+    def __init__(self, index: int, window: Optional[Tuple[int, int]]):
+        self.index = index
+        self.window = window
+        self.table: Optional[str] = None  # 当前阶段产出的批次表（内存数据库中）
+        self.processed = 0
+        self.failed = 0
+        self.failures: Dict[str, int] = {}
+        self.watermark = None
+        self.samples: List[Dict] = []
+
+
+class BatchLoader:
+    """
+    一段源数据的分批加载
+
+    四个阶段各自只读写自己的批次表：
+    - extract：按窗口读取源表，保留源字段原始值并TRY_CAST为目标类型
+    - validate：计算每行的失败位图，统计失败数、水位和失败行样本
+    - mask：maskOnLoad时把有脱敏规则的列替换为脱敏后的值
+    - load：把通过校验的行写入destination，与断点在同一事务中提交
+    """
+
+    def __init__(self, engine: ETLEngine, plan: ETLPlan, source: str, destination: str, result: ETLResult,
+                 tracker: ProgressTracker, checkpoint: Optional[Checkpoint] = None,
+                 checkpoints: Optional[CheckpointStore] = None):
+        self.engine = engine
+        self.plan = plan
+        self.source = source
+        self.destination = destination
+        self.result = result
+        self.tracker = tracker
+        self.checkpoint = checkpoint
+        self.checkpoints = checkpoints
+        self.prefix = f"{BATCH_PREFIX}{uuid.uuid4().hex[:8]}_"
+
+    def stages(self) -> List[Tuple[str, Callable]]:
+        return [("extract", self.extract), ("validate", self.validate), ("mask", self.mask), ("load", self.load)]
+
+    def extract(self, conn, batch: Batch) -> Batch:
+        plan = self.plan
+        selects = []
+        for c in plan.columns:
+            selects.append(f"{c.source_sql} AS {quote_ident(c.raw_column)}")
+            selects.append(f"{c.converted_sql} AS {quote_ident(c.target_column)}")
+        condition, params = plan.source_filter()
+        if plan.watermark_column:
+            selects.append(f"src.{quote_ident(plan.watermark_column)} AS {WATERMARK_COLUMN}")
+        if batch.window is not None:
+            selects.append(f"src.rowid AS {ROWID_COLUMN}")
+            condition += " AND src.rowid >= ? AND src.rowid < ?"
+            params += batch.window
+        table = self._table(batch, "extract")
+        conn.execute(
+            f"CREATE TABLE {table} AS SELECT {', '.join(selects)} FROM {self.source} AS src WHERE {condition}", params
+        )
+        batch.table = table
+        return batch
+
+    def validate(self, conn, batch: Batch) -> Batch:
+        validator = self.plan.validator
+        if validator.checks:
+            table = self._table(batch, "validate")
+            conn.execute(f"CREATE TABLE {table} AS SELECT *, {', '.join(validator.bitmap_selects())} FROM {batch.table}")
+            self._replace(conn, batch, table)
+
+        watermark = f"MAX({WATERMARK_COLUMN})" if self.plan.watermark_column else "NULL"
+        counts = conn.execute(
+            f"SELECT COUNT(*), COUNT(*) FILTER (WHERE {validator.failed_sql()}), {watermark}"
+            f"{''.join(', ' + c for c in validator.count_selects())} FROM {batch.table}"
+        ).fetchone()
+        batch.processed, batch.failed, batch.watermark = counts[0], counts[1], counts[2]
+        batch.failures = {c.name: n for c, n in zip(validator.checks, counts[3:])}
+        if batch.failed:
+            batch.samples = self._sample_failures(conn, batch)
+        return batch
+
+    def mask(self, conn, batch: Batch) -> Batch:
+        selects = self.plan.mask_selects()
+        if selects:
+            table = self._table(batch, "mask")
+            replace = ", ".join(f"{expr} AS {column}" for column, expr in selects)
+            conn.execute(f"CREATE TABLE {table} AS SELECT * REPLACE ({replace}) FROM {batch.table}")
+            self._replace(conn, batch, table)
+        return batch
+
+    def load(self, conn, batch: Batch) -> Batch:
+        plan, result = self.plan, self.result
+        columns, values = plan.load_columns()
+        passed = plan.validator.passed_sql()
+        with conn.transaction():
+            if plan.merge and self.destination == plan.target_table:
+                self.engine._merge(conn, plan, (
+                    f"SELECT {', '.join(f'{v} AS {quote_ident(c)}' for c, v in zip(columns, values))}, "
+                    f"0 AS _etl_part, rowid AS _etl_order FROM {batch.table} WHERE {passed}"
+                ), result)
+            else:
+                conn.execute(
+                    f"INSERT INTO {quote_ident(self.destination)} ({', '.join(quote_ident(c) for c in columns)}) "
+                    f"SELECT {', '.join(values)} FROM {batch.table} WHERE {passed}"
+                )
+            result.add_batch(batch.processed, batch.failed, batch.failures)
+            result.advance_watermark(batch.watermark)
+            result.samples.extend(batch.samples[:result.samples_needed])
+            if self.checkpoints and self.checkpoint and batch.window is not None:
+                checkpoint = self.checkpoint
+                self.checkpoints.save(conn, Checkpoint(
+                    checkpoint.partition, result.batches, checkpoint.range_start, checkpoint.range_end,
+                    batch.window[1], result.processed, result.success, result.failed, result.failures, result.samples
+                ))
+        conn.execute(f"DROP TABLE IF EXISTS {batch.table}")
+        self.tracker.advance(batch.processed, batch.processed - batch.failed,
+                             self.checkpoint.partition if self.checkpoint else None)
+        return batch
+
+    def cleanup(self, conn) -> None:
+        """删除未走完流水线的批次表（执行失败时）"""
+        tables = conn.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE database_name = ? AND starts_with(table_name, ?)",
+            (MEMORY_DATABASE, self.prefix)
+        ).fetchall()
+        for (table,) in tables:
+            conn.execute(f"DROP TABLE IF EXISTS {MEMORY_DATABASE}.{quote_ident(table)}")
+
+    def _table(self, batch: Batch, stage: str) -> str:
+        return f"{MEMORY_DATABASE}.{quote_ident(f'{self.prefix}{batch.index}_{stage}')}"
+
+    def _replace(self, conn, batch: Batch, table: str) -> None:
+        conn.execute(f"DROP TABLE IF EXISTS {batch.table}")
+        batch.table = table
+
+    def _sample_failures(self, conn, batch: Batch) -> List[Dict]:
+        """取出批次中失败行的样本（源字段原始值，maskOnLoad时同样脱敏）"""
+        plan = self.plan
+        validator = plan.validator
+        bitmaps = validator.bitmap_columns
+        rowid = ROWID_COLUMN if batch.window is not None else "NULL"
+        rows = conn.execute(
+            f"SELECT {rowid}, {', '.join(bitmaps)}, {', '.join(quote_ident(c.raw_column) for c in plan.columns)} "
+            f"FROM {batch.table} WHERE {validator.failed_sql()} LIMIT {SAMPLE_SIZE}"
+        ).fetchall()
+        masked = {column for column, _ in plan.mask_selects()}
+        samples = []
+        for row in rows:
+            values = [
+                c.property.mask_value(v) if quote_ident(c.target_column) in masked and isinstance(v, str) else v
+                for c, v in zip(plan.columns, row[1 + len(bitmaps):])
+            ]
+            samples.append({
+                "row": row[0],
+                "failed": validator.decode(row[1:1 + len(bitmaps)]),
+                "values": dict(zip([c.source_field for c in plan.columns], values))
+            })
+        return samples
@@ -0,0 +1,56 @@
+"""
+整列脱敏
+把Property的脱敏规则下推为DuckDB表达式，没有SQL实现的规则在内存中按批处理
+"""
+from typing import Optional, List, Dict, Iterator
+from infrastructure.etl.sql import quote_ident, duckdb_type
+from meta.model import Property
+from meta.model.masking import MaskRule
+
+
+def masked_sql(prop: Property, expr: str) -> Optional[str]:
+    """
+    expr按prop脱敏后的SQL表达式
+
+    不需要脱敏（无规则或非VARCHAR列）时原样返回expr；规则没有SQL实现时返回None
+    """
+    rule = prop.mask_rule
+    if rule is None or duckdb_type(prop.type) != "VARCHAR":
+        return expr
+    if rule.sql is None:
+        return None
+    return rule.sql(expr)
+
+
+class ColumnMasker:
+    """
+    一组列的脱敏计划
+
+    selects是按列顺序排列的SELECT表达式（能下推的规则已在其中完成脱敏），
+    apply对查询结果中剩余需要在内存中脱敏的列逐批处理
+    """
+
+    def __init__(self, columns: List[Property], column_name=lambda p: p.physicalColumn or p.code):
+        self.columns = columns
+        self.selects: List[str] = []
+        self._in_memory: Dict[int, MaskRule] = {}
+        for index, prop in enumerate(columns):
+            column = quote_ident(column_name(prop))
+            expr = masked_sql(prop, column)
+            if expr is None:
+                self._in_memory[index] = prop.mask_rule
+                expr = column
+            self.selects.append(f"{expr} AS {column}")
+
+    def apply(self, rows: List[tuple]) -> List[tuple]:
+        """对一批查询结果做内存脱敏"""
+        if not self._in_memory or not rows:
+            return rows
+        columns = [list(c) for c in zip(*rows)]
+        for index, rule in self._in_memory.items():
+            columns[index] = rule.mask_all(columns[index])
+        return list(zip(*columns))
+
+    def apply_all(self, batches: Iterator[List[tuple]]) -> Iterator[List[tuple]]:
+        for rows in batches:
+            yield self.apply(rows)
@@ -0,0 +1,187 @@
+"""
+ETL流水线
+批次依次经过各阶段，阶段之间用有界队列连接：下游处理不过来时上游阻塞，内存中的批次数有上限
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import queue
+import threading
+import time
+
+# 阶段之间队列的默认容量（批次数）
+DEFAULT_DEPTH = 2
+# 阻塞等待时检查其他阶段是否已失败的间隔（秒）
+POLL_INTERVAL = 0.1
+
+_END = object()
+
+Stage = Tuple[str, Callable[[Any, Any], Any]]
+
+
+class StageMetrics:
+    """
+    单个阶段的统计
+
+    - busy：处理批次的时间
+    - waiting：等待上游批次的时间（上游慢）
+    - blocked：下游队列已满、等待放入的时间（下游慢，即背压）
+    - 队列深度在每次取批次时采样
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.batches = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+
+    def sample_depth(self, depth: int) -> None:
+        self.max_depth = max(self.max_depth, depth)
+        self._depth_total += depth
+        self._depth_samples += 1
+
+    def merge(self, other: 'StageMetrics') -> None:
+        self.batches += other.batches
+        self.busy += other.busy
+        self.waiting += other.waiting
+        self.blocked += other.blocked
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self._depth_total += other._depth_total
+        self._depth_samples += other._depth_samples
+
+    def to_dict(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "busyMs": round(self.busy * 1000, 3),
+            "waitingMs": round(self.waiting * 1000, 3),
+            "blockedMs": round(self.blocked * 1000, 3),
+            "maxQueueDepth": self.max_depth,
+            "avgQueueDepth": round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0
+        }
+
+
+class Pipeline:
+    """
+    批次流水线
+
+    - threaded=True时除最后一个阶段外每个阶段一个线程（各自从connect取得数据库连接），
+      最后一个阶段在调用线程中用调用方的连接执行；阶段之间是容量为depth的队列
+    - threaded=False时在调用线程中逐批依次执行各阶段（用于已在并行分区线程中的场景）
+    - 任一阶段失败时其余阶段停止，异常在run中重新抛出
+    """
+
+    def __init__(self, stages: List[Stage], depth: int = DEFAULT_DEPTH, threaded: bool = True):
+        self.stages = stages
+        self.depth = depth
+        self.threaded = threaded and len(stages) > 1
+        self.metrics = [StageMetrics(name) for name, _ in stages]
+
+    def run(self, items: Iterable[Any], conn, connect: Optional[Callable[[], Any]] = None) -> None:
+        if not self.threaded:
+            for item in items:
+                for (_, process), metrics in zip(self.stages, self.metrics):
+                    started = time.monotonic()
+                    item = process(conn, item)
+                    metrics.busy += time.monotonic() - started
+                    metrics.batches += 1
+            return
+
+        queues = [queue.Queue(maxsize=self.depth) for _ in self.stages]
+        stop = threading.Event()
+        errors: List[BaseException] = []
+
+        def feed():
+            try:
+                for item in items:
+                    if not self._put(queues[0], item, stop, None):
+                        return
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                self._put(queues[0], _END, stop, None)
+
+        def work(index: int):
+            _, process = self.stages[index]
+            metrics = self.metrics[index]
+            worker_conn = connect()
+            try:
+                while True:
+                    item = self._get(queues[index], stop, metrics)
+                    if item is _END or item is None:
+                        break
+                    started = time.monotonic()
+                    item = process(worker_conn, item)
+                    metrics.busy += time.monotonic() - started
+                    metrics.batches += 1
+                    if not self._put(queues[index + 1], item, stop, metrics):
+                        break
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                worker_conn.close()
+                self._put(queues[index + 1], _END, stop, None)
+
+        threads = [threading.Thread(target=feed, name='etl-feed', daemon=True)]
+        threads += [
+            threading.Thread(target=work, args=(index,), name=f'etl-{name}', daemon=True)
+            for index, (name, _) in enumerate(self.stages[:-1])
+        ]
+        for thread in threads:
+            thread.start()
+
+        _, process = self.stages[-1]
+        metrics = self.metrics[-1]
+        try:
+            while True:
+                item = self._get(queues[-1], stop, metrics)
+                if item is _END or item is None:
+                    break
+                started = time.monotonic()
+                process(conn, item)
+                metrics.busy += time.monotonic() - started
+                metrics.batches += 1
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def stage_metrics(self) -> Dict[str, StageMetrics]:
+        return {metrics.name: metrics for metrics in self.metrics}
+
+    def _get(self, source: queue.Queue, stop: threading.Event, metrics: StageMetrics):
+        """取下一个批次；其他阶段失败时返回None"""
+        metrics.sample_depth(source.qsize())
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    return source.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if stop.is_set():
+                        return None
+        finally:
+            metrics.waiting += time.monotonic() - started
+
+    def _put(self, target: queue.Queue, item, stop: threading.Event, metrics: Optional[StageMetrics]) -> bool:
+        """放入下游队列，队列满时阻塞；其他阶段失败时放弃并返回False"""
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    target.put(item, timeout=POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    if stop.is_set():
+                        return False
+        finally:
+            if metrics is not None:
+                metrics.blocked += time.monotonic() - started
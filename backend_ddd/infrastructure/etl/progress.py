@@ -0,0 +1,86 @@
+"""
+ETL执行进度
+引擎每写完一批报告一次进度，按时间间隔节流后交给回调（如推送给SSE订阅者）
+"""
+from typing import Callable, Dict, Optional
+import threading
+import time
+
+# 两次进度报告之间的最小间隔（秒），阶段变化和结束时不受限制
+PROGRESS_INTERVAL = 0.5
+
+
+class ProgressTracker:
+    """
+    ETL执行进度
+
+    - 并行分区在各自线程中报告，计数在锁内累加
+    - estimatedTotal按源表rowid范围估算（增量过滤后的实际行数可能更少），
+      据此计算完成百分比和剩余时间
+    - report为None时只累加计数，不产生报告
+    """
+
+    def __init__(self, report: Optional[Callable[[Dict], None]] = None, interval: float = PROGRESS_INTERVAL):
+        self.report = report
+        self.interval = interval
+        self.phase = "extract"
+        self.total: Optional[int] = None
+        self.partitions = 0
+        self.read = 0
+        self.written = 0
+        self.partition: Optional[int] = None
+        self.started = time.monotonic()
+        self._reported = 0.0
+        self._lock = threading.Lock()
+
+    def begin(self, total: Optional[int], partitions: int = 0) -> None:
+        with self._lock:
+            self.total = total
+            self.partitions = partitions
+        self._emit(force=True)
+
+    def advance(self, read: int, written: int, partition: Optional[int] = None) -> None:
+        """一批处理完成：read为读取的源行数，written为通过校验写出的行数"""
+        with self._lock:
+            self.read += read
+            self.written += written
+            self.partition = partition
+        self._emit()
+
+    def enter(self, phase: str) -> None:
+        """进入新阶段（extract、merge、done）"""
+        with self._lock:
+            self.phase = phase
+            self.partition = None
+        self._emit(force=True)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            rate = self.read / elapsed if elapsed > 0 else 0.0
+            total = max(self.total, self.read) if self.total is not None else None
+            if self.phase == "done":
+                total = self.read
+            remaining = total - self.read if total is not None else None
+            return {
+                "phase": self.phase,
+                "rowsRead": self.read,
+                "rowsWritten": self.written,
+                "estimatedTotal": total,
+                "percent": round(self.read * 100 / total, 1) if total else None,
+                "rowsPerSecond": round(rate, 1),
+                "etaSeconds": round(remaining / rate, 1) if remaining is not None and rate > 0 else None,
+                "elapsedSeconds": round(elapsed, 3),
+                "partition": self.partition,
+                "partitions": self.partitions
+            }
+
+    def _emit(self, force: bool = False) -> None:
+        if self.report is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._reported < self.interval:
+                return
+            self._reported = now
+        self.report(self.snapshot())
@@ -0,0 +1,83 @@
+"""
+ETL数据源
+把Datasource解析为当前DuckDB实例中可查询的表
+"""
+from contextlib import contextmanager
+from typing import Dict, Tuple
+import os
+import threading
+import uuid
+from infrastructure.persistence.db_connection import get_connection_manager
+from infrastructure.etl.sql import quote_ident, quote_literal
+from meta.datasource import Datasource
+
+# 可以作为ETL源的数据源类型
+SUPPORTED_SOURCE_TYPES = ["duckdb"]
+
+
+class AttachedDatabases:
+    """
+    源数据库的ATTACH引用计数
+
+    ATTACH对整个DuckDB实例生效，同一个文件只能挂载一次；
+    多个任务读同一个源时共用一个别名，最后一个使用者退出时DETACH
+    """
+
+    def __init__(self):
+        self._attached: Dict[str, Tuple[str, int]] = {}  # 文件路径 -> (别名, 引用数)
+        self._lock = threading.Lock()
+
+    def acquire(self, conn, path: str) -> str:
+        with self._lock:
+            alias, refs = self._attached.get(path, (None, 0))
+            if alias is None:
+                alias = f"etl_src_{uuid.uuid4().hex[:8]}"
+                conn.execute(f"ATTACH {quote_literal(path)} AS {quote_ident(alias)} (READ_ONLY)")
+            self._attached[path] = (alias, refs + 1)
+            return alias
+
+    def release(self, conn, path: str) -> None:
+        with self._lock:
+            alias, refs = self._attached[path]
+            if refs > 1:
+                self._attached[path] = (alias, refs - 1)
+                return
+            del self._attached[path]
+            conn.execute(f"DETACH {quote_ident(alias)}")
+
+
+_attached = AttachedDatabases()
+
+
+def _is_app_database(path: str) -> bool:
+    app_db = get_connection_manager().db_path
+    return os.path.abspath(path) == os.path.abspath(app_db)
+
+
+@contextmanager
+def source_table(conn, datasource: Datasource, table_name: str):
+    """
+    打开数据源中的表，返回可直接用在FROM中的限定表名
+
+    源就是应用数据库时直接读main，否则以只读方式ATTACH
+    """
+    if (datasource.type or "").lower() not in SUPPORTED_SOURCE_TYPES:
+        raise ValueError(
+            f"ETL source type '{datasource.type}' is not supported, must be one of {SUPPORTED_SOURCE_TYPES}"
+        )
+    if not table_name:
+        raise ValueError(f"Datasource {datasource.id} has no source table")
+
+    path = datasource.url
+    if _is_app_database(path):
+        yield quote_ident(table_name)
+        return
+
+    if not os.path.exists(path):
+        raise ValueError(f"Datasource file not found: {path}")
+
+    alias = _attached.acquire(conn, path)
+    try:
+        yield f"{quote_ident(alias)}.{quote_ident(table_name)}"
+    finally:
+        _attached.release(conn, path)
@@ -0,0 +1,44 @@
+"""
+ETL SQL工具
+标识符/字面量转义、Property类型到DuckDB类型的映射和数据表命名
+"""
+from typing import Any
+
+# Property.type -> DuckDB列类型
+DUCKDB_TYPES = {
+    "string": "VARCHAR",
+    "integer": "BIGINT",
+    "float": "DOUBLE",
+    "boolean": "BOOLEAN",
+    "date": "DATE",
+    "datetime": "TIMESTAMP"
+}
+
+# Model数据表（ETL目标表）的默认表名前缀
+DATA_TABLE_PREFIX = "data_"
+
+
+def data_table_name(model_code: str) -> str:
+    """Model数据表的默认表名"""
+    return f"{DATA_TABLE_PREFIX}{model_code}"
+
+
+def quote_ident(name: str) -> str:
+    """转义SQL标识符（表名、列名）"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_literal(value: Any) -> str:
+    """转义SQL字面量（只用于不支持参数绑定的语句，如ATTACH、DDL默认值）"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def duckdb_type(property_type: str) -> str:
+    """Property.type对应的DuckDB列类型，未知类型按VARCHAR处理"""
+    return DUCKDB_TYPES.get((property_type or "").lower(), "VARCHAR")
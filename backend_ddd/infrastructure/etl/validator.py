@@ -0,0 +1,132 @@
+"""
+批量记录校验
+把Property的required、type和constraints编译为DuckDB列级谓词，对整批数据一次求值
+"""
+from typing import Iterable, List, Tuple
+from infrastructure.etl.sql import quote_literal
+from meta.model import Property
+
+# 每个位图列容纳的检查数（UBIGINT）
+BITS_PER_CHUNK = 64
+# 位图列名前缀
+BITMAP_PREFIX = "_etl_fail_"
+
+# 各类约束适用的DuckDB类型，与Property._check_constraints按值类型判断一致
+LENGTH_TYPES = ("VARCHAR",)
+NUMERIC_TYPES = ("BIGINT", "DOUBLE")
+CONSTRAINT_OPERATORS = {
+    "minLength": "<",
+    "maxLength": ">",
+    "min": "<",
+    "max": ">"
+}
+
+
+class Check:
+    """
+    单个校验项
+
+    predicate是失败时为TRUE的SQL表达式；index为该检查在行位图中的位置
+    """
+
+    def __init__(self, index: int, column: str, rule: str, predicate: str):
+        self.index = index
+        self.column = column
+        self.rule = rule
+        self.predicate = predicate
+
+    @property
+    def name(self) -> str:
+        return f"{self.column}.{self.rule}"
+
+    @property
+    def bitmap_column(self) -> str:
+        return f"{BITMAP_PREFIX}{self.index // BITS_PER_CHUNK}"
+
+    @property
+    def mask(self) -> int:
+        return 1 << (self.index % BITS_PER_CHUNK)
+
+
+class ModelValidator:
+    """
+    编译后的Model校验器
+
+    每行的校验结果是一组UBIGINT位图列（第i位为1表示第i个检查失败），
+    位图全为0的行通过校验；按位统计即可得到各检查的失败数
+    """
+
+    def __init__(self, checks: List[Check]):
+        self.checks = checks
+
+    @classmethod
+    def compile(cls, columns: List[Tuple[str, str, str, str, Property]],
+                required: Iterable[str] = ()) -> 'ModelValidator':
+        """
+        编译校验器
+
+        columns为(源字段表达式, 转换后表达式, 转换后的DuckDB类型, 目标列名, Property)；
+        type检查比较源值与转换结果，其余检查作用于转换后的值。
+        required中的目标列即使Property不是必填也做required检查（如merge模式的主键列）
+        """
+        checks: List[Check] = []
+        required = set(required)
+
+        def add(column: str, rule: str, predicate: str) -> None:
+            checks.append(Check(len(checks), column, rule, predicate))
+
+        for source, converted, sql_type, column, prop in columns:
+            if prop.required or column in required:
+                add(column, "required", f"{converted} IS NULL")
+            add(column, "type", f"({source} IS NOT NULL AND {converted} IS NULL)")
+
+            for constraint in prop.constraints:
+                rule = constraint.get("type") if isinstance(constraint, dict) else None
+                if rule not in CONSTRAINT_OPERATORS:
+                    continue
+                limit = constraint.get("value", 0)
+                if not isinstance(limit, (int, float)) or isinstance(limit, bool):
+                    continue
+                operator = CONSTRAINT_OPERATORS[rule]
+                if rule in ("minLength", "maxLength") and sql_type in LENGTH_TYPES:
+                    add(column, rule, f"COALESCE(length({converted}) {operator} {quote_literal(limit)}, FALSE)")
+                elif rule in ("min", "max") and sql_type in NUMERIC_TYPES:
+                    add(column, rule, f"COALESCE({converted} {operator} {quote_literal(limit)}, FALSE)")
+
+        return cls(checks)
+
+    @property
+    def bitmap_columns(self) -> List[str]:
+        chunks = -(-len(self.checks) // BITS_PER_CHUNK)
+        return [f"{BITMAP_PREFIX}{i}" for i in range(chunks)]
+
+    def bitmap_selects(self) -> List[str]:
+        """计算行位图的SELECT表达式"""
+        selects = []
+        for column in self.bitmap_columns:
+            terms = [
+                f"(CASE WHEN {c.predicate} THEN {c.mask}::UBIGINT ELSE 0::UBIGINT END)"
+                for c in self.checks if c.bitmap_column == column
+            ]
+            selects.append(f"({' | '.join(terms)}) AS {column}")
+        return selects
+
+    def passed_sql(self) -> str:
+        """行通过全部检查的条件"""
+        if not self.checks:
+            return "TRUE"
+        return " AND ".join(f"{column} = 0" for column in self.bitmap_columns)
+
+    def failed_sql(self) -> str:
+        """行至少有一项检查失败的条件"""
+        return f"NOT ({self.passed_sql()})"
+
+    def count_selects(self) -> List[str]:
+        """统计各检查失败数的SELECT表达式（与checks顺序一致）"""
+        return [f"COUNT(*) FILTER (WHERE ({c.bitmap_column} & {c.mask}::UBIGINT) <> 0)" for c in self.checks]
+
+    def decode(self, bitmaps: Tuple[int, ...]) -> List[str]:
+        """把一行的位图还原为失败的检查名"""
+        values = dict(zip(self.bitmap_columns, bitmaps))
+        return [c.name for c in self.checks if values[c.bitmap_column] & c.mask]
+
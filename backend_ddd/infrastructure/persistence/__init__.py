@@ -2,7 +2,15 @@
 持久化层
 提供数据库连接和基础操作
 """
-from .db_connection import get_db_connection, get_current_date
+from .db_connection import (
+    get_db_connection, get_current_date, get_connection_manager, get_pool_stats
+)
+from .id_allocator import get_id_allocator, next_id, allocate_ids, ensure_sequences
+from .file_reader import read_file_rows
 
-__all__ = ['get_db_connection', 'get_current_date']
+__all__ = [
+    'get_db_connection', 'get_current_date', 'get_connection_manager', 'get_pool_stats',
+    'get_id_allocator', 'next_id', 'allocate_ids', 'ensure_sequences',
+    'read_file_rows'
+]
 
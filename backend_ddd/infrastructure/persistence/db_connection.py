@@ -1,8 +1,14 @@
 """
 数据库连接工具
+进程内只打开一次DuckDB数据库实例，按线程从有界连接池中分配游标
 """
 from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Deque, Callable
 import os
+import threading
+import time
 import duckdb
 
 # 获取当前脚本所在目录
@@ -10,14 +16,292 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 # 定义数据库路径（使用backend_ddd目录下的数据库）
 DB_PATH = os.path.join(script_dir, '..', '..', 'app.data.db')
 
+# 连接池大小（同时被借出的游标上限）
+POOL_SIZE = 8
+# 借出游标的最长等待时间（秒）
+POOL_TIMEOUT = 30.0
 
-def get_db_connection():
-    """获取数据库连接"""
-    conn = duckdb.connect(DB_PATH)
-    return conn
+
+class PooledConnection:
+    """
+    池化连接
+
+    包装一个DuckDB游标，接口与duckdb连接一致；
+    close()不会真正关闭游标，而是把它归还给连接池
+    """
+
+    def __init__(self, manager: 'ConnectionManager', cursor: duckdb.DuckDBPyConnection):
+        self._manager = manager
+        self._cursor = cursor
+        self._depth = 0  # 同一线程内的重入次数
+        self._tx_depth = 0  # 事务嵌套层数
+
+    @property
+    def raw(self) -> duckdb.DuckDBPyConnection:
+        """底层DuckDB游标"""
+        return self._cursor
+
+    def execute(self, query: str, parameters=None):
+        if parameters is None:
+            return self._cursor.execute(query)
+        return self._cursor.execute(query, parameters)
+
+    def executemany(self, query: str, parameters):
+        return self._cursor.executemany(query, parameters)
+
+    def commit(self) -> None:
+        self._cursor.commit()
+
+    def rollback(self) -> None:
+        self._cursor.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """
+        显式事务
+
+        嵌套调用时只有最外层真正BEGIN/COMMIT，异常时整体回滚
+        """
+        if self._tx_depth > 0:
+            self._tx_depth += 1
+            try:
+                yield self
+            finally:
+                self._tx_depth -= 1
+            return
+
+        self._cursor.execute("BEGIN TRANSACTION")
+        self._tx_depth = 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth = 0
+            self._cursor.execute("ROLLBACK")
+            raise
+        self._tx_depth = 0
+        self._cursor.execute("COMMIT")
+
+    def close(self) -> None:
+        """归还到连接池"""
+        self._manager.release(self)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class DedicatedConnection(PooledConnection):
+    """
+    专用连接
+
+    不占连接池名额、不参与线程内复用，close()时回滚未提交的事务并关闭游标；
+    用于ETL这类长时间占用连接的后台任务，避免挤占请求的连接池
+    """
+
+    def close(self) -> None:
+        self._manager.close_dedicated(self)
+
+
+class ConnectionManager:
+    """
+    进程级连接管理器
+
+    - 只持有一个DuckDB数据库实例（根连接），避免每次请求重复打开文件和加载catalog
+    - 游标通过根连接的cursor()创建，按线程借出，同一线程重入时复用同一个游标
+    - 同时借出的游标数量受pool_size限制，超出时按FIFO顺序等待
+    - 打开数据库时先在根连接上执行注册的初始化（建表、建序列），再借出游标
+    - 后台任务通过open_dedicated()取得池外的专用游标，不计入pool_size
+    """
+
+    def __init__(self, db_path: str = DB_PATH, pool_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self._root: Optional[duckdb.DuckDBPyConnection] = None
+        self._setups: List[Callable[[duckdb.DuckDBPyConnection], None]] = []
+        self._idle: List[duckdb.DuckDBPyConnection] = []
+        self._in_use = 0
+        self._created = 0
+        self._dedicated = 0
+        self._waiters: Deque[threading.Event] = deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+
+    def on_open(self, setup: Callable[[duckdb.DuckDBPyConnection], None]) -> None:
+        """
+        注册打开数据库时执行的初始化，数据库已打开时立即执行
+
+        初始化在根连接上自动提交，早于任何游标借出：DuckDB的事务看不到事务开始后
+        其他连接新建的catalog对象，DDL放在调用方的事务里回滚后也会丢失
+        """
+        with self._lock:
+            self._setups.append(setup)
+            if self._root is not None:
+                setup(self._root)
+
+    def acquire(self) -> PooledConnection:
+        """借出当前线程的游标"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None and held._depth > 0:
+            held._depth += 1
+            return held
+
+        with self._lock:
+            self._checkouts += 1
+            if self._in_use < self.pool_size and not self._waiters:
+                self._in_use += 1
+                slot = None
+            else:
+                # 按先来后到排队，归还时直接把名额交给队首，避免等待线程被饿死
+                self._waits += 1
+                slot = threading.Event()
+                self._waiters.append(slot)
+
+        if slot is not None:
+            started = time.monotonic()
+            granted = slot.wait(self.timeout)
+            with self._lock:
+                self._wait_time += time.monotonic() - started
+                if not granted and not slot.is_set():
+                    self._waiters.remove(slot)
+                    self._timeouts += 1
+                    raise TimeoutError(f"Timed out waiting for a database connection after {self.timeout}s")
+
+        try:
+            with self._lock:
+                cursor = self._idle.pop() if self._idle else self._new_cursor()
+        except Exception:
+            self._free_slot()
+            raise
+
+        conn = PooledConnection(self, cursor)
+        conn._depth = 1
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        """归还游标；最外层归还时回收到空闲列表"""
+        conn._depth -= 1
+        if conn._depth > 0:
+            return
+
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.conn = None
+
+        # 未提交的事务不能带回连接池
+        conn._tx_depth = 0
+        try:
+            conn._cursor.rollback()
+        except duckdb.Error:
+            pass
+
+        with self._lock:
+            self._idle.append(conn._cursor)
+        self._free_slot()
+
+    def open_dedicated(self) -> DedicatedConnection:
+        """在连接池之外打开一个专用游标（用完调用close()关闭）"""
+        with self._lock:
+            if self._root is None:
+                self._open_root()
+            cursor = self._root.cursor()
+            self._dedicated += 1
+        return DedicatedConnection(self, cursor)
+
+    def close_dedicated(self, conn: DedicatedConnection) -> None:
+        """关闭专用游标"""
+        conn._tx_depth = 0
+        try:
+            conn._cursor.rollback()
+        except duckdb.Error:
+            pass
+        conn._cursor.close()
+        with self._lock:
+            self._dedicated -= 1
+
+    def _free_slot(self) -> None:
+        """释放一个名额：有排队线程时直接转交，否则计数减一"""
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._in_use -= 1
+
+    def stats(self) -> Dict:
+        """连接池统计信息"""
+        with self._lock:
+            return {
+                "poolSize": self.pool_size,
+                "created": self._created,
+                "inUse": self._in_use,
+                "idle": len(self._idle),
+                "dedicated": self._dedicated,
+                "waiting": len(self._waiters),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "waitTimeMs": round(self._wait_time * 1000, 3),
+                "timeouts": self._timeouts
+            }
+
+    def close_all(self) -> None:
+        """关闭所有空闲游标和数据库实例"""
+        with self._lock:
+            for cursor in self._idle:
+                cursor.close()
+            self._idle = []
+            self._created = 0
+            if self._root is not None:
+                self._root.close()
+                self._root = None
+
+    def _new_cursor(self) -> duckdb.DuckDBPyConnection:
+        # 调用方已持有self._lock
+        if self._root is None:
+            self._open_root()
+        self._created += 1
+        return self._root.cursor()
+
+    def _open_root(self) -> None:
+        # 调用方已持有self._lock
+        self._root = duckdb.connect(self.db_path)
+        for setup in self._setups:
+            setup(self._root)
+
+
+_manager = ConnectionManager()
+
+
+def get_connection_manager() -> ConnectionManager:
+    """获取进程级连接管理器"""
+    return _manager
+
+
+def get_db_connection() -> PooledConnection:
+    """获取数据库连接（用完调用close()归还连接池）"""
+    return _manager.acquire()
+
+
+def get_dedicated_connection() -> DedicatedConnection:
+    """获取连接池之外的专用连接（用完调用close()关闭），供ETL等长时间运行的后台任务使用"""
+    return _manager.open_dedicated()
+
+
+def get_pool_stats() -> Dict:
+    """获取连接池统计信息"""
+    return _manager.stats()
 
 
 def get_current_date():
     """获取当前日期"""
     return datetime.now().strftime("%Y-%m-%d")
-
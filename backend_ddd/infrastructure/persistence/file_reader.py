@@ -0,0 +1,30 @@
+"""
+导入文件读取
+用DuckDB的read_csv/read_parquet读取上传的文件（不依赖pandas/pyarrow），按行返回dict
+"""
+from typing import Dict, List
+import duckdb
+from infrastructure.persistence.db_connection import get_db_connection
+
+# 支持的文件格式 -> DuckDB表函数（CSV按文本读取，类型由调用方转换）
+FILE_READERS = {
+    "csv": "read_csv(?, header = true, all_varchar = true)",
+    "parquet": "read_parquet(?)"
+}
+
+
+def read_file_rows(path: str, format: str) -> List[Dict]:
+    """读取文件中的全部行，每行为 列名 -> 值；空单元格为None"""
+    reader = FILE_READERS.get(format)
+    if reader is None:
+        raise ValueError(f"format must be one of {list(FILE_READERS)}")
+    conn = get_db_connection()
+    try:
+        try:
+            cursor = conn.execute(f"SELECT * FROM {reader}", (path,))
+        except duckdb.Error as e:
+            raise ValueError(f"Cannot read {format} file: {str(e).splitlines()[0]}")
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
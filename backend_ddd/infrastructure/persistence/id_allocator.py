@@ -0,0 +1,126 @@
+"""
+ID分配器
+基于DuckDB序列分配主键，进程内按块预取，替代 SELECT MAX(id) + 1
+"""
+from typing import Dict, List, Tuple
+import threading
+from infrastructure.persistence.db_connection import get_connection_manager
+
+# 使用序列分配ID的表
+ID_TABLES = [
+    'domains',
+    'models',
+    'properties',
+    'relations',
+    'datasources',
+    'mappings',
+    'model_table_associations',
+    'etl_tasks',
+    'etl_logs',
+    'etl_checkpoints'
+]
+
+# 每次从序列取出的ID块大小（序列的步长）
+BLOCK_SIZE = 100
+
+
+def sequence_name(table: str) -> str:
+    """表对应的序列名"""
+    return f"seq_{table}_id"
+
+
+def ensure_sequence(conn, table: str, block_size: int = BLOCK_SIZE) -> None:
+    """
+    创建表的ID序列（已存在则跳过）
+
+    序列从当前最大ID之后开始，步长为块大小：每次nextval得到一个块的起始ID
+    """
+    start = conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+    conn.execute(
+        f"CREATE SEQUENCE IF NOT EXISTS {sequence_name(table)} START WITH {start} INCREMENT BY {block_size}"
+    )
+
+
+def ensure_sequences(conn, block_size: int = BLOCK_SIZE) -> None:
+    """为所有已存在的表创建ID序列（还没有建表的跳过，由建表脚本创建）"""
+    tables = {row[0] for row in conn.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+    for table in ID_TABLES:
+        if table in tables:
+            ensure_sequence(conn, table, block_size)
+
+
+class IdAllocator:
+    """
+    ID分配器
+
+    - 每张表一个DuckDB序列，序列值不随事务回滚，多个线程/连接并发取值不会重复
+    - 进程内缓存当前块的剩余ID，单条插入不必每次访问序列
+    - 批量分配时一次取出所需的全部块
+    - 序列在打开数据库时创建（见文件末尾的on_open），分配时不执行DDL，
+      因此可以在调用方的事务中分配，事务回滚不会丢失序列
+
+    进程退出时未用完的块会被丢弃，ID可能出现空洞但不会重复
+    """
+
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self._blocks: Dict[str, Tuple[int, int]] = {}  # table -> (下一个ID, 块结束位置)
+        self._lock = threading.Lock()
+
+    def next_id(self, conn, table: str) -> int:
+        """分配一个ID"""
+        return self.allocate(conn, table, 1)[0]
+
+    def allocate(self, conn, table: str, count: int) -> List[int]:
+        """分配count个ID（按升序返回）"""
+        if count <= 0:
+            return []
+
+        with self._lock:
+            ids: List[int] = []
+            next_id, end = self._blocks.get(table, (0, 0))
+            take = min(count, end - next_id)
+            if take > 0:
+                ids.extend(range(next_id, next_id + take))
+                next_id += take
+
+            missing = count - len(ids)
+            if missing > 0:
+                blocks = -(-missing // self.block_size)
+                starts = conn.execute(
+                    f"SELECT nextval('{sequence_name(table)}') FROM range(?)",
+                    (blocks,)
+                ).fetchall()
+                for (start,) in sorted(starts):
+                    take = min(missing, self.block_size)
+                    ids.extend(range(start, start + take))
+                    missing -= take
+                    next_id, end = start + take, start + self.block_size
+
+            self._blocks[table] = (next_id, end)
+            return ids
+
+    def reset(self) -> None:
+        """丢弃缓存的块（数据库被替换后使用）"""
+        with self._lock:
+            self._blocks = {}
+
+
+_allocator = IdAllocator()
+# 已有数据库（创建序列之前的版本）在打开时补建序列，不在请求的事务里建
+get_connection_manager().on_open(ensure_sequences)
+
+
+def get_id_allocator() -> IdAllocator:
+    """获取进程级ID分配器"""
+    return _allocator
+
+
+def next_id(conn, table: str) -> int:
+    """为table分配一个新ID"""
+    return _allocator.next_id(conn, table)
+
+
+def allocate_ids(conn, table: str, count: int) -> List[int]:
+    """为table批量分配count个ID"""
+    return _allocator.allocate(conn, table, count)
@@ -3,14 +3,20 @@
 提供聚合根的持久化操作
 """
 from .model_repository import ModelRepository
+from .cached_model_repository import CachedModelRepository
 from .datasource_repository import DatasourceRepository
 from .etl_repository import ETLRepository
 from .domain_repository import DomainRepository
+from .model_data_repository import ModelDataRepository
+from .model_graph_repository import ModelGraphRepository
 
 __all__ = [
     'ModelRepository',
+    'CachedModelRepository',
     'DatasourceRepository',
     'ETLRepository',
-    'DomainRepository'
+    'DomainRepository',
+    'ModelDataRepository',
+    'ModelGraphRepository'
 ]
 
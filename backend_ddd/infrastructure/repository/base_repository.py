@@ -3,9 +3,205 @@
 定义聚合根的持久化操作
 """
 from abc import ABC, abstractmethod
-from typing import Optional, List, TypeVar, Generic
+from collections import defaultdict
+from typing import Optional, List, TypeVar, Generic, Dict, Callable, Iterable, Iterator, Tuple
+import json
+import os
+import tempfile
+from infrastructure.persistence.db_connection import get_db_connection
 
 T = TypeVar('T')
+C = TypeVar('C')
+
+# IN查询每批最多携带的ID数量
+IN_CHUNK_SIZE = 1000
+# 流式读取时每次fetchmany的行数
+STREAM_BATCH_SIZE = 500
+
+
+def chunked(ids: List[int], size: int = IN_CHUNK_SIZE) -> Iterator[List[int]]:
+    """把ID列表切成固定大小的批次"""
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def select_page(
+    table: str,
+    filters: Optional[dict] = None,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None
+) -> Tuple[str, tuple]:
+    """
+    构造按ID键集分页的查询
+    
+    结果按id升序；after_id为上一页最后一条的id（不使用OFFSET）
+    """
+    query = f"SELECT * FROM {table}"
+    conditions, params = [], []
+    if filters:
+        for key, value in filters.items():
+            conditions.append(f"{key} = ?")
+            params.append(value)
+    if after_id is not None:
+        conditions.append("id > ?")
+        params.append(after_id)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def iter_rows(query: str, params: tuple = (), batch_size: int = STREAM_BATCH_SIZE) -> Iterator[tuple]:
+    """
+    流式读取查询结果
+    
+    在独立游标上执行查询并按batch_size分批fetchmany，
+    迭代期间占用一个连接池名额，迭代结束或生成器关闭时归还
+    """
+    for rows in iter_batches(query, params, batch_size):
+        yield from rows
+
+
+def iter_batches(query: str, params: tuple = (), batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[tuple]]:
+    """与iter_rows相同，但按批返回fetchmany的结果"""
+    conn = get_db_connection()
+    cursor = conn.raw.cursor()
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def load_children(
+    conn,
+    table: str,
+    parent_column: str,
+    parent_ids: Iterable[int],
+    from_row: Callable[[tuple], C]
+) -> Dict[int, List[C]]:
+    """
+    批量加载聚合内的子实体
+    
+    对每批父ID执行一次 SELECT ... WHERE parent_column IN (...)，
+    按父ID分组返回；from_row接收的行与 SELECT * 的列顺序一致
+    """
+    grouped: Dict[int, List[C]] = defaultdict(list)
+    ids = list(parent_ids)
+    for chunk in chunked(ids):
+        placeholders = ", ".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT {parent_column}, * FROM {table} WHERE {parent_column} IN ({placeholders}) ORDER BY id",
+            tuple(chunk)
+        ).fetchall()
+        for row in rows:
+            grouped[row[0]].append(from_row(row[1:]))
+    return grouped
+
+
+def delete_by_ids(conn, table: str, ids: Iterable[int]) -> None:
+    """按ID批量删除"""
+    ids = list(ids)
+    for chunk in chunked(ids):
+        placeholders = ", ".join("?" * len(chunk))
+        conn.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", tuple(chunk))
+
+
+def check_unreferenced(conn, label: str, id: int, references: Dict[str, str]) -> None:
+    """
+    删除聚合前检查外部引用，仍被引用时抛出ValueError
+
+    references为 表名 -> 条件（条件中的每个?都绑定id）
+    """
+    referenced = [
+        table for table, condition in references.items()
+        if conn.execute(f"SELECT 1 FROM {table} WHERE {condition} LIMIT 1",
+                        (id,) * condition.count("?")).fetchone()
+    ]
+    if referenced:
+        raise ValueError(f"{label} {id} is still referenced by {', '.join(referenced)}")
+
+
+def bulk_insert(conn, table: str, columns: Dict[str, str], rows: Iterable[tuple]) -> int:
+    """
+    以集合方式批量插入，返回插入的行数
+
+    DuckDB的executemany逐行绑定参数，几万行要数十秒：这里先把行写成临时NDJSON文件，
+    再用一条 INSERT ... SELECT FROM read_json 写入（保留NULL与空字符串的区别）。
+    columns为列名 -> DuckDB类型，顺序与每行中值的顺序一致
+    """
+    names = list(columns)
+    fd, path = tempfile.mkstemp(prefix=f"{table}_", suffix=".ndjson")
+    try:
+        count = 0
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str))
+                f.write("\n")
+                count += 1
+        if count:
+            conn.execute(
+                f"INSERT INTO {table} ({', '.join(names)}) "
+                f"SELECT {', '.join(names)} FROM read_json(?, format = 'newline_delimited', columns = ?)",
+                (path, columns)
+            )
+        return count
+    finally:
+        os.remove(path)
+
+
+class ChildChanges(Generic[C]):
+    """聚合内子实体相对于上次加载/保存时的变更集"""
+    
+    def __init__(self, added: List[C], modified: List[C], removed_ids: List[int]):
+        self.added = added
+        self.modified = modified
+        self.removed_ids = removed_ids
+    
+    def is_empty(self) -> bool:
+        return not (self.added or self.modified or self.removed_ids)
+
+
+def mark_persisted(aggregate, collection: str, children: Iterable[C], values: Callable[[C], tuple]) -> None:
+    """
+    记录子实体的持久化快照（加载或保存后调用）
+    
+    values返回实体中需要持久化的字段，用于之后判断实体是否被修改
+    """
+    snapshots = aggregate.__dict__.setdefault('_persisted_children', {})
+    snapshots[collection] = {child.id: values(child) for child in children}
+
+
+def diff_children(aggregate, collection: str, children: List[C], values: Callable[[C], tuple]) -> ChildChanges[C]:
+    """
+    与快照比较，得到新增、修改和删除的子实体
+    
+    没有快照说明子实体集合未从数据库加载（如新建聚合或只加载了聚合根），
+    此时只插入没有ID的新实体，不修改也不删除已有数据
+    """
+    snapshot = getattr(aggregate, '_persisted_children', {}).get(collection)
+    if snapshot is None:
+        return ChildChanges([c for c in children if not c.id], [], [])
+    
+    added, modified, current_ids = [], [], set()
+    for child in children:
+        if not child.id or child.id not in snapshot:
+            added.append(child)
+            continue
+        current_ids.add(child.id)
+        if values(child) != snapshot[child.id]:
+            modified.append(child)
+    
+    removed_ids = [cid for cid in snapshot if cid not in current_ids]
+    return ChildChanges(added, modified, removed_ids)
 
 
 class IRepository(ABC, Generic[T]):
@@ -17,8 +213,13 @@ class IRepository(ABC, Generic[T]):
         pass
     
     @abstractmethod
-    def find_all(self, filters: Optional[dict] = None) -> List[T]:
-        """查找所有聚合根"""
+    def find_all(
+        self,
+        filters: Optional[dict] = None,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> List[T]:
+        """查找聚合根（按id升序，limit/after_id用于键集分页）"""
         pass
     
     @abstractmethod
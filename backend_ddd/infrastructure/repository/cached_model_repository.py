@@ -0,0 +1,165 @@
+"""
+带缓存的Model聚合仓储
+在ModelRepository前加一层进程内读穿透缓存，写入时同步失效
+"""
+from typing import Optional, List, Iterator, Dict, Set, Iterable
+import copy
+from infrastructure.cache import LRUCache
+from infrastructure.repository.base_repository import IRepository
+from infrastructure.repository.model_repository import ModelRepository, ImportedRelation
+from meta.model import Model, Property
+from meta.shared import Relation
+
+# 缓存的Model聚合数量上限
+MODEL_CACHE_SIZE = 1000
+# 缓存的列表查询数量上限
+LIST_CACHE_SIZE = 100
+
+# 进程内共享，多个CachedModelRepository实例看到同一份缓存
+_models = LRUCache(MODEL_CACHE_SIZE)
+_lists = LRUCache(LIST_CACHE_SIZE)
+
+
+class CachedModelRepository(IRepository[Model]):
+    """
+    带缓存的Model聚合仓储
+
+    - find_by_id按Model ID缓存，find_all按(过滤条件, limit, after_id)缓存
+    - find_by_id返回单个聚合的副本（调用方可以修改后save），不会污染缓存；
+      find_all返回的聚合与缓存共享，只能读取（列表查询只用于展示，需要修改时用find_by_id）
+    - save/delete时失效Model本身及其Relation两端的Model（Relation会出现在两端的聚合中），
+      并清空列表缓存；delete_relation只失效该Relation两端的Model；
+      import_models只失效与新Relation相连的已有Model（新建的Model不在缓存中）
+    """
+
+    def __init__(self, repository: Optional[ModelRepository] = None):
+        self.repository = repository or ModelRepository()
+
+    def find_by_id(self, id: int) -> Optional[Model]:
+        """根据ID查找Model聚合（读穿透缓存）"""
+        cached = _models.get(id)
+        if cached is not None:
+            return _copy_model(cached)
+
+        generation = _models.generation
+        model = self.repository.find_by_id(id)
+        if model is None:
+            return None
+        _models.put(id, model, generation)
+        return _copy_model(model)
+
+    def find_all(
+        self,
+        filters: Optional[dict] = None,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> List[Model]:
+        """查找Model聚合（读穿透缓存，返回的聚合只读）"""
+        key = (tuple(sorted((filters or {}).items())), limit, after_id)
+        cached = _lists.get(key)
+        if cached is not None:
+            return list(cached)
+
+        generation = _lists.generation
+        models = self.repository.find_all(filters, limit, after_id)
+        _lists.put(key, tuple(models), generation)
+        return models
+
+    def iter_all(self, filters: Optional[dict] = None) -> Iterator[Model]:
+        """流式读取不经过缓存"""
+        return self.repository.iter_all(filters)
+
+    def iter_properties(self, model_id: Optional[int] = None) -> Iterator[Property]:
+        """流式读取不经过缓存"""
+        return self.repository.iter_properties(model_id)
+
+    def save(self, aggregate: Model) -> Model:
+        """保存Model聚合并失效相关缓存"""
+        stale = self._related_ids(aggregate.id) if aggregate.id else set()
+        try:
+            return self.repository.save(aggregate)
+        finally:
+            stale.add(aggregate.id)
+            stale.update(self._endpoint_ids(aggregate))
+            self._invalidate(stale)
+
+    def delete(self, id: int) -> bool:
+        """删除Model聚合并失效相关缓存"""
+        stale = self._related_ids(id)
+        try:
+            return self.repository.delete(id)
+        finally:
+            stale.add(id)
+            self._invalidate(stale)
+
+    def find_ids_by_code(self, codes: Iterable[str]) -> Dict[str, int]:
+        return self.repository.find_ids_by_code(codes)
+
+    def find_existing_ids(self, ids: Iterable[int]) -> Set[int]:
+        return self.repository.find_existing_ids(ids)
+
+    def import_models(self, models: List[Model], relations: List[ImportedRelation]) -> None:
+        """批量导入并失效与新Relation相连的已有Model的缓存"""
+        try:
+            self.repository.import_models(models, relations)
+        finally:
+            self._invalidate({
+                endpoint
+                for _, source, target in relations
+                for endpoint in (source, target) if isinstance(endpoint, int)
+            })
+
+    def find_relation(self, relation_id: int) -> Optional[Relation]:
+        """按ID查找Relation不经过缓存"""
+        return self.repository.find_relation(relation_id)
+
+    def delete_relation(self, relation_id: int) -> Optional[Relation]:
+        """删除单个Relation并失效两端Model的缓存"""
+        relation = self.repository.delete_relation(relation_id)
+        if relation is not None:
+            self._invalidate({relation.sourceModelId, relation.targetModelId})
+        return relation
+
+    def _related_ids(self, id: int) -> Set[int]:
+        # 写入前库中已有的Relation端点：被删除的Relation也要让另一端失效
+        return self.repository.find_related_model_ids(id)
+
+    def _endpoint_ids(self, model: Model) -> Set[int]:
+        return {
+            model_id
+            for relation in model.relations
+            for model_id in (relation.sourceModelId, relation.targetModelId)
+        }
+
+    def _invalidate(self, model_ids: Set[int]) -> None:
+        _models.invalidate(*model_ids)
+        _lists.clear()
+
+
+def _copy_model(model: Model) -> Model:
+    """
+    复制单个聚合供调用方修改
+
+    实体的字段都是不可变值，逐个浅复制即可；constraints列表和持久化快照的dict单独复制
+    （比deepcopy整个对象图快一个数量级）
+    """
+    clone = copy.copy(model)
+    clone._properties = []
+    for prop in model._properties:
+        prop_copy = copy.copy(prop)
+        prop_copy.constraints = [dict(c) if isinstance(c, dict) else c for c in prop.constraints]
+        clone._properties.append(prop_copy)
+    clone._relations = [copy.copy(relation) for relation in model._relations]
+    snapshots = model.__dict__.get('_persisted_children')
+    if snapshots is not None:
+        clone._persisted_children = {name: dict(snapshot) for name, snapshot in snapshots.items()}
+    return clone
+
+
+def get_model_cache_stats() -> Dict:
+    """Model缓存的命中统计"""
+    return {
+        "models": _models.stats(),
+        "lists": _lists.stats()
+    }
+
@@ -2,15 +2,29 @@
 Datasource聚合仓储
 负责Datasource聚合的持久化，包括Mappings和ModelTableAssociations
 """
-from typing import Optional, List
-from infrastructure.repository.base_repository import IRepository
+from typing import Optional, List, Iterator
+from infrastructure.repository.base_repository import (
+    IRepository, select_page, iter_rows, load_children, delete_by_ids, diff_children, mark_persisted,
+    check_unreferenced
+)
 from infrastructure.persistence.db_connection import get_db_connection, get_current_date
+from infrastructure.persistence.id_allocator import next_id as allocate_id, allocate_ids
+from infrastructure.search.search_index import get_search_index
 from meta.datasource import Datasource, ModelTableAssociation
 from meta.shared import Mapping
 
+# 引用Datasource、会阻止删除的表 -> 条件
+DATASOURCE_REFERENCES = {
+    "etl_tasks": "sourceDatasourceId = ?"
+}
+
 
 class DatasourceRepository(IRepository[Datasource]):
-    """Datasource聚合仓储"""
+    """
+    Datasource聚合仓储
+
+    save/delete提交后同步更新进程内的搜索索引
+    """
     
     def find_by_id(self, id: int) -> Optional[Datasource]:
         """根据ID查找Datasource聚合"""
@@ -30,41 +44,50 @@ class DatasourceRepository(IRepository[Datasource]):
             for assoc in associations:
                 datasource._modelTableAssociations.append(assoc)
             
+            self._mark_persisted(datasource)
             return datasource
         finally:
             conn.close()
     
-    def find_all(self, filters: Optional[dict] = None) -> List[Datasource]:
-        """查找所有Datasource聚合"""
+    def find_all(
+        self,
+        filters: Optional[dict] = None,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        with_children: bool = True
+    ) -> List[Datasource]:
+        """
+        查找Datasource聚合（按id升序，limit/after_id用于键集分页）
+        
+        with_children=False时只加载聚合根，不加载Mappings和Associations
+        """
         conn = get_db_connection()
         try:
-            query = "SELECT * FROM datasources"
-            params = []
-            if filters:
-                conditions = [f"{k} = ?" for k in filters.keys()]
-                params = list(filters.values())
-                query += " WHERE " + " AND ".join(conditions)
+            query, params = select_page("datasources", filters, limit, after_id)
+            rows = conn.execute(query, params).fetchall()
+            datasources = [self._datasource_from_row(row) for row in rows]
             
-            rows = conn.execute(query, tuple(params)).fetchall()
-            datasources = []
-            for row in rows:
-                ds = self._datasource_from_row(row)
-                ds_id = row[0]
-                
-                mappings = self._load_mappings(conn, ds_id)
-                for m in mappings:
-                    ds._mappings.append(m)
-                
-                associations = self._load_associations(conn, ds_id)
-                for a in associations:
-                    ds._modelTableAssociations.append(a)
-                
-                datasources.append(ds)
+            if with_children and datasources:
+                ds_ids = [ds.id for ds in datasources]
+                mappings = load_children(conn, "mappings", "datasourceId", ds_ids, self._mapping_from_row)
+                associations = load_children(
+                    conn, "model_table_associations", "datasourceId", ds_ids, self._association_from_row
+                )
+                for ds in datasources:
+                    ds._mappings.extend(mappings.get(ds.id, []))
+                    ds._modelTableAssociations.extend(associations.get(ds.id, []))
+                    self._mark_persisted(ds)
             
             return datasources
         finally:
             conn.close()
     
+    def iter_all(self, filters: Optional[dict] = None) -> Iterator[Datasource]:
+        """流式读取Datasource聚合根（按id升序，不加载子实体）"""
+        query, params = select_page("datasources", filters)
+        for row in iter_rows(query, params):
+            yield self._datasource_from_row(row)
+    
     def save(self, aggregate: Datasource) -> Datasource:
         """保存Datasource聚合"""
         conn = get_db_connection()
@@ -73,28 +96,37 @@ class DatasourceRepository(IRepository[Datasource]):
             if not is_valid:
                 raise ValueError(error)
             
-            if aggregate.id and self._exists(conn, aggregate.id):
-                self._update_datasource(conn, aggregate)
-            else:
-                aggregate = self._create_datasource(conn, aggregate)
-            
-            self._save_mappings(conn, aggregate)
-            self._save_associations(conn, aggregate)
+            with conn.transaction():
+                if aggregate.id and self._exists(conn, aggregate.id):
+                    self._update_datasource(conn, aggregate)
+                else:
+                    aggregate = self._create_datasource(conn, aggregate)
+                
+                self._save_mappings(conn, aggregate)
+                self._save_associations(conn, aggregate)
             
-            conn.commit()
+            self._mark_persisted(aggregate)
+            get_search_index().index_datasource(aggregate.id, aggregate.name, aggregate.tableName, aggregate.domainId)
             return aggregate
         finally:
             conn.close()
     
     def delete(self, id: int) -> bool:
-        """删除Datasource聚合"""
+        """
+        删除Datasource聚合（包括Mappings和ModelTableAssociations）
+
+        仍被ETLTask引用时抛出ValueError，不删除任何数据
+        """
         conn = get_db_connection()
         try:
-            conn.execute("DELETE FROM mappings WHERE datasourceId = ?", (id,))
-            conn.execute("DELETE FROM model_table_associations WHERE datasourceId = ?", (id,))
-            result = conn.execute("DELETE FROM datasources WHERE id = ?", (id,))
-            conn.commit()
-            return result.rowcount > 0
+            with conn.transaction():
+                check_unreferenced(conn, "Datasource", id, DATASOURCE_REFERENCES)
+                conn.execute("DELETE FROM mappings WHERE datasourceId = ?", (id,))
+                conn.execute("DELETE FROM model_table_associations WHERE datasourceId = ?", (id,))
+            # DuckDB不允许在删除子表行的同一事务中删除被它们引用的父表行，Datasource行在事务提交后单独删除
+            deleted = conn.execute("DELETE FROM datasources WHERE id = ?", (id,)).fetchone()[0]
+            get_search_index().remove_datasource(id)
+            return deleted > 0
         finally:
             conn.close()
     
@@ -103,7 +135,7 @@ class DatasourceRepository(IRepository[Datasource]):
         return result[0] > 0
     
     def _create_datasource(self, conn, ds: Datasource) -> Datasource:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM datasources").fetchone()[0]
+        next_id = allocate_id(conn, "datasources")
         ds.id = next_id
         conn.execute(
             """INSERT INTO datasources 
@@ -126,60 +158,60 @@ class DatasourceRepository(IRepository[Datasource]):
         )
     
     def _save_mappings(self, conn, ds: Datasource) -> None:
-        existing = {m.id: m for m in self._load_mappings(conn, ds.id)}
-        current_ids = {m.id for m in ds.mappings}
+        """只写入变更的Mappings"""
+        changes = diff_children(ds, "mappings", ds.mappings, self._mapping_values)
         
-        for mid in existing:
-            if mid not in current_ids:
-                conn.execute("DELETE FROM mappings WHERE id = ?", (mid,))
+        if changes.removed_ids:
+            delete_by_ids(conn, "mappings", changes.removed_ids)
         
-        for m in ds.mappings:
-            if m.id and m.id in existing:
-                self._update_mapping(conn, m)
-            else:
-                self._create_mapping(conn, m)
-    
-    def _create_mapping(self, conn, m: Mapping) -> None:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM mappings").fetchone()[0]
-        m.id = next_id
-        conn.execute(
-            "INSERT INTO mappings (id, datasourceId, modelId, fieldId, propertyId, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (m.id, m.datasourceId, m.modelId, m.fieldId, m.propertyId, m.createdAt or get_current_date(), m.updatedAt or get_current_date())
-        )
+        if changes.added:
+            ids = allocate_ids(conn, "mappings", len(changes.added))
+            for m, mapping_id in zip(changes.added, ids):
+                m.id = mapping_id
+            conn.executemany(
+                "INSERT INTO mappings (id, datasourceId, modelId, fieldId, propertyId, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(m.id, m.datasourceId, m.modelId, m.fieldId, m.propertyId, m.createdAt or get_current_date(), m.updatedAt or get_current_date())
+                 for m in changes.added]
+            )
+        
+        if changes.modified:
+            conn.executemany(
+                "UPDATE mappings SET fieldId = ?, propertyId = ?, updatedAt = ? WHERE id = ?",
+                [(m.fieldId, m.propertyId, get_current_date(), m.id) for m in changes.modified]
+            )
     
-    def _update_mapping(self, conn, m: Mapping) -> None:
-        conn.execute(
-            "UPDATE mappings SET fieldId = ?, propertyId = ?, updatedAt = ? WHERE id = ?",
-            (m.fieldId, m.propertyId, get_current_date(), m.id)
-        )
+    def _mapping_values(self, m: Mapping) -> tuple:
+        return (m.fieldId, m.propertyId)
     
     def _save_associations(self, conn, ds: Datasource) -> None:
-        existing = {a.id: a for a in self._load_associations(conn, ds.id)}
-        current_ids = {a.id for a in ds.modelTableAssociations}
+        """只写入变更的ModelTableAssociations"""
+        changes = diff_children(ds, "associations", ds.modelTableAssociations, self._association_values)
         
-        for aid in existing:
-            if aid not in current_ids:
-                conn.execute("DELETE FROM model_table_associations WHERE id = ?", (aid,))
+        if changes.removed_ids:
+            delete_by_ids(conn, "model_table_associations", changes.removed_ids)
         
-        for a in ds.modelTableAssociations:
-            if a.id and a.id in existing:
-                self._update_association(conn, a)
-            else:
-                self._create_association(conn, a)
-    
-    def _create_association(self, conn, a: ModelTableAssociation) -> None:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM model_table_associations").fetchone()[0]
-        a.id = next_id
-        conn.execute(
-            "INSERT INTO model_table_associations (id, modelId, datasourceId, tableName, status, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (a.id, a.modelId, a.datasourceId, a.tableName, a.status, a.createdAt or get_current_date(), a.updatedAt or get_current_date())
-        )
-    
-    def _update_association(self, conn, a: ModelTableAssociation) -> None:
-        conn.execute(
-            "UPDATE model_table_associations SET tableName = ?, status = ?, updatedAt = ? WHERE id = ?",
-            (a.tableName, a.status, get_current_date(), a.id)
-        )
+        if changes.added:
+            ids = allocate_ids(conn, "model_table_associations", len(changes.added))
+            for a, association_id in zip(changes.added, ids):
+                a.id = association_id
+            conn.executemany(
+                "INSERT INTO model_table_associations (id, modelId, datasourceId, tableName, status, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(a.id, a.modelId, a.datasourceId, a.tableName, a.status, a.createdAt or get_current_date(), a.updatedAt or get_current_date())
+                 for a in changes.added]
+            )
+        
+        if changes.modified:
+            conn.executemany(
+                "UPDATE model_table_associations SET tableName = ?, status = ?, updatedAt = ? WHERE id = ?",
+                [(a.tableName, a.status, get_current_date(), a.id) for a in changes.modified]
+            )
+    
+    def _association_values(self, a: ModelTableAssociation) -> tuple:
+        return (a.tableName, a.status)
+    
+    def _mark_persisted(self, ds: Datasource) -> None:
+        mark_persisted(ds, "mappings", ds._mappings, self._mapping_values)
+        mark_persisted(ds, "associations", ds._modelTableAssociations, self._association_values)
     
     def _load_mappings(self, conn, ds_id: int) -> List[Mapping]:
         rows = conn.execute("SELECT * FROM mappings WHERE datasourceId = ?", (ds_id,)).fetchall()
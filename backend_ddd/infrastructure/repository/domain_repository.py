@@ -2,8 +2,9 @@
 Domain仓储
 Domain不是聚合根，但需要持久化
 """
-from typing import Optional, List
+from typing import Optional, List, Iterable, Set
 from infrastructure.persistence.db_connection import get_db_connection, get_current_date
+from infrastructure.persistence.id_allocator import next_id as allocate_id
 from meta.shared import Domain
 
 
@@ -28,6 +29,19 @@ class DomainRepository:
         finally:
             conn.close()
     
+    def find_existing_ids(self, ids: Iterable[int]) -> Set[int]:
+        """返回ids中在库中存在的Domain ID"""
+        ids = list(ids)
+        if not ids:
+            return set()
+        conn = get_db_connection()
+        try:
+            placeholders = ", ".join("?" * len(ids))
+            rows = conn.execute(f"SELECT id FROM domains WHERE id IN ({placeholders})", tuple(ids)).fetchall()
+            return {row[0] for row in rows}
+        finally:
+            conn.close()
+    
     def save(self, domain: Domain) -> Domain:
         """保存Domain"""
         conn = get_db_connection()
@@ -45,9 +59,9 @@ class DomainRepository:
         """删除Domain"""
         conn = get_db_connection()
         try:
-            result = conn.execute("DELETE FROM domains WHERE id = ?", (id,))
+            deleted = conn.execute("DELETE FROM domains WHERE id = ?", (id,)).fetchone()[0]
             conn.commit()
-            return result.rowcount > 0
+            return deleted > 0
         finally:
             conn.close()
     
@@ -56,7 +70,7 @@ class DomainRepository:
         return result[0] > 0
     
     def _create(self, conn, domain: Domain) -> Domain:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM domains").fetchone()[0]
+        next_id = allocate_id(conn, "domains")
         domain.id = next_id
         conn.execute(
             "INSERT INTO domains (id, name, description, owner, updatedAt) VALUES (?, ?, ?, ?, ?)",
@@ -2,9 +2,12 @@
 ETL聚合仓储
 负责ETLTask聚合的持久化，包括ETLLogs
 """
-from typing import Optional, List
-from infrastructure.repository.base_repository import IRepository
+from typing import Optional, List, Iterator
+from infrastructure.repository.base_repository import (
+    IRepository, select_page, iter_rows, load_children, delete_by_ids, diff_children, mark_persisted
+)
 from infrastructure.persistence.db_connection import get_db_connection, get_current_date
+from infrastructure.persistence.id_allocator import next_id as allocate_id, allocate_ids
 from meta.etl import ETLTask, ETLLog
 import json
 
@@ -12,8 +15,8 @@ import json
 class ETLRepository(IRepository[ETLTask]):
     """ETL聚合仓储"""
     
-    def find_by_id(self, id: int) -> Optional[ETLTask]:
-        """根据ID查找ETLTask聚合"""
+    def find_by_id(self, id: int, with_children: bool = True) -> Optional[ETLTask]:
+        """根据ID查找ETLTask聚合（with_children=False时不加载ETLLogs）"""
         conn = get_db_connection()
         try:
             row = conn.execute("SELECT * FROM etl_tasks WHERE id = ?", (id,)).fetchone()
@@ -21,34 +24,41 @@ class ETLRepository(IRepository[ETLTask]):
                 return None
             
             task = self._task_from_row(row)
+            if not with_children:
+                return task
+            
             logs = self._load_logs(conn, id)
             for log in logs:
                 task._logs.append(log)
             
+            self._mark_persisted(task)
             return task
         finally:
             conn.close()
     
-    def find_all(self, filters: Optional[dict] = None) -> List[ETLTask]:
-        """查找所有ETLTask聚合"""
+    def find_all(
+        self,
+        filters: Optional[dict] = None,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        with_children: bool = True
+    ) -> List[ETLTask]:
+        """
+        查找ETLTask聚合（按id升序，limit/after_id用于键集分页）
+        
+        with_children=False时只加载聚合根，不加载ETLLogs
+        """
         conn = get_db_connection()
         try:
-            query = "SELECT * FROM etl_tasks"
-            params = []
-            if filters:
-                conditions = [f"{k} = ?" for k in filters.keys()]
-                params = list(filters.values())
-                query += " WHERE " + " AND ".join(conditions)
+            query, params = select_page("etl_tasks", filters, limit, after_id)
+            rows = conn.execute(query, params).fetchall()
+            tasks = [self._task_from_row(row) for row in rows]
             
-            rows = conn.execute(query, tuple(params)).fetchall()
-            tasks = []
-            for row in rows:
-                task = self._task_from_row(row)
-                task_id = row[0]
-                logs = self._load_logs(conn, task_id)
-                for log in logs:
-                    task._logs.append(log)
-                tasks.append(task)
+            if with_children and tasks:
+                logs = load_children(conn, "etl_logs", "taskId", [t.id for t in tasks], self._log_from_row)
+                for task in tasks:
+                    task._logs.extend(logs.get(task.id, []))
+                    self._mark_persisted(task)
             
             return tasks
         finally:
@@ -62,25 +72,122 @@ class ETLRepository(IRepository[ETLTask]):
             if not is_valid:
                 raise ValueError(error)
             
-            if aggregate.id and self._exists(conn, aggregate.id):
-                self._update_task(conn, aggregate)
-            else:
-                aggregate = self._create_task(conn, aggregate)
+            with conn.transaction():
+                if aggregate.id and self._exists(conn, aggregate.id):
+                    self._update_task(conn, aggregate)
+                else:
+                    aggregate = self._create_task(conn, aggregate)
+                
+                self._save_logs(conn, aggregate)
             
-            self._save_logs(conn, aggregate)
-            conn.commit()
+            self._mark_persisted(aggregate)
             return aggregate
         finally:
             conn.close()
     
+    def iter_all(self, filters: Optional[dict] = None) -> Iterator[ETLTask]:
+        """流式读取ETLTask聚合根（按id升序，不加载ETLLogs）"""
+        query, params = select_page("etl_tasks", filters)
+        for row in iter_rows(query, params):
+            yield self._task_from_row(row)
+    
+    def iter_logs(self, task_id: int) -> Iterator[ETLLog]:
+        """流式读取任务的ETLLogs（按id升序）"""
+        query, params = select_page("etl_logs", {"taskId": task_id})
+        for row in iter_rows(query, params):
+            yield self._log_from_row(row)
+    
+    def find_logs(self, task_id: int, limit: Optional[int] = None, after_id: Optional[int] = None) -> List[ETLLog]:
+        """按id升序分页查询任务的ETLLogs"""
+        conn = get_db_connection()
+        try:
+            query, params = select_page("etl_logs", {"taskId": task_id}, limit, after_id)
+            rows = conn.execute(query, params).fetchall()
+            return [self._log_from_row(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def find_log(self, log_id: int) -> Optional[ETLLog]:
+        """根据ID查找一条ETLLog"""
+        conn = get_db_connection()
+        try:
+            row = conn.execute("SELECT * FROM etl_logs WHERE id = ?", (log_id,)).fetchone()
+            return self._log_from_row(row) if row else None
+        finally:
+            conn.close()
+    
+    def find_latest_log(self, task_id: int) -> Optional[ETLLog]:
+        """任务最近的一条ETLLog"""
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT * FROM etl_logs WHERE taskId = ? ORDER BY id DESC LIMIT 1", (task_id,)
+            ).fetchone()
+            return self._log_from_row(row) if row else None
+        finally:
+            conn.close()
+    
+    def append_log(self, log: ETLLog) -> Optional[ETLLog]:
+        """
+        追加一条ETLLog（不加载任务的历史日志）
+        
+        任务不存在时返回None
+        """
+        appended = self.append_logs(log.taskId, [log])
+        return appended[0] if appended else None
+    
+    def append_logs(self, task_id: int, logs: List[ETLLog]) -> Optional[List[ETLLog]]:
+        """
+        批量追加ETLLog，并在同一事务中更新任务的updatedAt
+        
+        任务不存在时返回None
+        """
+        for log in logs:
+            if log.taskId != task_id:
+                raise ValueError(f"ETLLog must belong to ETLTask {task_id}")
+            is_valid, error = log.is_valid()
+            if not is_valid:
+                raise ValueError(error)
+        
+        conn = get_db_connection()
+        try:
+            with conn.transaction():
+                if not self._exists(conn, task_id):
+                    return None
+                if logs:
+                    self._insert_logs(conn, logs)
+                conn.execute(
+                    "UPDATE etl_tasks SET updatedAt = ? WHERE id = ?",
+                    (get_current_date(), task_id)
+                )
+            return logs
+        finally:
+            conn.close()
+    
+    def update_log(self, log: ETLLog) -> ETLLog:
+        """更新一条已存在的ETLLog（状态、记录数、错误信息和详情）"""
+        is_valid, error = log.is_valid()
+        if not is_valid:
+            raise ValueError(error)
+        
+        conn = get_db_connection()
+        try:
+            with conn.transaction():
+                self._update_logs(conn, [log])
+            return log
+        finally:
+            conn.close()
+    
     def delete(self, id: int) -> bool:
         """删除ETLTask聚合"""
         conn = get_db_connection()
         try:
-            conn.execute("DELETE FROM etl_logs WHERE taskId = ?", (id,))
-            result = conn.execute("DELETE FROM etl_tasks WHERE id = ?", (id,))
-            conn.commit()
-            return result.rowcount > 0
+            with conn.transaction():
+                conn.execute("DELETE FROM etl_checkpoints WHERE taskId = ?", (id,))
+                conn.execute("DELETE FROM etl_logs WHERE taskId = ?", (id,))
+            # DuckDB不允许在删除子表行的同一事务中删除被它们引用的父表行，ETLTask行在事务提交后单独删除
+            deleted = conn.execute("DELETE FROM etl_tasks WHERE id = ?", (id,)).fetchone()[0]
+            return deleted > 0
         finally:
             conn.close()
     
@@ -89,7 +196,7 @@ class ETLRepository(IRepository[ETLTask]):
         return result[0] > 0
     
     def _create_task(self, conn, task: ETLTask) -> ETLTask:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM etl_tasks").fetchone()[0]
+        next_id = allocate_id(conn, "etl_tasks")
         task.id = next_id
         config_json = json.dumps(task.config) if task.config else None
         conn.execute(
@@ -113,40 +220,45 @@ class ETLRepository(IRepository[ETLTask]):
         )
     
     def _save_logs(self, conn, task: ETLTask) -> None:
-        existing = {l.id: l for l in self._load_logs(conn, task.id)}
-        current_ids = {l.id for l in task.logs}
+        """只写入变更的ETLLogs"""
+        changes = diff_children(task, "logs", task.logs, self._log_values)
         
-        for lid in existing:
-            if lid not in current_ids:
-                conn.execute("DELETE FROM etl_logs WHERE id = ?", (lid,))
+        if changes.removed_ids:
+            delete_by_ids(conn, "etl_logs", changes.removed_ids)
         
-        for log in task.logs:
-            if log.id and log.id in existing:
-                self._update_log(conn, log)
-            else:
-                self._create_log(conn, log)
-    
-    def _create_log(self, conn, log: ETLLog) -> None:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM etl_logs").fetchone()[0]
-        log.id = next_id
-        conn.execute(
+        if changes.added:
+            self._insert_logs(conn, changes.added)
+        
+        if changes.modified:
+            self._update_logs(conn, changes.modified)
+    
+    def _insert_logs(self, conn, logs: List[ETLLog]) -> None:
+        ids = allocate_ids(conn, "etl_logs", len(logs))
+        for log, log_id in zip(logs, ids):
+            log.id = log_id
+        conn.executemany(
             """INSERT INTO etl_logs 
-            (id, taskId, status, startTime, endTime, recordsProcessed, recordsSuccess, 
+            (id, taskId, startTime, status, endTime, recordsProcessed, recordsSuccess, 
              recordsFailed, errorMessage, details) 
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (log.id, log.taskId, log.status, log.startTime, log.endTime,
-             log.recordsProcessed, log.recordsSuccess, log.recordsFailed,
-             log.errorMessage, log.details)
+            [(log.id, log.taskId, log.startTime) + self._log_values(log) for log in logs]
         )
     
-    def _update_log(self, conn, log: ETLLog) -> None:
-        conn.execute(
+    def _update_logs(self, conn, logs: List[ETLLog]) -> None:
+        conn.executemany(
             """UPDATE etl_logs SET status = ?, endTime = ?, recordsProcessed = ?,
             recordsSuccess = ?, recordsFailed = ?, errorMessage = ?, details = ? WHERE id = ?""",
-            (log.status, log.endTime, log.recordsProcessed, log.recordsSuccess,
-             log.recordsFailed, log.errorMessage, log.details, log.id)
+            [self._log_values(log) + (log.id,) for log in logs]
         )
     
+    def _log_values(self, log: ETLLog) -> tuple:
+        """ETLLog中可更新的字段（顺序与UPDATE语句一致）"""
+        return (log.status, log.endTime, log.recordsProcessed, log.recordsSuccess,
+                log.recordsFailed, log.errorMessage, log.details)
+    
+    def _mark_persisted(self, task: ETLTask) -> None:
+        mark_persisted(task, "logs", task._logs, self._log_values)
+    
     def _load_logs(self, conn, task_id: int) -> List[ETLLog]:
         rows = conn.execute("SELECT * FROM etl_logs WHERE taskId = ?", (task_id,)).fetchall()
         return [self._log_from_row(row) for row in rows]
@@ -0,0 +1,85 @@
+"""
+Model数据仓储
+只读访问Model的数据表（ETL加载的目标表），按Property脱敏后输出
+"""
+from typing import Optional, List, Dict, Iterator, Set
+import json
+from infrastructure.repository.base_repository import iter_batches
+from infrastructure.persistence.db_connection import get_db_connection
+from infrastructure.etl.sql import quote_ident, data_table_name
+from infrastructure.etl.masking import ColumnMasker
+from meta.model import Model
+
+
+class ModelDataRepository:
+    """
+    Model数据仓储
+    
+    只能读取属于该Model的数据表：默认数据表data_<code>，或目标为该Model的ETL任务配置的targetTable；
+    脱敏规则取自该Model的Property，读取其他表会绕过那些表对应Model的脱敏
+    """
+    
+    def data_tables(self, model: Model) -> Set[str]:
+        """Model可以读取的数据表"""
+        tables = {data_table_name(model.code)}
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                "SELECT config FROM etl_tasks WHERE targetModelId = ? AND config IS NOT NULL", (model.id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        for (config,) in rows:
+            try:
+                target = json.loads(config).get("targetTable")
+            except (ValueError, AttributeError):
+                continue
+            if target:
+                tables.add(target)
+        return tables
+    
+    def table_columns(self, table: str) -> Optional[List[str]]:
+        """数据表的列名，表不存在时返回None"""
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = 'main' AND table_name = ? ORDER BY ordinal_position",
+                (table,)
+            ).fetchall()
+            return [row[0] for row in rows] or None
+        finally:
+            conn.close()
+    
+    def iter_records(self, model: Model, table: Optional[str] = None,
+                     limit: Optional[int] = None) -> Optional[Iterator[Dict]]:
+        """
+        流式读取Model的数据记录（字段名为Property.code，敏感字段已脱敏）
+        
+        脱敏规则能下推的在DuckDB中整列完成，其余在内存中按批处理；
+        table不属于该Model（见data_tables）或数据表不存在时返回None
+        """
+        table = table or data_table_name(model.code)
+        if table not in self.data_tables(model):
+            return None
+        columns = self.table_columns(table)
+        if columns is None:
+            return None
+        
+        existing = set(columns)
+        properties = [p for p in model.properties if (p.physicalColumn or p.code) in existing]
+        if not properties:
+            return iter(())
+        
+        masker = ColumnMasker(properties)
+        query = f"SELECT {', '.join(masker.selects)} FROM {quote_ident(table)}"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        codes = [p.code for p in properties]
+        return (
+            dict(zip(codes, row))
+            for rows in masker.apply_all(iter_batches(query, params))
+            for row in rows
+        )
@@ -0,0 +1,123 @@
+"""
+Model关系图读模型
+为画布直接查询节点和边：一次查询models（可带Property数），一次查询relations，不加载Model聚合
+"""
+from typing import Optional, List, Dict, Tuple
+from infrastructure.persistence.db_connection import get_db_connection
+
+# 节点数超过该值时按Domain聚合为簇（未按Domain过滤时）
+DEFAULT_MAX_NODES = 2000
+
+
+class ModelGraphRepository:
+    """
+    Model关系图读模型
+
+    - 边只带id、两端、type和enabled（Relation名称等明细按ID另行获取）
+    - 按domainId过滤时只返回该Domain的Model，以及两端都在该Domain内的Relation
+    - 节点数超过max_nodes（或cluster=True）时按Domain聚合：每个Domain一个簇节点
+      （Model数、Property数、簇内Relation数），边为Domain之间的Relation数，由SQL分组统计
+    """
+
+    def graph(self, domain_id: Optional[int] = None, with_counts: bool = False,
+              max_nodes: int = DEFAULT_MAX_NODES, cluster: bool = False) -> Dict:
+        conn = get_db_connection()
+        try:
+            nodes = self._nodes(conn, domain_id, with_counts)
+            collapsed = domain_id is None and (cluster or len(nodes) > max_nodes)
+            if collapsed:
+                clusters = self._clusters(nodes, with_counts)
+                edges = self._cluster_edges(conn, clusters)
+                return {
+                    "collapsed": True,
+                    "modelCount": len(nodes),
+                    "nodes": list(clusters.values()),
+                    "edges": edges
+                }
+            return {
+                "collapsed": False,
+                "modelCount": len(nodes),
+                "nodes": nodes,
+                "edges": self._edges(conn, domain_id)
+            }
+        finally:
+            conn.close()
+
+    def _nodes(self, conn, domain_id: Optional[int], with_counts: bool) -> List[Dict]:
+        columns = "m.id, m.name, m.code, m.domainId"
+        joins = ""
+        if with_counts:
+            columns += ", COALESCE(p.n, 0)"
+            joins = " LEFT JOIN (SELECT modelId, COUNT(*) AS n FROM properties GROUP BY modelId) p ON p.modelId = m.id"
+        query = f"SELECT {columns} FROM models m{joins}"
+        params: Tuple = ()
+        if domain_id is not None:
+            query += " WHERE m.domainId = ?"
+            params = (domain_id,)
+        rows = conn.execute(query + " ORDER BY m.id", params).fetchall()
+
+        nodes = []
+        for row in rows:
+            node = {"id": row[0], "name": row[1], "code": row[2], "domainId": row[3]}
+            if with_counts:
+                node["propertyCount"] = row[4]
+            nodes.append(node)
+        return nodes
+
+    def _edges(self, conn, domain_id: Optional[int]) -> List[Dict]:
+        query = "SELECT r.id, r.sourceModelId, r.targetModelId, r.type, r.enabled IS NOT FALSE FROM relations r"
+        params: Tuple = ()
+        if domain_id is not None:
+            query += (
+                " JOIN models s ON s.id = r.sourceModelId JOIN models t ON t.id = r.targetModelId"
+                " WHERE s.domainId = ? AND t.domainId = ?"
+            )
+            params = (domain_id, domain_id)
+        rows = conn.execute(query + " ORDER BY r.id", params).fetchall()
+        return [
+            {"id": row[0], "source": row[1], "target": row[2], "type": row[3], "enabled": row[4]}
+            for row in rows
+        ]
+
+    def _clusters(self, nodes: List[Dict], with_counts: bool) -> Dict[Optional[int], Dict]:
+        clusters: Dict[Optional[int], Dict] = {}
+        for node in nodes:
+            domain = node["domainId"]
+            cluster = clusters.get(domain)
+            if cluster is None:
+                cluster = clusters[domain] = {
+                    "id": self._cluster_id(domain),
+                    "domainId": domain,
+                    "modelCount": 0,
+                    "relationCount": 0
+                }
+                if with_counts:
+                    cluster["propertyCount"] = 0
+            cluster["modelCount"] += 1
+            if with_counts:
+                cluster["propertyCount"] += node["propertyCount"]
+        return clusters
+
+    def _cluster_edges(self, conn, clusters: Dict[Optional[int], Dict]) -> List[Dict]:
+        """按(源Domain, 目标Domain)统计Relation数；同一Domain内的计入簇节点的relationCount"""
+        rows = conn.execute(
+            """SELECT s.domainId, t.domainId, COUNT(*) FROM relations r
+            JOIN models s ON s.id = r.sourceModelId
+            JOIN models t ON t.id = r.targetModelId
+            GROUP BY s.domainId, t.domainId
+            ORDER BY s.domainId NULLS FIRST, t.domainId NULLS FIRST"""
+        ).fetchall()
+        edges = []
+        for source, target, count in rows:
+            if source == target:
+                clusters[source]["relationCount"] += count
+            else:
+                edges.append({
+                    "source": self._cluster_id(source),
+                    "target": self._cluster_id(target),
+                    "relationCount": count
+                })
+        return edges
+
+    def _cluster_id(self, domain_id: Optional[int]) -> str:
+        return f"domain:{domain_id if domain_id is not None else 'none'}"
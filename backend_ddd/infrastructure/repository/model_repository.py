@@ -2,16 +2,54 @@
 Model聚合仓储
 负责Model聚合的持久化，包括Properties和Relations
 """
-from typing import Optional, List
-from infrastructure.repository.base_repository import IRepository
+from typing import Optional, List, Dict, Iterator, Set, Iterable, Tuple, Union
+from collections import defaultdict
+from infrastructure.repository.base_repository import (
+    IRepository, chunked, select_page, iter_rows, load_children, delete_by_ids, diff_children, mark_persisted,
+    bulk_insert, check_unreferenced
+)
 from infrastructure.persistence.db_connection import get_db_connection, get_current_date
+from infrastructure.persistence.id_allocator import next_id as allocate_id, allocate_ids
+from infrastructure.cache.relation_graph import get_relation_graph
+from infrastructure.search.search_index import get_search_index
 from meta.model import Model, Property
 from meta.shared import Relation
 import json
 
+# 批量导入时写入的列及类型（与init_database.py中的表定义一致）
+IMPORT_MODEL_COLUMNS = {
+    "id": "INTEGER", "name": "VARCHAR", "code": "VARCHAR", "description": "VARCHAR",
+    "creator": "VARCHAR", "updatedAt": "DATE", "domainId": "INTEGER"
+}
+IMPORT_PROPERTY_COLUMNS = {
+    "id": "INTEGER", "modelId": "INTEGER", "name": "VARCHAR", "code": "VARCHAR", "type": "VARCHAR",
+    "required": "BOOLEAN", "description": "VARCHAR", "isPrimaryKey": "BOOLEAN", "isForeignKey": "BOOLEAN",
+    "defaultValue": "VARCHAR", "constraints": "VARCHAR", "sensitivityLevel": "VARCHAR", "maskRule": "VARCHAR",
+    "physicalColumn": "VARCHAR", "foreignKeyTable": "VARCHAR", "foreignKeyColumn": "VARCHAR"
+}
+IMPORT_RELATION_COLUMNS = {
+    "id": "INTEGER", "sourceModelId": "INTEGER", "targetModelId": "INTEGER", "name": "VARCHAR",
+    "type": "VARCHAR", "description": "VARCHAR", "enabled": "BOOLEAN"
+}
+
+# 引用Model或其Property、会阻止删除的表 -> 条件
+MODEL_REFERENCES = {
+    "datasources": "modelId = ?",
+    "etl_tasks": "targetModelId = ?",
+    "mappings": "modelId = ? OR propertyId IN (SELECT id FROM properties WHERE modelId = ?)",
+    "model_table_associations": "modelId = ?"
+}
+
+# 批量导入的Relation：(Relation, 源, 目标)，源和目标为同批新建的Model或已有Model的ID
+ImportedRelation = Tuple[Relation, Union[Model, int], Union[Model, int]]
+
 
 class ModelRepository(IRepository[Model]):
-    """Model聚合仓储"""
+    """
+    Model聚合仓储
+
+    save/delete提交后同步更新进程内的Relation图索引和搜索索引
+    """
     
     def find_by_id(self, id: int) -> Optional[Model]:
         """根据ID查找Model聚合（包含Properties和Relations）"""
@@ -35,46 +73,41 @@ class ModelRepository(IRepository[Model]):
             for relation in relations:
                 model._relations.append(relation)
             
+            self._mark_persisted(model)
             return model
         finally:
             conn.close()
     
-    def find_all(self, filters: Optional[dict] = None) -> List[Model]:
-        """查找所有Model聚合"""
+    def find_all(
+        self,
+        filters: Optional[dict] = None,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> List[Model]:
+        """查找Model聚合（按id升序，limit/after_id用于键集分页）"""
         conn = get_db_connection()
         try:
-            query = "SELECT * FROM models"
-            params = []
-            
-            if filters:
-                conditions = []
-                for key, value in filters.items():
-                    conditions.append(f"{key} = ?")
-                    params.append(value)
-                if conditions:
-                    query += " WHERE " + " AND ".join(conditions)
-            
-            rows = conn.execute(query, tuple(params)).fetchall()
-            models = []
-            
-            for row in rows:
-                model = self._model_from_row(row)
-                model_id = row[0]
-                
-                properties = self._load_properties(conn, model_id)
-                for prop in properties:
-                    model._properties.append(prop)
-                
-                relations = self._load_relations(conn, model_id)
-                for relation in relations:
-                    model._relations.append(relation)
-                
-                models.append(model)
-            
+            query, params = select_page("models", filters, limit, after_id)
+            rows = conn.execute(query, params).fetchall()
+            models = [self._model_from_row(row) for row in rows]
+            self._hydrate(conn, models)
             return models
         finally:
             conn.close()
     
+    def iter_all(self, filters: Optional[dict] = None) -> Iterator[Model]:
+        """流式读取Model聚合根（按id升序，不加载Properties和Relations）"""
+        query, params = select_page("models", filters)
+        for row in iter_rows(query, params):
+            yield self._model_from_row(row)
+    
+    def iter_properties(self, model_id: Optional[int] = None) -> Iterator[Property]:
+        """流式读取Property（可按Model过滤，按id升序）"""
+        filters = {"modelId": model_id} if model_id is not None else None
+        query, params = select_page("properties", filters)
+        for row in iter_rows(query, params):
+            yield self._property_from_row(row)
+    
     def save(self, aggregate: Model) -> Model:
         """保存Model聚合（包括Properties和Relations）"""
         conn = get_db_connection()
@@ -83,37 +116,190 @@ class ModelRepository(IRepository[Model]):
             if not is_valid:
                 raise ValueError(error)
             
-            if aggregate.id and self._exists(conn, aggregate.id):
-                self._update_model(conn, aggregate)
-            else:
-                aggregate = self._create_model(conn, aggregate)
-            
-            self._save_properties(conn, aggregate)
-            self._save_relations(conn, aggregate)
+            with conn.transaction():
+                if aggregate.id and self._exists(conn, aggregate.id):
+                    self._update_model(conn, aggregate)
+                else:
+                    aggregate = self._create_model(conn, aggregate)
+                
+                self._save_properties(conn, aggregate)
+                self._save_relations(conn, aggregate)
             
-            conn.commit()
+            self._mark_persisted(aggregate)
+            self._index_relations(conn, aggregate)
+            self._index_search(conn, aggregate)
             return aggregate
         finally:
             conn.close()
     
     def delete(self, id: int) -> bool:
-        """删除Model聚合（包括Properties和Relations）"""
+        """
+        删除Model聚合（包括Properties和Relations）
+
+        仍被Datasource、ETLTask或映射引用时抛出ValueError，不删除任何数据
+        """
+        conn = get_db_connection()
+        try:
+            with conn.transaction():
+                check_unreferenced(conn, "Model", id, MODEL_REFERENCES)
+                conn.execute("DELETE FROM relations WHERE sourceModelId = ? OR targetModelId = ?", (id, id))
+                conn.execute("DELETE FROM properties WHERE modelId = ?", (id,))
+            # DuckDB不允许在删除子表行的同一事务中删除被它们引用的父表行，Model行在事务提交后单独删除
+            deleted = conn.execute("DELETE FROM models WHERE id = ?", (id,)).fetchone()[0]
+            get_relation_graph().remove_model(id)
+            get_search_index().remove_model(id)
+            return deleted > 0
+        finally:
+            conn.close()
+    
+    def find_relation(self, relation_id: int) -> Optional[Relation]:
+        """根据ID查找Relation（不加载两端的Model聚合）"""
+        conn = get_db_connection()
+        try:
+            row = conn.execute("SELECT * FROM relations WHERE id = ?", (relation_id,)).fetchone()
+            return self._relation_from_row(row) if row else None
+        finally:
+            conn.close()
+    
+    def delete_relation(self, relation_id: int) -> Optional[Relation]:
+        """
+        删除单个Relation，返回被删除的Relation，不存在时返回None
+        
+        只删除relations中的一行并更新源Model的updatedAt，不读写两端Model的其余部分
+        """
+        conn = get_db_connection()
+        try:
+            with conn.transaction():
+                row = conn.execute("SELECT * FROM relations WHERE id = ?", (relation_id,)).fetchone()
+                if row:
+                    relation = self._relation_from_row(row)
+                    conn.execute("DELETE FROM relations WHERE id = ?", (relation_id,))
+                    conn.execute(
+                        "UPDATE models SET updatedAt = ? WHERE id = ?",
+                        (get_current_date(), relation.sourceModelId)
+                    )
+            if not row:
+                return None
+            get_relation_graph().remove_relation(relation_id)
+            return relation
+        finally:
+            conn.close()
+    
+    def find_ids_by_code(self, codes: Iterable[str]) -> Dict[str, int]:
+        """按code查找已有Model的ID（同一code有多个Model时取最小的ID）"""
+        codes = list(codes)
+        conn = get_db_connection()
+        try:
+            found: Dict[str, int] = {}
+            for chunk in chunked(codes):
+                placeholders = ", ".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT code, MIN(id) FROM models WHERE code IN ({placeholders}) GROUP BY code",
+                    tuple(chunk)
+                ).fetchall()
+                found.update(rows)
+            return found
+        finally:
+            conn.close()
+    
+    def find_existing_ids(self, ids: Iterable[int]) -> Set[int]:
+        """返回ids中在库中存在的Model ID"""
+        ids = list(ids)
+        conn = get_db_connection()
+        try:
+            existing: Set[int] = set()
+            for chunk in chunked(ids):
+                placeholders = ", ".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT id FROM models WHERE id IN ({placeholders})", tuple(chunk)).fetchall()
+                existing.update(row[0] for row in rows)
+            return existing
+        finally:
+            conn.close()
+    
+    def import_models(self, models: List[Model], relations: List[ImportedRelation]) -> None:
+        """
+        批量新建Model聚合（包括Properties）及Relations，models和relations需已通过校验
+        
+        每张表按块分配ID后用一条集合插入写入，全部在一个事务中；
+        提交后把新Model和新边加入Relation图索引和搜索索引，不重建索引
+        """
         conn = get_db_connection()
         try:
-            conn.execute("DELETE FROM relations WHERE sourceModelId = ? OR targetModelId = ?", (id, id))
-            conn.execute("DELETE FROM properties WHERE modelId = ?", (id,))
-            result = conn.execute("DELETE FROM models WHERE id = ?", (id,))
-            conn.commit()
-            return result.rowcount > 0
+            with conn.transaction():
+                properties = []
+                for model, model_id in zip(models, allocate_ids(conn, "models", len(models))):
+                    model.id = model_id
+                    for prop in model._properties:
+                        prop.modelId = model_id
+                        properties.append(prop)
+                for prop, prop_id in zip(properties, allocate_ids(conn, "properties", len(properties))):
+                    prop.id = prop_id
+                for (relation, source, target), relation_id in zip(
+                        relations, allocate_ids(conn, "relations", len(relations))):
+                    relation.id = relation_id
+                    relation.sourceModelId = source if isinstance(source, int) else source.id
+                    relation.targetModelId = target if isinstance(target, int) else target.id
+                
+                today = get_current_date()
+                bulk_insert(conn, "models", IMPORT_MODEL_COLUMNS, (
+                    (m.id, m.name, m.code, m.description, m.creator or "当前用户", m.updatedAt or today, m.domainId)
+                    for m in models
+                ))
+                bulk_insert(conn, "properties", IMPORT_PROPERTY_COLUMNS, (
+                    (p.id, p.modelId) + self._property_values(p) for p in properties
+                ))
+                bulk_insert(conn, "relations", IMPORT_RELATION_COLUMNS, (
+                    (r.id, r.sourceModelId, r.targetModelId) + self._relation_values(r)
+                    for r, _, _ in relations
+                ))
+            
+            for model in models:
+                self._mark_persisted(model)
+            get_relation_graph().add_models(
+                [(m.id, m.domainId) for m in models],
+                [(r.id, r.sourceModelId, r.targetModelId) for r, _, _ in relations]
+            )
+            get_search_index().index_models(
+                (m.id, m.name, m.code, m.description, m.domainId,
+                 [(p.id, p.name, p.code, p.description) for p in m._properties])
+                for m in models
+            )
         finally:
             conn.close()
     
+    def find_related_model_ids(self, id: int) -> Set[int]:
+        """查找通过Relation与指定Model相连的所有Model ID（不含自身）"""
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                "SELECT sourceModelId, targetModelId FROM relations WHERE sourceModelId = ? OR targetModelId = ?",
+                (id, id)
+            ).fetchall()
+            return {model_id for row in rows for model_id in row if model_id != id}
+        finally:
+            conn.close()
+    
+    def _index_relations(self, conn, model: Model) -> None:
+        """用库中与Model相连的Relation刷新图索引（只读该Model的边，不重建整张图）"""
+        rows = conn.execute(
+            "SELECT id, sourceModelId, targetModelId FROM relations WHERE sourceModelId = ? OR targetModelId = ?",
+            (model.id, model.id)
+        ).fetchall()
+        get_relation_graph().refresh_model(model.id, model.domainId, rows)
+    
+    def _index_search(self, conn, model: Model) -> None:
+        """按库中的Properties重新索引Model（Property可能只加载了新增部分）"""
+        rows = conn.execute(
+            "SELECT id, name, code, description FROM properties WHERE modelId = ?", (model.id,)
+        ).fetchall()
+        get_search_index().index_model(model.id, model.name, model.code, model.description, model.domainId, rows)
+    
     def _exists(self, conn, id: int) -> bool:
         result = conn.execute("SELECT COUNT(*) FROM models WHERE id = ?", (id,)).fetchone()
         return result[0] > 0
     
     def _create_model(self, conn, model: Model) -> Model:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM models").fetchone()[0]
+        next_id = allocate_id(conn, "models")
         model.id = next_id
         
         conn.execute(
@@ -143,86 +329,73 @@ class ModelRepository(IRepository[Model]):
         )
     
     def _save_properties(self, conn, model: Model) -> None:
-        existing_props = {p.id: p for p in self._load_properties(conn, model.id)}
-        current_prop_ids = {p.id for p in model.properties}
+        """只写入变更的Properties：删除、批量插入、批量更新"""
+        changes = diff_children(model, "properties", model.properties, self._property_values)
         
-        for prop_id in existing_props:
-            if prop_id not in current_prop_ids:
-                conn.execute("DELETE FROM properties WHERE id = ?", (prop_id,))
+        if changes.removed_ids:
+            delete_by_ids(conn, "properties", changes.removed_ids)
         
-        for prop in model.properties:
-            if prop.id and prop.id in existing_props:
-                self._update_property(conn, prop)
-            else:
-                self._create_property(conn, prop)
-    
-    def _create_property(self, conn, prop: Property) -> None:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM properties").fetchone()[0]
-        prop.id = next_id
-        
-        constraints_json = json.dumps(prop.constraints) if prop.constraints else None
+        if changes.added:
+            ids = allocate_ids(conn, "properties", len(changes.added))
+            for prop, prop_id in zip(changes.added, ids):
+                prop.id = prop_id
+            conn.executemany(
+                """INSERT INTO properties 
+                (id, modelId, name, code, type, required, description, isPrimaryKey, isForeignKey, 
+                 defaultValue, constraints, sensitivityLevel, maskRule, physicalColumn, 
+                 foreignKeyTable, foreignKeyColumn) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(p.id, p.modelId) + self._property_values(p) for p in changes.added]
+            )
         
-        conn.execute(
-            """INSERT INTO properties 
-            (id, name, code, type, required, description, modelId, isPrimaryKey, isForeignKey, 
-             defaultValue, constraints, sensitivityLevel, maskRule, physicalColumn, 
-             foreignKeyTable, foreignKeyColumn) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                prop.id, prop.name, prop.code, prop.type, prop.required, prop.description,
-                prop.modelId, prop.isPrimaryKey, prop.isForeignKey, prop.defaultValue,
-                constraints_json, prop.sensitivityLevel, prop.maskRule, prop.physicalColumn,
-                prop.foreignKeyTable, prop.foreignKeyColumn
+        if changes.modified:
+            conn.executemany(
+                """UPDATE properties SET name = ?, code = ?, type = ?, required = ?, description = ?,
+                isPrimaryKey = ?, isForeignKey = ?, defaultValue = ?, constraints = ?,
+                sensitivityLevel = ?, maskRule = ?, physicalColumn = ?, foreignKeyTable = ?,
+                foreignKeyColumn = ? WHERE id = ?""",
+                [self._property_values(p) + (p.id,) for p in changes.modified]
             )
-        )
     
-    def _update_property(self, conn, prop: Property) -> None:
+    def _property_values(self, prop: Property) -> tuple:
+        """Property中可更新的字段（顺序与UPDATE语句一致）"""
         constraints_json = json.dumps(prop.constraints) if prop.constraints else None
-        
-        conn.execute(
-            """UPDATE properties SET name = ?, code = ?, type = ?, required = ?, description = ?,
-            isPrimaryKey = ?, isForeignKey = ?, defaultValue = ?, constraints = ?,
-            sensitivityLevel = ?, maskRule = ?, physicalColumn = ?, foreignKeyTable = ?,
-            foreignKeyColumn = ? WHERE id = ?""",
-            (
-                prop.name, prop.code, prop.type, prop.required, prop.description,
-                prop.isPrimaryKey, prop.isForeignKey, prop.defaultValue, constraints_json,
-                prop.sensitivityLevel, prop.maskRule, prop.physicalColumn,
-                prop.foreignKeyTable, prop.foreignKeyColumn, prop.id
-            )
+        return (
+            prop.name, prop.code, prop.type, prop.required, prop.description,
+            prop.isPrimaryKey, prop.isForeignKey, prop.defaultValue, constraints_json,
+            prop.sensitivityLevel, prop.maskRule, prop.physicalColumn,
+            prop.foreignKeyTable, prop.foreignKeyColumn
         )
     
     def _save_relations(self, conn, model: Model) -> None:
-        existing_relations = {r.id: r for r in self._load_relations(conn, model.id)}
-        current_relation_ids = {r.id for r in model.relations}
+        """只写入变更的Relations：删除、批量插入、批量更新"""
+        changes = diff_children(model, "relations", model.relations, self._relation_values)
         
-        for rel_id in existing_relations:
-            if rel_id not in current_relation_ids:
-                conn.execute("DELETE FROM relations WHERE id = ?", (rel_id,))
+        if changes.removed_ids:
+            delete_by_ids(conn, "relations", changes.removed_ids)
         
-        for relation in model.relations:
-            if relation.id and relation.id in existing_relations:
-                self._update_relation(conn, relation)
-            else:
-                self._create_relation(conn, relation)
-    
-    def _create_relation(self, conn, relation: Relation) -> None:
-        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM relations").fetchone()[0]
-        relation.id = next_id
+        if changes.added:
+            ids = allocate_ids(conn, "relations", len(changes.added))
+            for relation, relation_id in zip(changes.added, ids):
+                relation.id = relation_id
+            conn.executemany(
+                "INSERT INTO relations (id, sourceModelId, targetModelId, name, type, description, enabled) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(r.id, r.sourceModelId, r.targetModelId) + self._relation_values(r) for r in changes.added]
+            )
         
-        conn.execute(
-            "INSERT INTO relations (id, name, sourceModelId, targetModelId, type, description, enabled) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (
-                relation.id, relation.name, relation.sourceModelId, relation.targetModelId,
-                relation.type, relation.description, relation.enabled
+        if changes.modified:
+            conn.executemany(
+                "UPDATE relations SET name = ?, type = ?, description = ?, enabled = ? WHERE id = ?",
+                [self._relation_values(r) + (r.id,) for r in changes.modified]
             )
-        )
     
-    def _update_relation(self, conn, relation: Relation) -> None:
-        conn.execute(
-            "UPDATE relations SET name = ?, type = ?, description = ?, enabled = ? WHERE id = ?",
-            (relation.name, relation.type, relation.description, relation.enabled, relation.id)
-        )
+    def _relation_values(self, relation: Relation) -> tuple:
+        """Relation中可更新的字段（顺序与UPDATE语句一致）"""
+        return (relation.name, relation.type, relation.description, relation.enabled)
+    
+    def _mark_persisted(self, model: Model) -> None:
+        mark_persisted(model, "properties", model._properties, self._property_values)
+        mark_persisted(model, "relations", model._relations, self._relation_values)
     
     def _load_properties(self, conn, model_id: int) -> List[Property]:
         rows = conn.execute("SELECT * FROM properties WHERE modelId = ?", (model_id,)).fetchall()
@@ -243,6 +416,44 @@ class ModelRepository(IRepository[Model]):
             relations.append(relation)
         return relations
     
+    def _hydrate(self, conn, models: List[Model]) -> None:
+        """批量加载一组Model的Properties和Relations（每张子表一次查询）"""
+        if not models:
+            return
+        
+        model_ids = [m.id for m in models]
+        properties = load_children(conn, "properties", "modelId", model_ids, self._property_from_row)
+        relations = self._load_relations_batch(conn, model_ids)
+        
+        for model in models:
+            model._properties.extend(properties.get(model.id, []))
+            model._relations.extend(relations.get(model.id, []))
+            self._mark_persisted(model)
+    
+    def _load_relations_batch(self, conn, model_ids: List[int]) -> Dict[int, List[Relation]]:
+        """关系同时挂到源Model和目标Model上（与_load_relations语义一致）"""
+        grouped: Dict[int, List[Relation]] = defaultdict(list)
+        wanted = set(model_ids)
+        seen = set()
+        for chunk in chunked(model_ids):
+            placeholders = ", ".join("?" * len(chunk))
+            rows = conn.execute(
+                f"""SELECT * FROM relations
+                WHERE sourceModelId IN ({placeholders}) OR targetModelId IN ({placeholders})
+                ORDER BY id""",
+                tuple(chunk) + tuple(chunk)
+            ).fetchall()
+            for row in rows:
+                if row[0] in seen:
+                    continue
+                seen.add(row[0])
+                source_id, target_id = row[2], row[3]
+                if source_id in wanted:
+                    grouped[source_id].append(self._relation_from_row(row))
+                if target_id in wanted and target_id != source_id:
+                    grouped[target_id].append(self._relation_from_row(row))
+        return grouped
+    
     def _model_from_row(self, row: tuple) -> Model:
         return Model(
             id=row[0],
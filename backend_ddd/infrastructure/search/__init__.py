@@ -0,0 +1,8 @@
+"""
+搜索层
+Model、Property、Datasource的进程内全文索引
+"""
+from .tokenizer import tokenize
+from .search_index import SearchIndex, get_search_index
+
+__all__ = ['tokenize', 'SearchIndex', 'get_search_index']
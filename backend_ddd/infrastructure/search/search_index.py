@@ -0,0 +1,384 @@
+"""
+搜索索引
+Model、Property、Datasource的进程内倒排索引，支持前缀和中文bigram匹配，按相关度排序
+"""
+from bisect import bisect_left, insort
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import math
+import threading
+from infrastructure.persistence.db_connection import get_db_connection
+from infrastructure.search.tokenizer import tokenize, compact, query_terms, is_cjk
+
+# 可搜索的文档类型
+DOC_TYPES = ("model", "property", "datasource")
+# 各字段的权重：名称和编码高于描述
+NAME_WEIGHT = 3.0
+CODE_WEIGHT = 3.0
+TABLE_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+# 前缀匹配（而非完整词）的得分系数
+PREFIX_FACTOR = 0.5
+# 名称或编码与查询完全相同时的加分
+EXACT_BONUS = 10.0
+# 英文查询词至少这么长才做前缀扩展
+MIN_PREFIX = 2
+# 一个查询词最多扩展的前缀词数
+MAX_PREFIX_TERMS = 64
+# 前缀扩展出的词合计最多取这么多条倒排记录（按词长从短到长取，至少取一个词；完整词本身不受限）
+MAX_PREFIX_POSTINGS = 20000
+
+DocKey = Tuple[str, int]  # (文档类型, ID)
+Postings = List[Tuple[Dict[DocKey, float], float]]  # 一个查询词命中的倒排表及其得分系数
+
+
+class Document:
+    """索引中的一条记录：命中时返回的字段和它贡献的索引词（删除时据此撤销）"""
+
+    __slots__ = ("type", "id", "name", "code", "domain_id", "model_id", "terms", "exact")
+
+    def __init__(self, type: str, id: int, name: Optional[str], code: Optional[str],
+                 domain_id: Optional[int], model_id: Optional[int], fields: List[Tuple[Optional[str], float]],
+                 code_weight: float = CODE_WEIGHT):
+        self.type = type
+        self.id = id
+        self.name = name
+        self.code = code
+        self.domain_id = domain_id
+        self.model_id = model_id
+        terms: Dict[str, float] = {}
+        for text, weight in fields:
+            for term in tokenize(text):
+                terms[term] = terms.get(term, 0.0) + weight
+        code_terms = tokenize(code)
+        for term in code_terms:
+            terms[term] = terms.get(term, 0.0) + code_weight
+        # 编码再整串索引一次（user_name -> username）
+        code_term = "".join(t for t in code_terms if not is_cjk(t))
+        if code_term not in terms and code_term:
+            terms[code_term] = code_weight
+        self.terms = terms
+        # 名称或编码与查询完全相同时加分
+        self.exact = {v for v in ((name or "").strip().lower(), code_term) if v}
+
+    def to_dict(self, score: float) -> Dict:
+        hit = {"type": self.type, "id": self.id, "name": self.name, "domainId": self.domain_id}
+        if self.type == "datasource":
+            hit["tableName"] = self.code
+        else:
+            hit["code"] = self.code
+        if self.type == "property":
+            hit["modelId"] = self.model_id
+        hit["score"] = round(score, 4)
+        return hit
+
+
+def _datasource_document(datasource_id: int, name: str, table_name: Optional[str],
+                         domain_id: Optional[int]) -> Document:
+    return Document("datasource", datasource_id, name, table_name, domain_id, None,
+                    [(name, NAME_WEIGHT)], TABLE_WEIGHT)
+
+
+class SearchIndex:
+    """
+    搜索索引
+
+    - 索引Model的name/code/description、Property的name/code/description、Datasource的name/tableName
+    - 由warm()在后台线程中用三次查询整体构建（构建完成前的查询等待构建），之后由仓储在
+      save/delete提交后按聚合增量更新；构建期间的写入先记下，构建完成后按顺序重放
+    - 得分为各查询词命中字段权重 × idf之和，最后一个查询词按前缀匹配（边输入边搜索），
+      名称或编码与查询完全相同时加分；多个查询词之间为AND，从命中最少的词开始求交集，
+      前缀扩展的倒排记录数有上限
+    """
+
+    def __init__(self):
+        self._docs: Dict[DocKey, Document] = {}
+        self._postings: Dict[str, Dict[DocKey, float]] = {}
+        self._sorted_terms: List[str] = []
+        self._properties: Dict[int, Set[int]] = {}  # model id -> property ids
+        self._exact: Dict[str, Set[DocKey]] = {}  # 小写名称或整串编码 -> 文档
+        self._loaded = False
+        self._pending: Optional[List[Callable[[], None]]] = None  # 构建期间的写入
+        self._warming = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.builds = 0
+        self.updates = 0
+
+    # ---- 维护 ----
+
+    def index_model(self, model_id: int, name: str, code: str, description: Optional[str],
+                    domain_id: Optional[int], properties: Iterable[tuple]) -> None:
+        """索引Model及其全部Property（properties为(id, name, code, description)），替换原有记录"""
+        properties = list(properties)
+        with self._lock:
+            self._apply(lambda: self._put_model(model_id, name, code, description, domain_id, properties))
+
+    def index_models(self, models: Iterable[tuple]) -> None:
+        """批量索引Model，每项为index_model的参数元组（批量导入后调用，只加锁一次）"""
+        models = [(model_id, name, code, description, domain_id, list(properties))
+                  for model_id, name, code, description, domain_id, properties in models]
+
+        def put_all():
+            for args in models:
+                self._put_model(*args)
+
+        with self._lock:
+            self._apply(put_all)
+
+    def remove_model(self, model_id: int) -> None:
+        """删除Model及其Property的记录"""
+        def remove():
+            self._remove(("model", model_id))
+            for property_id in self._properties.pop(model_id, ()):
+                self._remove(("property", property_id))
+
+        with self._lock:
+            self._apply(remove)
+
+    def index_datasource(self, datasource_id: int, name: str, table_name: Optional[str],
+                         domain_id: Optional[int]) -> None:
+        doc = _datasource_document(datasource_id, name, table_name, domain_id)
+        with self._lock:
+            self._apply(lambda: self._put(doc))
+
+    def remove_datasource(self, datasource_id: int) -> None:
+        with self._lock:
+            self._apply(lambda: self._remove(("datasource", datasource_id)))
+
+    def warm(self) -> None:
+        """在后台线程中构建索引（已构建或正在构建时直接返回），避免由第一个查询承担构建时间"""
+        if self._loaded or self._warming:
+            return
+        with self._lock:
+            if self._loaded or self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self._warm, name='search-index-warm', daemon=True).start()
+
+    # ---- 查询 ----
+
+    def search(self, text: str, types: Optional[Iterable[str]] = None, domain_id: Optional[int] = None,
+               limit: int = 20, offset: int = 0) -> Tuple[List[Dict], int]:
+        """按相关度返回第offset起的limit条命中和命中总数"""
+        types = set(types) if types else None
+        if types and not types <= set(DOC_TYPES):
+            raise ValueError(f"type must be in {list(DOC_TYPES)}")
+        terms = query_terms(text)
+        if not terms:
+            return [], 0
+        self._ensure()
+        with self._lock:
+            matches = []
+            for index, term in enumerate(terms):
+                prefix = index == len(terms) - 1 and (is_cjk(term) or len(term) >= MIN_PREFIX)
+                postings = self._match(term, prefix)
+                if not postings:
+                    return [], 0
+                matches.append(postings)
+            # 只对命中最少的词逐条打分，其余的词只在这些候选上查找
+            matches.sort(key=lambda postings: sum(len(p) for p, _ in postings))
+            scores = self._score(matches[0])
+            for postings in matches[1:]:
+                scores = self._intersect(scores, postings)
+                if not scores:
+                    return [], 0
+            if types or domain_id is not None:
+                scores = {
+                    key: score for key, score in scores.items()
+                    if (not types or key[0] in types)
+                    and (domain_id is None or self._docs[key].domain_id == domain_id)
+                }
+            for value in {text.strip().lower(), compact(text)}:
+                for key in self._exact.get(value, ()):
+                    if key in scores:
+                        scores[key] += EXACT_BONUS
+
+            top = heapq.nlargest(offset + limit, scores.items(), key=itemgetter(1))
+            return [self._docs[key].to_dict(score) for key, score in top[offset:]], len(scores)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = {t: 0 for t in DOC_TYPES}
+            for doc_type, _ in self._docs:
+                counts[doc_type] += 1
+            return {"loaded": self._loaded, "documents": counts, "terms": len(self._postings),
+                    "builds": self.builds, "updates": self.updates}
+
+    # ---- 内部 ----
+
+    def _match(self, term: str, prefix: bool) -> Postings:
+        """
+        一个查询词命中的倒排表及得分系数（idf，前缀扩展出的词再乘PREFIX_FACTOR）
+
+        前缀扩展按词长从短到长取，至少取一个词，合计超过MAX_PREFIX_POSTINGS条后不再扩展
+        """
+        total = len(self._docs)
+        matched: Postings = []
+        postings = self._postings.get(term)
+        if postings:
+            matched.append((postings, math.log(1 + total / len(postings))))
+        if not prefix:
+            return matched
+        start = bisect_left(self._sorted_terms, term)
+        expanded = []
+        for other in self._sorted_terms[start:start + MAX_PREFIX_TERMS + 1]:
+            if not other.startswith(term):
+                break
+            if other != term:
+                expanded.append(other)
+        budget = MAX_PREFIX_POSTINGS
+        for other in sorted(expanded, key=len):
+            postings = self._postings[other]
+            if len(postings) > budget and len(matched) > 0:
+                break
+            budget -= len(postings)
+            matched.append((postings, math.log(1 + total / len(postings)) * PREFIX_FACTOR))
+        return matched
+
+    def _score(self, matched: Postings) -> Dict[DocKey, float]:
+        """按一个查询词的倒排表打分（同一文档命中多个扩展词时取最高分）"""
+        (postings, factor), rest = matched[0], matched[1:]
+        scores = {key: weight * factor for key, weight in postings.items()}
+        for postings, factor in rest:
+            for key, weight in postings.items():
+                score = weight * factor
+                if score > scores.get(key, 0.0):
+                    scores[key] = score
+        return scores
+
+    def _intersect(self, scores: Dict[DocKey, float], matched: Postings) -> Dict[DocKey, float]:
+        """保留同时命中另一个查询词的候选，加上该词的得分"""
+        if len(matched) == 1:
+            postings, factor = matched[0]
+            return {key: score + postings[key] * factor for key, score in scores.items() if key in postings}
+        best: Dict[DocKey, float] = {}
+        for postings, factor in matched:
+            # 每个倒排表按较小的一方遍历
+            if len(postings) < len(scores):
+                pairs = ((key, weight) for key, weight in postings.items() if key in scores)
+            else:
+                pairs = ((key, postings[key]) for key in scores if key in postings)
+            for key, weight in pairs:
+                score = weight * factor
+                if score > best.get(key, 0.0):
+                    best[key] = score
+        return {key: scores[key] + score for key, score in best.items()}
+
+    def _put_model(self, model_id, name, code, description, domain_id, properties) -> None:
+        self._put(Document("model", model_id, name, code, domain_id, None,
+                           [(name, NAME_WEIGHT), (description, DESCRIPTION_WEIGHT)]))
+        current = set()
+        for property_id, prop_name, prop_code, prop_description in properties:
+            current.add(property_id)
+            self._put(Document("property", property_id, prop_name, prop_code, domain_id, model_id,
+                               [(prop_name, NAME_WEIGHT), (prop_description, DESCRIPTION_WEIGHT)]))
+        for property_id in self._properties.get(model_id, set()) - current:
+            self._remove(("property", property_id))
+        self._properties[model_id] = current
+
+    def _put(self, doc: Document) -> None:
+        key = (doc.type, doc.id)
+        self._remove(key)
+        self._docs[key] = doc
+        for value in doc.exact:
+            self._exact.setdefault(value, set()).add(key)
+        for term, weight in doc.terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if self._loaded:
+                    insort(self._sorted_terms, term)
+            postings[key] = weight
+
+    def _remove(self, key: DocKey) -> None:
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for value in doc.exact:
+            keys = self._exact.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._exact[value]
+        for term in doc.terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                index = bisect_left(self._sorted_terms, term)
+                if index < len(self._sorted_terms) and self._sorted_terms[index] == term:
+                    del self._sorted_terms[index]
+
+    def _apply(self, op: Callable[[], None]) -> None:
+        """执行一次写入：已构建时立即应用，构建期间记下等构建完成后重放，未构建时忽略（调用方已持有self._lock）"""
+        if self._loaded:
+            op()
+            self.updates += 1
+        elif self._pending is not None:
+            self._pending.append(op)
+
+    def _reset(self) -> None:
+        self._docs, self._postings, self._sorted_terms, self._properties, self._exact = {}, {}, [], {}, {}
+
+    def _ensure(self) -> None:
+        if self._loaded:
+            return
+        with self._build_lock:
+            if self._loaded:
+                return
+            with self._lock:
+                self._pending = []
+            try:
+                models, properties, datasources = self._read()
+            except BaseException:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self._reset()
+                grouped: Dict[int, List[tuple]] = {}
+                for row in properties:
+                    grouped.setdefault(row[1], []).append((row[0],) + tuple(row[2:]))
+                for model_id, name, code, description, domain_id in models:
+                    self._put_model(model_id, name, code, description, domain_id, grouped.get(model_id, ()))
+                for datasource_id, name, table_name, domain_id in datasources:
+                    self._put(_datasource_document(datasource_id, name, table_name, domain_id))
+                self._sorted_terms = sorted(self._postings)
+                self._loaded = True
+                self.builds += 1
+                # 读取期间提交的写入可能不在读到的数据中，重放一遍（写入按聚合整体替换，重复应用无害）
+                for op in pending:
+                    op()
+                self.updates += len(pending)
+
+    def _warm(self) -> None:
+        try:
+            self._ensure()
+        except Exception:
+            pass  # 构建失败时由之后的查询重试
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def _read(self) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+        conn = get_db_connection()
+        try:
+            models = conn.execute("SELECT id, name, code, description, domainId FROM models").fetchall()
+            properties = conn.execute("SELECT id, modelId, name, code, description FROM properties").fetchall()
+            datasources = conn.execute("SELECT id, name, tableName, domainId FROM datasources").fetchall()
+            return models, properties, datasources
+        finally:
+            conn.close()
+
+
+_index = SearchIndex()
+
+
+def get_search_index() -> SearchIndex:
+    """获取进程级搜索索引"""
+    return _index
@@ -0,0 +1,45 @@
+"""
+搜索分词
+英文和数字按单词切分（拆开驼峰和下划线），中文按相邻两字切分（bigram）
+"""
+from typing import List
+import re
+
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_RUN = re.compile(r"[a-z0-9]+|[㐀-䶿一-鿿]+")
+
+
+def is_cjk(token: str) -> bool:
+    return "㐀" <= token[0] <= "鿿"
+
+
+def tokenize(text) -> List[str]:
+    """
+    把文本切成索引词
+
+    - userName、user_name、user-name都切成user、name
+    - 连续的中文按相邻两字切分（"用户名" -> 用户、户名），单个汉字保留为一个词
+    """
+    if not text:
+        return []
+    text = str(text)
+    lowered = text.lower()
+    if lowered != text:
+        lowered = _CAMEL.sub(" ", text).lower()
+    terms = []
+    for run in _RUN.findall(lowered):
+        if len(run) > 1 and is_cjk(run):
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
+
+
+def compact(text) -> str:
+    """去掉分隔符后的英文数字串（user_name -> username），用于整串匹配编码"""
+    return "".join(t for t in tokenize(text) if not is_cjk(t))
+
+
+def query_terms(text: str) -> List[str]:
+    """查询词（去重，保持顺序）"""
+    return list(dict.fromkeys(tokenize(text)))
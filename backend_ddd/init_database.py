@@ -4,6 +4,8 @@
 """
 import duckdb
 import os
+from infrastructure.persistence.id_allocator import ensure_sequences
+from infrastructure.etl.checkpoint import ensure_checkpoint_table
 
 # 获取当前脚本所在目录
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -169,6 +171,12 @@ def create_tables():
         )
         """)
         
+        # 创建ETL断点表
+        ensure_checkpoint_table(conn)
+        
+        # 创建ID序列（从各表当前最大ID之后开始）
+        ensure_sequences(conn)
+        
         conn.commit()
         print("数据库表创建成功！")
     except Exception as e:
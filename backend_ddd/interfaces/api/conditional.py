@@ -0,0 +1,40 @@
+"""
+条件请求
+根据资源版本号生成强ETag，If-None-Match匹配时直接返回304，不调用应用服务
+"""
+from functools import wraps
+import hashlib
+from flask import request, make_response
+from application.versioning import get_resource_versions
+
+
+def resource_etag(resource: str) -> str:
+    """当前请求的ETag：资源版本 + 请求路径、查询参数和Accept（流式与非流式是不同表示）"""
+    key = f"{request.full_path}|{request.headers.get('Accept', '')}"
+    path_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return f"{resource}-{get_resource_versions().tag(resource)}-{path_hash}"
+
+
+def conditional(resource: str):
+    """
+    为GET接口加上ETag/304支持
+
+    ETag在调用接口之前计算：处理期间发生写入时，客户端下次带着旧ETag请求会拿到新数据
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = resource_etag(resource)
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # 浏览器每次都要带If-None-Match重新验证
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
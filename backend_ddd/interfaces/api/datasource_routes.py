@@ -3,20 +3,31 @@ Datasource API路由
 """
 from flask import Blueprint, request, jsonify
 from application.datasource_service import DatasourceService
+from interfaces.api.streaming import wants_stream, stream_response
+from application.versioning import DATASOURCE
+from interfaces.api.conditional import conditional
 
 datasource_bp = Blueprint('datasource', __name__)
 service = DatasourceService()
 
 
 @datasource_bp.route('/', methods=['GET'])
+@conditional(DATASOURCE)
 def get_datasources():
-    """获取所有Datasource"""
+    """获取所有Datasource（传入limit时分页，返回items和nextCursor）"""
     domain_id = request.args.get('domainId', type=int)
+    if wants_stream():
+        return stream_response(service.iter_datasources(domain_id))
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        cursor = request.args.get('cursor', type=int)
+        return jsonify(service.get_page(domain_id, limit, cursor))
     result = service.get_all(domain_id)
     return jsonify(result)
 
 
 @datasource_bp.route('/<int:datasource_id>', methods=['GET'])
+@conditional(DATASOURCE)
 def get_datasource(datasource_id):
     """根据ID获取Datasource"""
     result = service.get_by_id(datasource_id)
@@ -84,7 +95,10 @@ def add_association(datasource_id):
 @datasource_bp.route('/<int:datasource_id>', methods=['DELETE'])
 def delete_datasource(datasource_id):
     """删除Datasource"""
-    success = service.delete_datasource(datasource_id)
+    try:
+        success = service.delete_datasource(datasource_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not success:
         return jsonify({"error": "Datasource not found"}), 404
     return jsonify({"message": "Datasource deleted"}), 200
@@ -3,12 +3,15 @@ Domain API路由
 """
 from flask import Blueprint, request, jsonify
 from application.domain_service import DomainService
+from application.versioning import DOMAIN
+from interfaces.api.conditional import conditional
 
 domain_bp = Blueprint('domain', __name__)
 service = DomainService()
 
 
 @domain_bp.route('/', methods=['GET'])
+@conditional(DOMAIN)
 def get_domains():
     """获取所有Domain"""
     result = service.get_all()
@@ -16,6 +19,7 @@ def get_domains():
 
 
 @domain_bp.route('/<int:domain_id>', methods=['GET'])
+@conditional(DOMAIN)
 def get_domain(domain_id):
     """根据ID获取Domain"""
     result = service.get_by_id(domain_id)
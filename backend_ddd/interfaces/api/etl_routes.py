@@ -3,27 +3,54 @@ ETL API路由
 """
 from flask import Blueprint, request, jsonify
 from application.etl_service import ETLService
+from application.etl_scheduler import get_etl_scheduler
+from interfaces.api.streaming import wants_stream, stream_response, sse_response
+from application.versioning import ETL
+from interfaces.api.conditional import conditional
 
 etl_bp = Blueprint('etl', __name__)
 service = ETLService()
 
 
 @etl_bp.route('/tasks', methods=['GET'])
+@conditional(ETL)
 def get_tasks():
-    """获取所有ETLTask"""
+    """获取所有ETLTask（传入limit时分页，返回items和nextCursor）"""
+    if wants_stream():
+        return stream_response(service.iter_tasks())
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        cursor = request.args.get('cursor', type=int)
+        return jsonify(service.get_page(limit, cursor))
     result = service.get_all()
     return jsonify(result)
 
 
 @etl_bp.route('/tasks/<int:task_id>', methods=['GET'])
+@conditional(ETL)
 def get_task(task_id):
-    """根据ID获取ETLTask"""
-    result = service.get_by_id(task_id)
+    """根据ID获取ETLTask（传入limit时Logs分页）"""
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', type=int)
+    result = service.get_by_id(task_id, limit, cursor)
     if not result:
         return jsonify({"error": "ETLTask not found"}), 404
     return jsonify(result)
 
 
+@etl_bp.route('/tasks/<int:task_id>/logs', methods=['GET'])
+@conditional(ETL)
+def get_logs(task_id):
+    """获取ETLTask的Logs（传入limit时分页，支持流式响应）"""
+    if not service.task_exists(task_id):
+        return jsonify({"error": "ETLTask not found"}), 404
+    if wants_stream():
+        return stream_response(service.iter_logs(task_id))
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', type=int)
+    return jsonify(service.get_logs(task_id, limit, cursor))
+
+
 @etl_bp.route('/tasks', methods=['POST'])
 def create_task():
     """创建ETLTask"""
@@ -55,11 +82,54 @@ def pause_task(task_id):
 
 @etl_bp.route('/tasks/<int:task_id>/start', methods=['POST'])
 def start_task(task_id):
-    """启动ETLTask执行"""
-    result = service.start_task(task_id)
-    if not result:
+    """启动ETLTask执行（?wait=1时等待执行结束再返回）"""
+    wait = request.args.get('wait', '').lower() in ('1', 'true')
+    try:
+        result = service.start_task(task_id, wait)
+        if not result:
+            return jsonify({"error": "ETLTask not found"}), 404
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@etl_bp.route('/tasks/<int:task_id>/resume', methods=['POST'])
+def resume_task(task_id):
+    """从断点继续中断的ETLTask执行（?wait=1时等待执行结束再返回）"""
+    wait = request.args.get('wait', '').lower() in ('1', 'true')
+    try:
+        result = service.resume_task(task_id, wait)
+        if not result:
+            return jsonify({"error": "ETLTask not found"}), 404
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@etl_bp.route('/tasks/<int:task_id>/progress', methods=['GET'])
+def stream_progress(task_id):
+    """以Server-Sent Events推送ETLTask的执行进度"""
+    if not service.task_exists(task_id):
         return jsonify({"error": "ETLTask not found"}), 404
-    return jsonify(result)
+    return sse_response(service.progress_events(task_id))
+
+
+@etl_bp.route('/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    """获取ETL调度器状态"""
+    return jsonify(get_etl_scheduler().stats())
+
+
+@etl_bp.route('/tasks/<int:task_id>/watermark/reset', methods=['POST'])
+def reset_watermark(task_id):
+    """清除增量水位"""
+    try:
+        result = service.reset_watermark(task_id)
+        if not result:
+            return jsonify({"error": "ETLTask not found"}), 404
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @etl_bp.route('/tasks/<int:task_id>/complete', methods=['POST'])
@@ -83,3 +153,19 @@ def add_log(task_id):
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
+
+
+@etl_bp.route('/tasks/<int:task_id>/logs/batch', methods=['POST'])
+def add_logs(task_id):
+    """批量添加ETLLog到ETLTask"""
+    data = request.json
+    items = data.get("logs", []) if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({"error": "Request body must be a list of logs"}), 400
+    try:
+        result = service.add_logs(task_id, items)
+        if result is None:
+            return jsonify({"error": "ETLTask not found"}), 404
+        return jsonify(result), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
@@ -2,21 +2,103 @@
 Model API路由
 """
 from flask import Blueprint, request, jsonify
+import json
+import os
+import tempfile
 from application.model_service import ModelService
+from interfaces.api.streaming import wants_stream, stream_response
+from application.versioning import MODEL
+from interfaces.api.conditional import conditional
 
 model_bp = Blueprint('model', __name__)
 service = ModelService()
 
 
 @model_bp.route('/', methods=['GET'])
+@conditional(MODEL)
 def get_models():
-    """获取所有Model"""
+    """获取所有Model（可选limit/cursor分页；流式响应时只输出Model，不含边信息）"""
     domain_id = request.args.get('domainId', type=int)
-    result = service.get_all(domain_id)
+    if wants_stream():
+        return stream_response(service.iter_models(domain_id))
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', type=int)
+    result = service.get_all(domain_id, limit, cursor)
     return jsonify(result)
 
 
+@model_bp.route('/graph', methods=['GET'])
+@conditional(MODEL)
+def get_model_graph():
+    """获取画布用的节点和边（可选domainId、counts、maxNodes、cluster）"""
+    domain_id = request.args.get('domainId', type=int)
+    with_counts = request.args.get('counts') in ('1', 'true')
+    max_nodes = request.args.get('maxNodes', type=int)
+    cluster = request.args.get('cluster') == 'domain'
+    try:
+        result = service.get_graph(domain_id, with_counts, max_nodes, cluster)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+@model_bp.route('/properties', methods=['GET'])
+@conditional(MODEL)
+def get_properties():
+    """导出Property（可按modelId过滤，流式输出）"""
+    model_id = request.args.get('modelId', type=int)
+    return stream_response(service.iter_properties(model_id))
+
+
+@model_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """获取Model缓存的命中统计"""
+    return jsonify(service.cache_stats())
+
+
+@model_bp.route('/<int:model_id>/neighbors', methods=['GET'])
+@conditional(MODEL)
+def get_model_neighbors(model_id):
+    """获取Model的k跳邻域（hops默认1，direction为out/in/both）"""
+    hops = request.args.get('hops', 1, type=int)
+    direction = request.args.get('direction', 'both')
+    try:
+        result = service.get_neighbors(model_id, hops, direction)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is None:
+        return jsonify({"error": "Model not found"}), 404
+    return jsonify(result)
+
+
+@model_bp.route('/path', methods=['GET'])
+@conditional(MODEL)
+def get_model_path():
+    """获取两个Model之间的最短Relation路径（source、target必填）"""
+    source_id = request.args.get('source', type=int)
+    target_id = request.args.get('target', type=int)
+    if source_id is None or target_id is None:
+        return jsonify({"error": "source and target are required"}), 400
+    direction = request.args.get('direction', 'both')
+    try:
+        result = service.get_path(source_id, target_id, direction)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is None:
+        return jsonify({"error": "Model not found"}), 404
+    return jsonify(result)
+
+
+@model_bp.route('/components', methods=['GET'])
+@conditional(MODEL)
+def get_model_components():
+    """获取各Domain内的连通分量（可按domainId过滤）"""
+    domain_id = request.args.get('domainId', type=int)
+    return jsonify(service.get_components(domain_id))
+
+
 @model_bp.route('/<int:model_id>', methods=['GET'])
+@conditional(MODEL)
 def get_model(model_id):
     """根据ID获取Model"""
     result = service.get_by_id(model_id)
@@ -25,6 +107,17 @@ def get_model(model_id):
     return jsonify(result)
 
 
+@model_bp.route('/<int:model_id>/data', methods=['GET'])
+def get_model_data(model_id):
+    """导出Model的数据记录（流式，敏感字段已脱敏；可选limit，table只能是该Model的数据表）"""
+    table = request.args.get('table')
+    limit = request.args.get('limit', type=int)
+    records = service.iter_data(model_id, table, limit)
+    if records is None:
+        return jsonify({"error": "Model data not found"}), 404
+    return stream_response(records)
+
+
 @model_bp.route('/', methods=['POST'])
 def create_model():
     """创建Model"""
@@ -36,6 +129,57 @@ def create_model():
         return jsonify({"error": str(e)}), 400
 
 
+@model_bp.route('/import', methods=['POST'])
+def import_models():
+    """
+    批量导入Model、Property和Relation（一个事务）
+
+    JSON请求体为 {"models": [...], "relations": [...]}；也可以multipart上传models文件
+    （及可选的relations文件），格式由format参数或文件扩展名决定（json/csv/parquet）
+    """
+    try:
+        if request.files:
+            result = _import_upload()
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({"error": "Request body must be a JSON object or a multipart upload"}), 400
+            result = service.import_models(data.get("models"), data.get("relations"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 201
+
+
+def _import_upload():
+    models_file = request.files.get('models')
+    if models_file is None:
+        raise ValueError("models file is required")
+    relations_file = request.files.get('relations')
+    format = (request.form.get('format') or os.path.splitext(models_file.filename or '')[1].lstrip('.')).lower()
+    if format == 'json':
+        try:
+            data = json.load(models_file.stream)
+        except ValueError:
+            raise ValueError("models file is not valid JSON")
+        if not isinstance(data, dict):
+            raise ValueError("models file must contain a JSON object")
+        return service.import_models(data.get("models"), data.get("relations"))
+
+    paths = []
+    try:
+        for upload in (models_file, relations_file):
+            if upload is None:
+                continue
+            fd, path = tempfile.mkstemp(suffix=f".{format}")
+            os.close(fd)
+            paths.append(path)
+            upload.save(path)
+        return service.import_files(paths[0], format, paths[1] if len(paths) > 1 else None)
+    finally:
+        for path in paths:
+            os.remove(path)
+
+
 @model_bp.route('/<int:model_id>', methods=['PUT'])
 def update_model(model_id):
     """更新Model"""
@@ -49,7 +193,10 @@ def update_model(model_id):
 @model_bp.route('/<int:model_id>', methods=['DELETE'])
 def delete_model(model_id):
     """删除Model"""
-    success = service.delete_model(model_id)
+    try:
+        success = service.delete_model(model_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not success:
         return jsonify({"error": "Model not found"}), 404
     return jsonify({"message": "Model deleted"}), 200
@@ -90,6 +237,16 @@ def add_relation():
         return jsonify({"error": str(e)}), 400
 
 
+@model_bp.route('/relations/<int:relation_id>', methods=['GET'])
+@conditional(MODEL)
+def get_relation(relation_id):
+    """根据ID获取Relation"""
+    result = service.get_relation(relation_id)
+    if not result:
+        return jsonify({"error": "Relation not found"}), 404
+    return jsonify(result)
+
+
 @model_bp.route('/relations/<int:relation_id>', methods=['DELETE'])
 def remove_relation(relation_id):
     """删除Relation"""
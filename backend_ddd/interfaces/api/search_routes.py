@@ -0,0 +1,31 @@
+"""
+搜索API路由
+"""
+from flask import Blueprint, request, jsonify
+from application.search_service import SearchService
+
+search_bp = Blueprint('search', __name__)
+service = SearchService()
+
+
+@search_bp.route('/', methods=['GET'])
+def search():
+    """搜索Model、Property和Datasource（q必填，可选type、domainId、limit、cursor）"""
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({"error": "q is required"}), 400
+    types = [t for t in request.args.get('type', '').split(',') if t] or None
+    domain_id = request.args.get('domainId', type=int)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', type=int)
+    try:
+        result = service.search(query, types, domain_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+@search_bp.route('/stats', methods=['GET'])
+def get_search_stats():
+    """获取搜索索引的状态"""
+    return jsonify(service.stats())
@@ -0,0 +1,64 @@
+"""
+流式响应
+大集合接口按行序列化并增量输出，避免一次性构建完整列表
+"""
+from typing import Iterable, Optional, Tuple
+from flask import Response, request, current_app, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+SSE_MIMETYPE = 'text/event-stream'
+
+
+def wants_stream() -> bool:
+    """客户端是否请求流式响应（Accept: application/x-ndjson 或 ?stream=1）"""
+    if request.args.get('stream', type=int):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def stream_response(items: Iterable[dict]) -> Response:
+    """
+    流式输出集合
+
+    Accept为application/x-ndjson时每行一个JSON对象，否则输出分块的JSON数组
+    """
+    dumps = current_app.json.dumps
+
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        def generate():
+            for item in items:
+                yield dumps(item) + "\n"
+        return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+    def generate_array():
+        yield "["
+        first = True
+        for item in items:
+            yield dumps(item) if first else "," + dumps(item)
+            first = False
+        yield "]"
+    return Response(stream_with_context(generate_array()), mimetype='application/json')
+
+
+
+def sse_response(events: Iterable[Optional[Tuple[str, dict]]]) -> Response:
+    """
+    以Server-Sent Events输出事件流
+
+    events生成 (事件类型, 数据)，为None时输出心跳注释保持连接
+    """
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield "retry: 3000\n\n"
+        for event in events:
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            name, data = event
+            yield f"event: {name}\ndata: {dumps(data)}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype=SSE_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -4,6 +4,7 @@ ETL聚合
 """
 from .etl_task import ETLTask
 from .etl_log import ETLLog
+from .cron import CronExpression
 
-__all__ = ['ETLTask', 'ETLLog']
+__all__ = ['ETLTask', 'ETLLog', 'CronExpression']
 
@@ -0,0 +1,135 @@
+"""
+Cron表达式
+ETLTask.schedule使用的5段cron表达式（分 时 日 月 周）
+"""
+from typing import Dict, List, Optional, Set
+from datetime import datetime, timedelta
+
+# 各字段的取值范围
+FIELD_RANGES = [
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7)
+]
+
+MONTH_NAMES = {name: i + 1 for i, name in enumerate(
+    ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+)}
+WEEKDAY_NAMES = {name: i for i, name in enumerate(["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"])}
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *"
+}
+
+# 查找下一次触发时间时最多向后看的天数（闰年2月29日最长约8年出现一次）
+MAX_LOOKAHEAD_DAYS = 366 * 8
+
+
+def _parse_value(token: str, names: Dict[str, int]) -> int:
+    upper = token.upper()
+    if upper in names:
+        return names[upper]
+    if not token.isdigit():
+        raise ValueError(f"Invalid cron value '{token}'")
+    return int(token)
+
+
+def _parse_field(text: str, low: int, high: int, names: Dict[str, int]) -> Set[int]:
+    """解析一个字段：支持 *、a、a-b、*/n、a-b/n、a/n 及逗号分隔的列表"""
+    values: Set[int] = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise ValueError(f"Invalid cron step '{step_text}'")
+            step = int(step_text)
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = _parse_value(start_text, names), _parse_value(end_text, names)
+        else:
+            start = _parse_value(part, names)
+            end = high if step > 1 else start
+
+        if not (low <= start <= high and low <= end <= high) or start > end:
+            raise ValueError(f"Cron field '{text}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """
+    5段cron表达式
+
+    - 字段依次为：分(0-59) 时(0-23) 日(1-31) 月(1-12或JAN-DEC) 周(0-7或SUN-SAT，0和7都是周日)
+    - 支持 *、列表、范围、步长和@daily等宏
+    - 日和周都不是*时，两者满足其一即可（与标准cron一致）
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        text = MACROS.get(expression.strip().lower(), expression)
+        fields = text.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: '{expression}'")
+
+        parsed: List[Set[int]] = []
+        for field, (name, low, high) in zip(fields, FIELD_RANGES):
+            names = MONTH_NAMES if name == "month" else WEEKDAY_NAMES if name == "weekday" else {}
+            parsed.append(_parse_field(field, low, high, names))
+
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {0 if d == 7 else d for d in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        self._sorted_minutes = sorted(self.minutes)
+        self._sorted_hours = sorted(self.hours)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        weekday = (moment.weekday() + 1) % 7  # Python周一为0，cron周日为0
+        day_ok = moment.day in self.days
+        weekday_ok = weekday in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment之后（不含）的下一次触发时间，精确到分钟"""
+        current = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = current + timedelta(days=MAX_LOOKAHEAD_DAYS)
+        while current < limit:
+            if current.month not in self.months or not self._day_matches(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            hour = next((h for h in self._sorted_hours if h >= current.hour), None)
+            if hour is None:
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour > current.hour:
+                current = current.replace(hour=hour, minute=0)
+            minute = next((m for m in self._sorted_minutes if m >= current.minute), None)
+            if minute is None:
+                current = current.replace(minute=0) + timedelta(hours=1)
+                continue
+            return current.replace(minute=minute)
+        raise ValueError(f"Cron expression never fires: '{self.expression}'")
+
+    def first_on(self, day: datetime) -> Optional[datetime]:
+        """day当天的第一次触发时间，当天不触发时返回None"""
+        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        fire = self.next_after(start - timedelta(minutes=1))
+        return fire if fire.date() == start.date() else None
+
+    def __repr__(self):
+        return f"CronExpression('{self.expression}')"
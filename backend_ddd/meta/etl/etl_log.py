@@ -73,6 +73,21 @@ class ETLLog:
         self.endTime = end_time or date.today().isoformat()
         return self
     
+    def resume(self) -> 'ETLLog':
+        """
+        继续执行（从断点恢复）
+        
+        业务规则：
+        - 只有failed状态的日志可以继续，继续后回到running并清除错误信息
+        """
+        if self.status != "failed":
+            raise ValueError(f"Cannot resume log in status '{self.status}'")
+        
+        self.status = "running"
+        self.errorMessage = None
+        self.endTime = None
+        return self
+    
     def is_valid(self) -> tuple[bool, Optional[str]]:
         """
         验证日志的有效性
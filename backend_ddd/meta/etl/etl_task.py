@@ -3,9 +3,10 @@ ETLTask聚合根
 ETLTask定义了ETL任务，连接Datasource和Model，包含ETLLogs
 """
 from typing import Optional, List, Any
-from datetime import date
+from datetime import date, datetime
 import json
 from .etl_log import ETLLog
+from .cron import CronExpression
 
 
 class ETLTask:
@@ -87,6 +88,8 @@ class ETLTask:
             raise ValueError(f"Cannot activate task in status '{self.status}'")
         
         self.status = "active"
+        fire = self.next_fire(datetime.now())
+        self.nextRun = fire.date().isoformat() if fire else None
         self.updatedAt = date.today().isoformat()
         return self
     
@@ -101,6 +104,7 @@ class ETLTask:
             raise ValueError(f"Cannot pause task in status '{self.status}'")
         
         self.status = "paused"
+        self.nextRun = None
         self.updatedAt = date.today().isoformat()
         return self
     
@@ -114,35 +118,123 @@ class ETLTask:
         if self.status != "active":
             raise ValueError(f"Cannot start task in status '{self.status}'")
         
+        self._pop_config("resumeLogId")
         self.status = "running"
         self.updatedAt = date.today().isoformat()
         return self
     
-    def complete(self, last_run: Optional[str] = None) -> 'ETLTask':
+    def resume(self) -> int:
+        """
+        从断点继续执行中断的任务，返回被继续的ETLLog的ID
+        
+        业务规则：
+        - 只有error状态且记录了可继续的执行（resumeLogId）的任务可以继续
+        """
+        if self.status != "error":
+            raise ValueError(f"Cannot resume task in status '{self.status}'")
+        log_id = self.resume_log_id
+        if log_id is None:
+            raise ValueError("Task has no interrupted run to resume")
+        
+        self.status = "running"
+        self.updatedAt = date.today().isoformat()
+        return log_id
+    
+    @property
+    def resume_log_id(self) -> Optional[int]:
+        """上次中断的执行（config.resumeLogId），其断点保存在etl_checkpoints中"""
+        return self._config().get("resumeLogId")
+    
+    def complete(self, last_run: Optional[str] = None, watermark: Any = None) -> 'ETLTask':
         """
         完成任务执行
         
         业务规则：
         - 只有running状态的任务可以完成
+        - 增量任务传入本次读到的最大水位值时，水位随完成一起推进
         """
         if self.status != "running":
             raise ValueError(f"Cannot complete task in status '{self.status}'")
         
+        if watermark is not None:
+            self._set_config("watermark", watermark)
+        self._pop_config("resumeLogId")
         self.status = "active"
         self.lastRun = last_run or date.today().isoformat()
         self.updatedAt = date.today().isoformat()
         return self
     
-    def error(self) -> 'ETLTask':
+    @property
+    def cron(self) -> Optional[CronExpression]:
+        """调度表达式，未设置schedule时为None"""
+        if not self.schedule:
+            return None
+        return CronExpression(self.schedule)
+    
+    def next_fire(self, after: datetime) -> Optional[datetime]:
+        """after之后的下一次调度时间，未设置schedule时为None"""
+        cron = self.cron
+        return cron.next_after(after) if cron else None
+    
+    @property
+    def watermark_column(self) -> Optional[str]:
+        """增量抽取的水位列（config.watermarkColumn），未配置时为全量抽取"""
+        return self._config().get("watermarkColumn")
+    
+    @property
+    def watermark(self) -> Any:
+        """已加载数据的水位值（config.watermark），为None时从头读取"""
+        return self._config().get("watermark")
+    
+    def reset_watermark(self) -> 'ETLTask':
+        """
+        清除水位，下次执行重新读取全部源数据
+        
+        业务规则：
+        - running状态的任务不能清除水位
+        """
+        if self.status == "running":
+            raise ValueError("Cannot reset watermark while task is running")
+        
+        config = self._config()
+        config.pop("watermark", None)
+        self.config = config
+        self.updatedAt = date.today().isoformat()
+        return self
+    
+    def _config(self) -> dict:
+        config = self.config
+        if isinstance(config, str):
+            try:
+                config = json.loads(config)
+            except json.JSONDecodeError:
+                config = None
+        return dict(config) if isinstance(config, dict) else {}
+    
+    def _set_config(self, key: str, value: Any) -> None:
+        config = self._config()
+        config[key] = value
+        self.config = config
+    
+    def _pop_config(self, key: str) -> None:
+        config = self._config()
+        if key in config:
+            config.pop(key)
+            self.config = config
+    
+    def error(self, resume_log_id: Optional[int] = None) -> 'ETLTask':
         """
         标记任务错误
         
         业务规则：
         - running状态的任务可以标记为error
+        - 传入resume_log_id时记录该次执行，之后可以从其断点继续（resume）
         """
         if self.status != "running":
             raise ValueError(f"Cannot mark error for task in status '{self.status}'")
         
+        if resume_log_id is not None:
+            self._set_config("resumeLogId", resume_log_id)
         self.status = "error"
         self.updatedAt = date.today().isoformat()
         return self
@@ -168,6 +260,12 @@ class ETLTask:
         if self.status not in valid_statuses:
             return False, f"Status must be one of {valid_statuses}"
         
+        if self.schedule:
+            try:
+                CronExpression(self.schedule).next_after(datetime.now())
+            except ValueError as e:
+                return False, str(e)
+        
         return True, None
     
     def to_dict(self) -> dict:
@@ -4,5 +4,6 @@ Model聚合
 """
 from .model import Model
 from .property import Property
+from .masking import MaskRule, register_mask_rule, get_mask_rule, mask_records
 
-__all__ = ['Model', 'Property']
+__all__ = ['Model', 'Property', 'MaskRule', 'register_mask_rule', 'get_mask_rule', 'mask_records']
@@ -0,0 +1,135 @@
+"""
+脱敏规则
+Property.maskRule对应的规则注册表，每条规则同时提供标量实现和等价的SQL表达式
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import threading
+
+
+class MaskRule:
+    """
+    脱敏规则
+
+    - mask：对单个字符串值脱敏，不满足规则前提（如长度不足）时原样返回
+    - sql：把SQL表达式包装为等价的脱敏表达式，用于在查询中整列脱敏；
+      为None时只能在内存中逐值处理
+
+    规则只作用于字符串值，非字符串值原样返回（与SQL中只作用于VARCHAR列一致）
+    """
+
+    def __init__(self, name: str, mask: Callable[[str], str], sql: Optional[Callable[[str], str]] = None):
+        self.name = name
+        self._mask = mask
+        self.sql = sql
+
+    def mask(self, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        return self._mask(value)
+
+    def mask_all(self, values: Iterable[Any]) -> List[Any]:
+        """对一批值脱敏"""
+        mask = self._mask
+        return [mask(v) if isinstance(v, str) else v for v in values]
+
+
+def _mask_phone(value: str) -> str:
+    if len(value) >= 7:
+        return value[:3] + "****" + value[-4:]
+    return value
+
+
+def _mask_email(value: str) -> str:
+    if "@" not in value:
+        return value
+    parts = value.split("@")
+    if len(parts[0]) > 2:
+        return parts[0][:2] + "***@" + parts[1]
+    return "***@" + parts[1]
+
+
+def _mask_id_card(value: str) -> str:
+    if len(value) >= 6:
+        return value[:6] + "********" + value[-4:]
+    return value
+
+
+def _sql_phone(expr: str) -> str:
+    return f"CASE WHEN length({expr}) >= 7 THEN left({expr}, 3) || '****' || right({expr}, 4) ELSE {expr} END"
+
+
+def _sql_email(expr: str) -> str:
+    local, domain = f"split_part({expr}, '@', 1)", f"split_part({expr}, '@', 2)"
+    return (
+        f"CASE WHEN strpos({expr}, '@') = 0 THEN {expr} "
+        f"WHEN length({local}) > 2 THEN left({local}, 2) || '***@' || {domain} "
+        f"ELSE '***@' || {domain} END"
+    )
+
+
+def _sql_id_card(expr: str) -> str:
+    return f"CASE WHEN length({expr}) >= 6 THEN left({expr}, 6) || '********' || right({expr}, 4) ELSE {expr} END"
+
+
+class MaskRuleRegistry:
+    """脱敏规则注册表（按规则名查找，可注册自定义规则）"""
+
+    def __init__(self):
+        self._rules: Dict[str, MaskRule] = {}
+        self._lock = threading.Lock()
+
+    def register(self, rule: MaskRule) -> MaskRule:
+        """注册规则，同名规则会被替换"""
+        with self._lock:
+            self._rules[rule.name] = rule
+        return rule
+
+    def get(self, name: Optional[str]) -> Optional[MaskRule]:
+        if not name:
+            return None
+        return self._rules.get(name)
+
+    def names(self) -> List[str]:
+        return sorted(self._rules)
+
+
+_registry = MaskRuleRegistry()
+_registry.register(MaskRule("phone", _mask_phone, _sql_phone))
+_registry.register(MaskRule("email", _mask_email, _sql_email))
+_registry.register(MaskRule("idCard", _mask_id_card, _sql_id_card))
+
+
+def get_mask_registry() -> MaskRuleRegistry:
+    """获取进程级脱敏规则注册表"""
+    return _registry
+
+
+def register_mask_rule(name: str, mask: Callable[[str], str], sql: Optional[Callable[[str], str]] = None) -> MaskRule:
+    """注册脱敏规则"""
+    return _registry.register(MaskRule(name, mask, sql))
+
+
+def get_mask_rule(name: Optional[str]) -> Optional[MaskRule]:
+    """按名称获取脱敏规则，不存在时返回None"""
+    return _registry.get(name)
+
+
+def mask_records(properties: Iterable[Any], records: List[Dict[str, Any]],
+                 key: Callable[[Any], str] = lambda p: p.code) -> List[Dict[str, Any]]:
+    """
+    对内存中的一批记录按列脱敏
+
+    properties为Property列表，key给出Property在记录中的字段名（默认code）；
+    返回新的记录列表，不修改传入的记录
+    """
+    masked = [dict(record) for record in records]
+    for prop in properties:
+        rule = prop.mask_rule
+        if rule is None:
+            continue
+        field = key(prop)
+        column = rule.mask_all(record.get(field) for record in masked)
+        for record, value in zip(masked, column):
+            if field in record:
+                record[field] = value
+    return masked
@@ -4,6 +4,17 @@ Property必须属于某个Model，是Model聚合的一部分
 """
 from typing import Optional, List, Any
 import json
+from .masking import MaskRule, get_mask_rule
+
+# Property.type -> 校验时接受的Python类型
+TYPE_MAPPING = {
+    "string": str,
+    "integer": int,
+    "float": float,
+    "boolean": bool,
+    "date": str,  # 日期用字符串表示
+    "datetime": str
+}
 
 
 class Property:
@@ -87,16 +98,7 @@ class Property:
     
     def _check_type(self, value: Any) -> tuple[bool, Optional[str]]:
         """检查值类型"""
-        type_mapping = {
-            "string": str,
-            "integer": int,
-            "float": float,
-            "boolean": bool,
-            "date": str,  # 日期用字符串表示
-            "datetime": str
-        }
-        
-        expected_type = type_mapping.get(self.type.lower())
+        expected_type = TYPE_MAPPING.get(self.type.lower())
         if expected_type and not isinstance(value, expected_type):
             return False, f"Value must be of type {self.type}"
         
@@ -129,33 +131,32 @@ class Property:
         
         return True, None
     
-    def mask_value(self, value: Any) -> Any:
+    @property
+    def mask_rule(self) -> Optional[MaskRule]:
         """
-        根据maskRule对值进行脱敏
+        生效的脱敏规则
         
         业务规则：
-        - 如果sensitivityLevel不为None，需要脱敏
-        - 根据maskRule规则进行脱敏
+        - sensitivityLevel和maskRule都不为空时才脱敏
+        - maskRule不在规则注册表中时不脱敏
         """
-        if not self.sensitivityLevel or not self.maskRule or value is None:
+        if not self.sensitivityLevel or not self.maskRule:
+            return None
+        return get_mask_rule(self.maskRule)
+    
+    def mask_value(self, value: Any) -> Any:
+        """根据maskRule对值进行脱敏"""
+        rule = self.mask_rule
+        if rule is None or value is None:
             return value
-        
-        if self.maskRule == "phone":
-            if isinstance(value, str) and len(value) >= 7:
-                return value[:3] + "****" + value[-4:]
-        
-        elif self.maskRule == "email":
-            if isinstance(value, str) and "@" in value:
-                parts = value.split("@")
-                if len(parts[0]) > 2:
-                    return parts[0][:2] + "***@" + parts[1]
-                return "***@" + parts[1]
-        
-        elif self.maskRule == "idCard":
-            if isinstance(value, str) and len(value) >= 6:
-                return value[:6] + "********" + value[-4:]
-        
-        return value
+        return rule.mask(value)
+    
+    def mask_values(self, values: List[Any]) -> List[Any]:
+        """根据maskRule对一批值脱敏（与逐个调用mask_value结果一致）"""
+        rule = self.mask_rule
+        if rule is None:
+            return list(values)
+        return rule.mask_all(values)
     
     def to_dict(self) -> dict:
         """转换为字典"""
@@ -204,6 +204,23 @@ export const modelAPI = {
     return apiRequest(endpoint);
   },
 
+  // 画布用的节点和边：params可含domainId、counts、maxNodes、cluster（'domain'）
+  getGraph: (params) => {
+    const queryParams = new URLSearchParams();
+    if (params?.domainId) queryParams.append('domainId', params.domainId);
+    if (params?.counts) queryParams.append('counts', '1');
+    if (params?.maxNodes) queryParams.append('maxNodes', params.maxNodes);
+    if (params?.cluster) queryParams.append('cluster', params.cluster);
+    const query = queryParams.toString();
+    return apiRequest(`/api/model/graph${query ? `?${query}` : ''}`);
+  },
+
+  // 批量导入：data为 {models: [{..., properties: [...]}], relations: [...]}
+  import: (data) => apiRequest('/api/model/import', {
+    method: 'POST',
+    body: JSON.stringify(data),
+  }),
+
   getById: async (id) => {
     const data = await apiRequest(`/api/model/${id}`);
     if (data.model) {
@@ -451,6 +468,24 @@ export const etlAPI = {
   }),
 
   getLogs: () => apiRequest('/api/etl/logs'),
+
+  /**
+   * 订阅任务执行进度（Server-Sent Events），替代轮询任务详情
+   * 事件：started、progress、finished，任务未在执行时只推送一次status
+   * 返回EventSource，调用close()取消订阅
+   */
+  subscribeProgress: (id, onEvent) => {
+    const source = new EventSource(`${API_BASE_URL}/api/etl/tasks/${id}/progress`);
+    ['started', 'progress', 'finished', 'status'].forEach((type) => {
+      source.addEventListener(type, (e) => {
+        onEvent(type, JSON.parse(e.data));
+        if (type === 'finished' || type === 'status') {
+          source.close();
+        }
+      });
+    });
+    return source;
+  },
 };
 
 /**
@@ -638,6 +673,21 @@ export const modelTableAssociationAPI = {
   }),
 };
 
+/**
+ * Search API - 服务端搜索Model、Property和Datasource
+ */
+export const searchAPI = {
+  // params可含type（'model'、'property'、'datasource'，逗号分隔）、domainId、limit、cursor
+  search: (q, params) => {
+    const queryParams = new URLSearchParams({ q });
+    if (params?.type) queryParams.append('type', params.type);
+    if (params?.domainId) queryParams.append('domainId', params.domainId);
+    if (params?.limit) queryParams.append('limit', params.limit);
+    if (params?.cursor) queryParams.append('cursor', params.cursor);
+    return apiRequest(`/api/search?${queryParams.toString()}`);
+  },
+};
+
 /**
  * Health Check API
  */
@@ -659,5 +709,6 @@ export default {
   modelTableAssociation: modelTableAssociationAPI,
   etl: etlAPI,
   lineage: lineageAPI,
+  search: searchAPI,
   health: healthAPI,
 };